@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class ConverterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'converter'
\ No newline at end of file
+    name = 'converter'
+
+    def ready(self):
+        # Compile the conversion profiles at startup so configuration errors surface right away
+        from .profiles import load_profiles
+        load_profiles()
@@ -0,0 +1,173 @@
+"""
+Pack-wide asset registry for batch conversions
+
+Each converted (NEW format) document is reduced to the model, texture and
+animation paths its palettes use. The registry interns every path, so a
+model shared by hundreds of palettes is stored once, and builds a manifest
+of unique assets, the species referencing them and hints about palettes
+that look incomplete.
+"""
+import json
+
+from .conversion_logic import convert_entry, derive_model_from_palette_paths, unwrap_models
+
+# Member name of the manifest in converted archives; never treated as a species file
+MANIFEST_NAME = "asset_manifest.json"
+
+
+def manifest_json(manifest: dict) -> bytes:
+    """Serialize a manifest the same way for converted archives and convert_tree"""
+    return json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _path(value):
+    return value if isinstance(value, str) and value else None
+
+
+def _label(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _list(value):
+    return value if isinstance(value, list) else ()
+
+
+def summarize_assets(new_doc: dict) -> tuple:
+    """Reduce a NEW document to (species, palettes)
+
+    Each palette is (form, gender, palette name, entries) and each entry is
+    (model, texture, emissive, animation paths); paths that are not
+    non-empty strings are None.
+    """
+    palettes = []
+    forms = new_doc.get("forms") if isinstance(new_doc, dict) else None
+    for form in forms if isinstance(forms, list) else []:
+        if not isinstance(form, dict):
+            continue
+        gender_properties = form.get("genderProperties")
+        for gp in gender_properties if isinstance(gender_properties, list) else []:
+            if not isinstance(gp, dict) or not isinstance(gp.get("palettes"), list):
+                continue
+            for palette in gp["palettes"]:
+                if not isinstance(palette, dict):
+                    continue
+                entries = tuple(
+                    (
+                        _path(entry.get("model")),
+                        _path(entry.get("texture")),
+                        _path(entry.get("emissive")),
+                        tuple(_path(a.get("animation")) for a in _list(entry.get("animations")) if isinstance(a, dict)),
+                    )
+                    for entry in unwrap_models(palette.get("models"))
+                )
+                palettes.append((_label(form.get("name")), _label(gp.get("gender")), _label(palette.get("name")), entries))
+    species = new_doc.get("name") if isinstance(new_doc, dict) else None
+    return species, tuple(palettes)
+
+
+def convert_entry_with_assets(filename: str, raw, direction: str = "forward", profile=None):
+    """``convert_entry`` that also records the converted document's assets under ``'assets'``"""
+    summaries = []
+    record, converted = convert_entry(
+        filename, raw, direction, profile, inspect=lambda new_doc: summaries.append(summarize_assets(new_doc))
+    )
+    if converted is not None:
+        record['assets'] = summaries[0]
+    return record, converted
+
+
+def _is_derived(model, texture) -> bool:
+    """Whether ``model`` is the one a palette without pqc gets from its texture folder"""
+    return bool(texture) and model == derive_model_from_palette_paths({"texture": texture})
+
+
+class AssetRegistry:
+    """Interned model/texture/animation paths and the species that use them"""
+
+    def __init__(self):
+        self._strings = {}
+        self.models = {}      # model -> {'species': set, 'textures': set, 'animations': set}
+        self.textures = {}    # texture -> set of species
+        self.animations = set()
+        self.hints = []
+        self.files = 0
+
+    def intern(self, value):
+        """Return the registry's single copy of a string"""
+        if not isinstance(value, str):
+            return value
+        return self._strings.setdefault(value, value)
+
+    def add(self, source: str, summary: tuple):
+        """Register the assets of one converted file (as returned by ``summarize_assets``)"""
+        species, palettes = summary
+        species = self.intern(species if isinstance(species, str) and species else source)
+        self.files += 1
+        # Models of each form/gender group that come from a pqc rather than a texture folder
+        explicit = {}
+        for form, gender, _, entries in palettes:
+            group = explicit.setdefault((form, gender), set())
+            group.update(model for model, texture, _, _ in entries if model and not _is_derived(model, texture))
+        by_group = {}
+        for form, gender, name, entries in palettes:
+            by_group.setdefault((form, gender), set()).add(name)
+            where = {'source': source, 'species': species, 'form': form, 'gender': gender, 'palette': name}
+            if not any(entry[0] for entry in entries):
+                self.hints.append({**where, 'hint': 'no_model', 'detail': 'palette has no model entry'})
+            for model, texture, emissive, animations in entries:
+                if model is None:
+                    continue
+                model = self.intern(model)
+                texture = self.intern(texture)
+                info = self.models.get(model)
+                if info is None:
+                    info = self.models[model] = {'species': set(), 'textures': set(), 'animations': set()}
+                info['species'].add(species)
+                for animation in filter(None, animations):
+                    animation = self.intern(animation)
+                    info['animations'].add(animation)
+                    self.animations.add(animation)
+                if texture:
+                    info['textures'].add(texture)
+                    self.textures.setdefault(texture, set()).add(species)
+                    # Palettes without pqc get '<texture dir>/model.bmd': suspect when siblings use other models
+                    others = explicit[(form, gender)]
+                    if others and model not in others and _is_derived(model, texture):
+                        self.hints.append({
+                            **where, 'hint': 'derived_model',
+                            'detail': f"{model} was derived from the texture folder (no pqc); "
+                                      f"other palettes use {', '.join(sorted(others))}",
+                        })
+                else:
+                    self.hints.append({**where, 'hint': 'no_texture', 'detail': f'{model} has no texture'})
+                if emissive:
+                    self.textures.setdefault(self.intern(emissive), set()).add(species)
+        for (form, gender), names in by_group.items():
+            if "none" in names and "shiny" not in names:
+                self.hints.append({
+                    'source': source, 'species': species, 'form': form, 'gender': gender, 'palette': 'shiny',
+                    'hint': 'no_shiny', 'detail': "'none' palette has no shiny counterpart",
+                })
+
+    def manifest(self) -> dict:
+        """Pack-wide manifest of unique assets, their users and hints"""
+        return {
+            'files': self.files,
+            'unique_models': len(self.models),
+            'unique_textures': len(self.textures),
+            'unique_animations': len(self.animations),
+            'models': [
+                {
+                    'model': model,
+                    'species': sorted(info['species']),
+                    'textures': sorted(info['textures']),
+                    'animations': sorted(info['animations']),
+                }
+                for model, info in sorted(self.models.items())
+            ],
+            'textures': [
+                {'texture': texture, 'species': sorted(species)}
+                for texture, species in sorted(self.textures.items())
+            ],
+            'hints': self.hints,
+        }
@@ -0,0 +1,96 @@
+"""
+Async views for ASGI serving
+
+Under ASGI, Django receives the request body without holding a thread, but
+runs sync views one at a time on a single shared thread and buffers every
+streamed response in memory before sending it. These views await the
+body, run the conversion views on a bounded thread pool, and stream their
+responses chunk by chunk, each chunk produced on the pool, so an event loop
+can hold many slow uploads and downloads while the pool stays busy.
+
+urls.py routes the conversion endpoints here when CONVERTER_ASYNC_VIEWS is
+set (asgi.py sets it).
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import views
+
+_DONE = object()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def conversion_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool the async views convert on"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'CONVERTER_ASYNC_WORKERS', None) or max(2, os.cpu_count() or 1)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='converter-async')
+        return _executor
+
+
+def _submit(func, *args) -> asyncio.Future:
+    # Each call runs in a copy of the caller's context, like sync_to_async does
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return asyncio.get_running_loop().run_in_executor(conversion_executor(), call)
+
+
+async def offload(func, *args):
+    """Run ``func(*args)`` on the conversion pool and return its result"""
+    return await _submit(func, *args)
+
+
+async def iter_offloaded(iterator):
+    """Async iterator over a sync one, producing every item on the conversion pool"""
+    pending = None
+    try:
+        while True:
+            pending = _submit(next, iterator, _DONE)
+            # Shielded: a disconnect must not abandon a generator that is still running
+            item = await asyncio.shield(pending)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+
+
+async def run_view(view, request, *args, **kwargs):
+    """Run a sync view on the conversion pool, streaming its response from the pool too
+
+    The body has already been received by then, so form parsing happens on
+    the pool as well. The sync generator of a streamed response stays
+    registered with the response, which closes it once it is finished or
+    abandoned.
+    """
+    response = await offload(functools.partial(view, request, *args, **kwargs))
+    if response.streaming and not response.is_async:
+        response.streaming_content = iter_offloaded(iter(response.streaming_content))
+    return response
+
+
+def _async_view(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_view(view, request, *args, **kwargs)
+    return wrapper
+
+
+convert_single_file = _async_view(views.convert_single_file)
+convert_zip_file = _async_view(views.convert_zip_file)
+convert_text_input = _async_view(views.convert_text_input)
+convert_form_preview = _async_view(views.convert_form_preview)
+convert_ndjson = _async_view(views.convert_ndjson)
+check_references = _async_view(views.check_references)
+create_zip_job = _async_view(views.create_zip_job)
+zip_job_download = _async_view(views.zip_job_download)
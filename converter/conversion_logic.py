@@ -2,11 +2,20 @@
 JSON Converter Logic
 Ported from the original GUI application to work with Django
 """
-import json
-from collections import OrderedDict
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
 from pathlib import Path
 import traceback
 
+from .profiles import get_profile
+from .serializers import get_serializer
+from .validation import SchemaError, check_document, json_type
+
 # --------------------------- helpers ---------------------------
 
 def ensure_namespace(sound_id: str) -> str:
@@ -14,31 +23,25 @@ def ensure_namespace(sound_id: str) -> str:
     s = (sound_id or "").strip()
     return s if ":" in s else f"pixelmon:{s}"
 
-def convert_sounds(old_sounds):
-    """Convert old sounds format to new format"""
+def convert_sounds(old_sounds, profile=None):
+    """Convert old sounds format to new format (range from the conversion profile)"""
     if not old_sounds or not isinstance(old_sounds, list):
         return []
+    sound_range = (profile or get_profile()).sound_range
     out = []
     for s in old_sounds:
         s = str(s).strip()
         if not s:
             continue
-        out.append({"sound_id": ensure_namespace(s), "range": 14})
+        out.append({"sound_id": ensure_namespace(s), "range": sound_range})
     return out
 
-def particle_from_string(pstr):
-    """Convert particle string to particle object"""
+def particle_from_string(pstr, profile=None):
+    """Convert particle string to the conversion profile's particle object (None if it has none)"""
     if not pstr or not str(pstr).strip():
         return None
-    return {
-        "probability": 0.1,
-        "options": {
-            "type": "pixelmon:shiny",
-            "diameter": 2.5,
-            "lifetime": 30,
-            "tint": {"red": 255, "green": 215, "blue": 0, "alpha": 255}
-        }
-    }
+    build = (profile or get_profile()).particle
+    return build() if build is not None else None
 
 def has_any(d: dict, keys: list) -> bool:
     """Check if dict has any of the specified keys"""
@@ -64,31 +67,29 @@ def wants_swimming(movement: dict) -> bool:
         return True
     return False
 
+@lru_cache(maxsize=8192)
 def pqc_to_bmd_path(pqc_path: str) -> str:
     """Convert PQC path to BMD path"""
     return str(Path(pqc_path).with_suffix(".bmd")).replace("\\", "/")
 
-def build_animation_list(model_path: str, add_fly: bool, add_swim: bool):
-    """Build animation list based on model path and capabilities"""
+@lru_cache(maxsize=8192)
+def animation_template(model_path: str, add_fly: bool, add_swim: bool) -> tuple:
+    """Precomputed animation entries for a model, cached per key
+
+    The cached dicts must never reach a document; callers copy them (see
+    ``build_animation_list``).
+    """
     base_dir = str(Path(model_path).parent).replace("\\", "/")
-    def ap(name): return f"{base_dir}/{name}.bmd"
-    anims = [
-        OrderedDict([("type","idle"), ("animation", ap("idle"))]),
-        OrderedDict([("type","walk"), ("animation", ap("walk"))]),
-    ]
+    types = ["idle", "walk"]
     if add_fly:
-        anims.append(OrderedDict([("type","fly"), ("animation", ap("fly"))]))
+        types.append("fly")
     if add_swim:
-        anims.append(OrderedDict([("type","swim"), ("animation", ap("swim"))]))
-    # de-dup
-    seen = set()
-    out = []
-    for a in anims:
-        key = (a["type"], a["animation"])
-        if key not in seen:
-            seen.add(key)
-            out.append(a)
-    return out
+        types.append("swim")
+    return tuple({"type": t, "animation": f"{base_dir}/{t}.bmd"} for t in types)
+
+def build_animation_list(model_path: str, add_fly: bool, add_swim: bool):
+    """Build animation list based on model path and capabilities"""
+    return [dict(a) for a in animation_template(model_path, add_fly, add_swim)]
 
 def derive_model_from_palette_paths(old_palette: dict) -> str or None:
     """Derive model path from palette texture/sprite paths"""
@@ -140,67 +141,105 @@ FORM_TAIL_ORDER = [
 
 SPAWN_ORDER = ["baseExp", "baseFriendship", "spawnLevel", "spawnLevelRange", "spawnLocations"]
 
-def ordered(obj: dict, key_order: list) -> OrderedDict:
-    """Create ordered dict with specified key order"""
-    out = OrderedDict()
+# Sentinel a plan rule returns to leave its key out of the output
+OMIT = object()
+
+class OrderingPlan:
+    """Key order for one schema level, compiled once and written straight into the output dict
+
+    ``keys`` lists output keys in order; ``rules`` maps a key to ``rule(src, ctx)`` that
+    builds its value (or returns ``OMIT``). Keys without a rule are copied from ``src``
+    when present. With ``keep_extra`` unlisted source keys follow in their original order.
+    """
+    __slots__ = ("steps", "known", "keep_extra")
+
+    def __init__(self, keys: list, rules: dict = None, keep_extra: bool = False):
+        rules = rules or {}
+        unknown = set(rules) - set(keys)
+        if unknown:
+            raise ValueError(f"Rules for keys outside the plan: {sorted(unknown)}")
+        self.steps = tuple((k, rules.get(k)) for k in keys)
+        self.known = frozenset(keys)
+        self.keep_extra = keep_extra
+
+    def build(self, src: dict, ctx=None) -> dict:
+        """Build the ordered output mapping for ``src``"""
+        out = {}
+        for key, rule in self.steps:
+            if rule is None:
+                if key in src:
+                    out[key] = src[key]
+            else:
+                value = rule(src, ctx)
+                if value is not OMIT:
+                    out[key] = value
+        if self.keep_extra:
+            known = self.known
+            for key in src:
+                if key not in known:
+                    out[key] = src[key]
+        return out
+
+def ordered(obj: dict, key_order: list) -> dict:
+    """Create dict with specified key order, unlisted keys last"""
     if not isinstance(obj, dict):
         return obj
-    for k in key_order:
-        if k in obj:
-            out[k] = obj[k]
-    for k in obj:
-        if k not in out:
-            out[k] = obj[k]
-    return out
+    return OrderingPlan(key_order, keep_extra=True).build(obj)
+
+SPAWN_PLAN = OrderingPlan(SPAWN_ORDER, keep_extra=True)
 
 def order_spawn(spawn_obj: dict):
     """Order spawn object keys"""
     if not isinstance(spawn_obj, dict):
         return spawn_obj
-    return ordered(spawn_obj, SPAWN_ORDER)
+    return SPAWN_PLAN.build(spawn_obj)
+
+TOP_PLAN = OrderingPlan(TOP_ORDER, keep_extra=True)
 
 def order_top(doc: dict):
     """Order top-level document keys"""
-    return ordered(doc, TOP_ORDER)
+    return TOP_PLAN.build(doc)
 
 # --------------------------- growth_data defaults ---------------------------
 
-def make_growth_data() -> OrderedDict:
-    """Create default growth_data object"""
-    gd = OrderedDict()
-    gd["mean"] = 40.0
-    gd["standard_deviation"] = 2.0
-    gd["min_render_scale"] = 0.7
-    gd["max_render_scale"] = 1.3
-    return gd
+def make_growth_data(profile=None) -> dict:
+    """Create the conversion profile's default growth_data object"""
+    return (profile or get_profile()).growth_data()
 
 # --------------------------- core: model entries & wrappers ---------------------------
 
-def make_model_entry(model_path: str, texture: str, emissive: str, add_fly: bool, add_swim: bool) -> OrderedDict:
-    """Create a model entry with specified parameters"""
+def make_model_entry(model_path: str, texture: str, emissive: str, add_fly: bool, add_swim: bool,
+                     profile=None) -> dict:
+    """Create a model entry with specified parameters (scale from the conversion profile)"""
     # Key order: texture, model, animations, scale, (emissive)
-    entry = OrderedDict()
+    entry = {}
     if texture:
         entry["texture"] = texture
     entry["model"] = model_path
     entry["animations"] = build_animation_list(model_path, add_fly, add_swim)
-    entry["scale"] = 1.0
+    entry["scale"] = (profile or get_profile()).model_scale
     if emissive:
         entry["emissive"] = emissive
     return entry
 
 def wrap_models_with_predicate(entries: list) -> list:
     """Wrap model entries with predicate"""
-    wrapper = OrderedDict()
-    wrapper["model_predicate"] = OrderedDict([("type","pixelmon:always")])
-    wrapper["models"] = entries or []
-    return [wrapper]
+    return [{"model_predicate": {"type": "pixelmon:always"}, "models": entries or []}]
 
 # --------------------------- core conversion ---------------------------
 
-def convert_palette(old_palette: dict, movement_for_rules: dict) -> OrderedDict:
+def convert_palette(old_palette: dict, movement_for_rules: dict, profile=None) -> dict:
     """Convert old palette format to new format"""
-    out_pal = OrderedDict()
+    return _convert_palette(
+        old_palette,
+        wants_flying(movement_for_rules or {}),
+        wants_swimming(movement_for_rules or {}),
+        profile or get_profile(),
+    )
+
+def _convert_palette(old_palette: dict, add_fly: bool, add_swim: bool, profile) -> dict:
+    """Convert a palette with movement capabilities and conversion profile already resolved"""
+    out_pal = {}
 
     # Palette stable keys
     if "name" in old_palette:
@@ -208,13 +247,10 @@ def convert_palette(old_palette: dict, movement_for_rules: dict) -> OrderedDict:
     if "sprite" in old_palette:
         out_pal["sprite"] = old_palette["sprite"]
 
-    snd = convert_sounds(old_palette.get("sounds"))
+    snd = convert_sounds(old_palette.get("sounds"), profile)
     if snd:
         out_pal["sounds"] = snd
 
-    add_fly = wants_flying(movement_for_rules or {})
-    add_swim = wants_swimming(movement_for_rules or {})
-
     texture = old_palette.get("texture")
     emissive = old_palette.get("emissive")
 
@@ -232,21 +268,21 @@ def convert_palette(old_palette: dict, movement_for_rules: dict) -> OrderedDict:
     if pqc_list:
         for pqc in pqc_list:
             model_path = pqc_to_bmd_path(pqc)
-            entries.append(make_model_entry(model_path, texture, emissive, add_fly, add_swim))
+            entries.append(make_model_entry(model_path, texture, emissive, add_fly, add_swim, profile))
     else:
         derived = derive_model_from_palette_paths(old_palette)
         if derived:
-            entries.append(make_model_entry(derived, texture, emissive, add_fly, add_swim))
+            entries.append(make_model_entry(derived, texture, emissive, add_fly, add_swim, profile))
 
     # Always wrap with predicate
     out_pal["models"] = wrap_models_with_predicate(entries)
 
-    particle_obj = particle_from_string(old_palette.get("particle"))
+    particle_obj = particle_from_string(old_palette.get("particle"), profile)
     if particle_obj:
         out_pal["particle"] = particle_obj
 
     # Ensure tags exists (even if empty)
-    out_pal["tags"] = old_palette.get("tags", [])
+    out_pal["tags"] = old_palette["tags"] if "tags" in old_palette else []
 
     return out_pal
 
@@ -261,173 +297,554 @@ def clone_models_for_shiny_wrapped(base_models_wrapped, shiny_texture_path: str)
     base_entries = base_wrapper.get("models", []) if isinstance(base_wrapper, dict) else []
     new_entries = []
     for m in base_entries:
-        clone = OrderedDict(m)
+        # Shallow copy: the animations list and its dicts stay shared with the base entry
+        clone = dict(m)
         # swap or set texture to shiny
         clone["texture"] = shiny_texture_path
         new_entries.append(clone)
     return wrap_models_with_predicate(new_entries)
 
-def convert_form(old_form: dict, movement_fallback: dict = None) -> OrderedDict:
-    """Convert old form format to new format"""
-    # HEAD block
-    head = OrderedDict()
-    fname = normalize_form_name(old_form.get("name"))
-    head["name"] = fname
-
-    for k in ["experienceGroup","dimensions","moves","abilities","movement","aggression","battleStats","tags"]:
-        if k in old_form:
-            head[k] = old_form[k]
+def has_model_entries(new_palette: dict) -> bool:
+    """Check if a converted palette has a predicate wrapper with at least one model entry"""
+    models = new_palette.get("models")
+    if not (isinstance(models, list) and models):
+        return False
+    inner = models[0]
+    return isinstance(inner, dict) and isinstance(inner.get("models"), list) and bool(inner["models"])
+
+def fallback_models(old_palette: dict, new_palette: dict, add_fly: bool, add_swim: bool, profile=None) -> list:
+    """Synthesize a wrapped model entry from a palette's own texture/sprite"""
+    hint_tex = None
+    if isinstance(old_palette, dict):
+        hint_tex = old_palette.get("texture") or old_palette.get("sprite")
+    if not hint_tex:
+        hint_tex = new_palette.get("sprite")
+    if not hint_tex:
+        return wrap_models_with_predicate([])
+    derived = derive_model_from_palette_paths({"texture": hint_tex})
+    return wrap_models_with_predicate([make_model_entry(derived, hint_tex, None, add_fly, add_swim, profile)])
+
+def _convert_gender_properties(gp, add_fly: bool, add_swim: bool, profile) -> list:
+    """Convert genderProperties entries and their palettes"""
+    new_gp = []
+    for gp_entry in gp:
+        if not isinstance(gp_entry, dict):
+            continue
+        gp_out = {}
+        if "gender" in gp_entry:
+            gp_out["gender"] = gp_entry["gender"]
+
+        palettes = gp_entry.get("palettes", [])
+        new_palettes = []
+        first_by_name = {}
+        shiny_idx = None
+        for idx, pal in enumerate(palettes):
+            new_pal = _convert_palette(pal, add_fly, add_swim, profile)
+            new_palettes.append(new_pal)
+            name = new_pal.get("name")
+            if isinstance(name, str) and name not in first_by_name:
+                first_by_name[name] = idx
+                if name == "shiny":
+                    # shiny may mirror 'none', which can appear later; resolved below
+                    shiny_idx = idx
+                    continue
+            # Guard: synthesize wrapper/entry from the palette's own texture/sprite if missing
+            if not has_model_entries(new_pal):
+                new_pal["models"] = fallback_models(pal, new_pal, add_fly, add_swim, profile)
+
+        # Ensure shiny has models wrapper by mirroring 'none' if needed
+        if shiny_idx is not None:
+            shiny_pal = new_palettes[shiny_idx]
+            if not has_model_entries(shiny_pal):
+                orig_shiny = palettes[shiny_idx]
+                shiny_tex = orig_shiny.get("texture") or orig_shiny.get("sprite")
+                base_idx = first_by_name.get("none")
+                if base_idx is not None:
+                    mirrored = clone_models_for_shiny_wrapped(new_palettes[base_idx]["models"], shiny_tex)
+                    if mirrored:
+                        shiny_pal["models"] = mirrored
+                if not has_model_entries(shiny_pal):
+                    shiny_pal["models"] = fallback_models(orig_shiny, shiny_pal, add_fly, add_swim, profile)
+
+        if new_palettes:
+            gp_out["palettes"] = new_palettes
+        if "tags" in gp_entry:
+            gp_out["tags"] = gp_entry["tags"]
+        if gp_out:
+            new_gp.append(gp_out)
+
+    return new_gp
+
+def _form_name(old_form: dict, ctx) -> str:
+    return normalize_form_name(old_form.get("name"))
+
+def _form_spawn(old_form: dict, ctx):
+    if "spawn" not in old_form:
+        return OMIT
+    return order_spawn(old_form["spawn"])
+
+def _form_gender_properties(old_form: dict, ctx):
+    gp = old_form.get("genderProperties", [])
+    if not isinstance(gp, list):
+        return OMIT
+    return _convert_gender_properties(gp, *ctx) or OMIT
 
-    movement_for_rules = old_form.get("movement") or movement_fallback or {}
+def _form_growth_data(old_form: dict, ctx) -> dict:
+    # ALWAYS add growth_data with the profile's defaults, as last field
+    return ctx[2].growth_data()
 
-    if "spawn" in old_form:
-        head["spawn"] = order_spawn(old_form["spawn"])
+FORM_RULES = {
+    "name": _form_name,
+    "spawn": _form_spawn,
+    "genderProperties": _form_gender_properties,
+    "growth_data": _form_growth_data,
+}
 
-    if "possibleGenders" in old_form:
-        head["possibleGenders"] = old_form["possibleGenders"]
+FORM_PLAN = OrderingPlan(FORM_HEAD_ORDER + FORM_TAIL_ORDER, FORM_RULES)
 
-    # genderProperties with palettes
-    gp = old_form.get("genderProperties", [])
-    if isinstance(gp, list):
-        new_gp = []
-        for gp_entry in gp:
-            if not isinstance(gp_entry, dict):
-                continue
-            gp_out = OrderedDict()
-            if "gender" in gp_entry:
-                gp_out["gender"] = gp_entry["gender"]
-
-            palettes = gp_entry.get("palettes", [])
-            new_palettes = []
-            for pal in palettes:
-                new_palettes.append(convert_palette(pal, movement_for_rules))
-
-            # Ensure shiny has models wrapper by mirroring 'none' if needed
-            base_pal = next((p for p in new_palettes if p.get("name") == "none"), None)
-            shiny_pal = next((p for p in new_palettes if p.get("name") == "shiny"), None)
-            if shiny_pal is not None:
-                shiny_has_models = False
-                if isinstance(shiny_pal.get("models"), list) and shiny_pal["models"]:
-                    inner = shiny_pal["models"][0] if shiny_pal["models"] else {}
-                    shiny_has_models = isinstance(inner, dict) and isinstance(inner.get("models"), list) and inner["models"]
-
-                if not shiny_has_models:
-                    orig_shiny = next((p for p in palettes if isinstance(p, dict) and p.get("name") == "shiny"), None)
-                    shiny_tex = None
-                    if isinstance(orig_shiny, dict):
-                        shiny_tex = orig_shiny.get("texture") or orig_shiny.get("sprite")
-                    if base_pal and base_pal.get("models"):
-                        mirrored = clone_models_for_shiny_wrapped(base_pal["models"], shiny_tex)
-                        if mirrored:
-                            shiny_pal["models"] = mirrored
-                    elif shiny_tex:
-                        derived = derive_model_from_palette_paths({"texture": shiny_tex})
-                        if derived:
-                            shiny_pal["models"] = wrap_models_with_predicate([
-                                make_model_entry(derived, shiny_tex, None, wants_flying(movement_for_rules), wants_swimming(movement_for_rules))
-                            ])
-
-            # Final guard: synthesize wrapper/entry from each palette's own texture/sprite if missing
-            for idx, pal in enumerate(new_palettes):
-                ok = False
-                if isinstance(pal.get("models"), list) and pal["models"]:
-                    inner = pal["models"][0]
-                    ok = isinstance(inner, dict) and isinstance(inner.get("models"), list) and inner["models"]
-                if not ok:
-                    orig = palettes[idx] if idx < len(palettes) else {}
-                    hint_tex = None
-                    if isinstance(orig, dict):
-                        hint_tex = orig.get("texture") or orig.get("sprite")
-                    if not hint_tex:
-                        hint_tex = pal.get("sprite")
-                    if hint_tex:
-                        derived = derive_model_from_palette_paths({"texture": hint_tex})
-                        if derived:
-                            pal["models"] = wrap_models_with_predicate([
-                                make_model_entry(derived, hint_tex, None, wants_flying(movement_for_rules), wants_swimming(movement_for_rules))
-                            ])
-                    else:
-                        pal["models"] = wrap_models_with_predicate([])
-
-            if new_palettes:
-                gp_out["palettes"] = new_palettes
-            if "tags" in gp_entry:
-                gp_out["tags"] = gp_entry["tags"]
-            if gp_out:
-                new_gp.append(gp_out)
-
-        if new_gp:
-            head["genderProperties"] = new_gp
-
-    # TAIL block (after palettes) — always include growth_data with defaults
-    tail = OrderedDict()
-    for k in ["eggGroups","types","preEvolutions","defaultBaseForm","megaItems","megas","gigantamax","eggCycles","weight","catchRate","malePercentage","evolutions","evYields"]:
-        if k in old_form and k != "spawn":
-            tail[k] = old_form[k]
-
-    # ALWAYS add growth_data with requested defaults, as last field
-    tail["growth_data"] = make_growth_data()
-
-    # Merge HEAD then TAIL preserving blocks
-    form = OrderedDict()
-    for k in FORM_HEAD_ORDER:
-        if k in head:
-            form[k] = head[k]
-    for k in tail:
-        form[k] = tail[k]
-    return form
-
-def convert_document(old_doc: dict) -> OrderedDict:
-    """Convert entire document from old format to new format"""
-    new_doc = OrderedDict()
-
-    # Top-level: name, dex, defaultForms, forms, generation (last)
-    if "name" in old_doc: new_doc["name"] = old_doc["name"]
-    if "dex" in old_doc: new_doc["dex"] = old_doc["dex"]
+def convert_form(old_form: dict, movement_fallback: dict = None, profile=None) -> dict:
+    """Convert old form format to new format"""
+    movement_for_rules = old_form.get("movement") or movement_fallback or {}
+    ctx = (wants_flying(movement_for_rules), wants_swimming(movement_for_rules), profile or get_profile())
+    return FORM_PLAN.build(old_form, ctx)
 
+def _document_default_forms(old_doc: dict, ctx) -> list:
     # defaultForms BEFORE forms
     old_forms = old_doc.get("forms", [])
     norm_first_form = "base"
     if isinstance(old_forms, list) and old_forms:
         norm_first_form = normalize_form_name(old_forms[0].get("name"))
     odf = old_doc.get("defaultForms") or []
-    desired_default = odf[0] if (odf and str(odf[0]).strip()) else norm_first_form
-    new_doc["defaultForms"] = [desired_default]
+    return [odf[0] if (odf and str(odf[0]).strip()) else norm_first_form]
 
-    # forms
-    new_forms = []
-    movement_fallback = {}
-    if isinstance(old_forms, list) and old_forms:
+def document_movement_fallback(old_doc: dict) -> dict:
+    """Movement rules for forms without their own: the first form's ``movement``"""
+    old_forms = old_doc.get("forms", [])
+    if isinstance(old_forms, list) and old_forms and isinstance(old_forms[0], dict):
         mf = old_forms[0].get("movement", {})
         if isinstance(mf, dict):
-            movement_fallback = mf
-    for f in old_forms:
-        new_forms.append(convert_form(f, movement_fallback))
-    new_doc["forms"] = new_forms
+            return mf
+    return {}
+
+def _document_forms(old_doc: dict, ctx) -> list:
+    movement_fallback = document_movement_fallback(old_doc)
+    return [convert_form(f, movement_fallback, ctx) for f in old_doc.get("forms", [])]
+
+DOCUMENT_RULES = {
+    "defaultForms": _document_default_forms,
+    "forms": _document_forms,
+}
+
+# Top-level: name, dex, defaultForms, forms, generation (last); other keys are dropped
+DOCUMENT_PLAN = OrderingPlan(TOP_ORDER, DOCUMENT_RULES)
+
+def convert_document(old_doc: dict, profile=None) -> dict:
+    """Convert entire document from old format to new format
 
-    # generation LAST
-    if "generation" in old_doc:
-        new_doc["generation"] = old_doc["generation"]
+    The document shape is checked first, so malformed input fails with a
+    ``SchemaError`` naming the JSON path instead of midway through conversion.
+    Defaults come from ``profile`` (a ``ConversionProfile``, the configured
+    default one if None).
+    """
+    check_document(old_doc)
+    return DOCUMENT_PLAN.build(old_doc, profile or get_profile())
 
-    # enforce top order
-    return order_top(new_doc)
+# --------------------------- reverse conversion (NEW -> OLD) ---------------------------
+
+REVERSE_PALETTE_ORDER = ["name", "texture", "sprite", "emissive", "modelLocator", "sounds", "particle", "tags"]
+
+@lru_cache(maxsize=8192)
+def bmd_to_pqc_path(model_path: str) -> str:
+    """Convert BMD model path back to PQC path"""
+    return str(Path(model_path).with_suffix(".pqc")).replace("\\", "/")
+
+def unwrap_models(models) -> list:
+    """Flatten model_predicate wrappers into their model entries"""
+    entries = []
+    if not isinstance(models, list):
+        return entries
+    for item in models:
+        if not isinstance(item, dict):
+            continue
+        if "models" in item or "model_predicate" in item:
+            inner = item.get("models")
+            if isinstance(inner, list):
+                entries.extend(m for m in inner if isinstance(m, dict))
+        elif "model" in item:
+            entries.append(item)
+    return entries
+
+def _first_entry_value(key: str):
+    def rule(new_palette: dict, entries: list):
+        value = entries[0].get(key) if entries else None
+        return value if value else OMIT
+    return rule
+
+def _palette_model_locator(new_palette: dict, entries: list):
+    pqc = [bmd_to_pqc_path(e["model"]) for e in entries if isinstance(e.get("model"), str) and e["model"]]
+    return {"pqc": pqc} if pqc else OMIT
+
+def _palette_sound_ids(new_palette: dict, entries: list):
+    sounds = new_palette.get("sounds")
+    if not isinstance(sounds, list):
+        return OMIT
+    ids = [s.get("sound_id") if isinstance(s, dict) else s for s in sounds]
+    ids = [s for s in ids if isinstance(s, str) and s]
+    return ids or OMIT
+
+def _palette_particle(new_palette: dict, entries: list):
+    particle = new_palette.get("particle")
+    if not particle:
+        return OMIT
+    options = particle.get("options") if isinstance(particle, dict) else None
+    ptype = options.get("type") if isinstance(options, dict) else None
+    if not isinstance(ptype, str) or not ptype:
+        return particle if isinstance(particle, str) else "shiny"
+    return ptype.split(":", 1)[-1]
+
+REVERSE_PALETTE_PLAN = OrderingPlan(REVERSE_PALETTE_ORDER, {
+    "texture": _first_entry_value("texture"),
+    "emissive": _first_entry_value("emissive"),
+    "modelLocator": _palette_model_locator,
+    "sounds": _palette_sound_ids,
+    "particle": _palette_particle,
+})
+
+def reverse_palette(new_palette: dict) -> dict:
+    """Convert a NEW palette back to the OLD format
+
+    Texture and emissive are taken from the first model entry; animations
+    and scale are derived data and are dropped.
+    """
+    return REVERSE_PALETTE_PLAN.build(new_palette, unwrap_models(new_palette.get("models")))
+
+def _require(value, kind: type, path: str):
+    if not isinstance(value, kind):
+        expected = "array" if kind is list else "object"
+        raise SchemaError([f"{path}: expected {expected}, got {json_type(value)}"])
+    return value
+
+def _reverse_gender_properties(new_form: dict, path: str):
+    gp = new_form.get("genderProperties")
+    if not isinstance(gp, list):
+        return OMIT if gp is None else gp
+    out = []
+    for index, entry in enumerate(gp):
+        if not isinstance(entry, dict):
+            continue
+        gp_out = {}
+        if "gender" in entry:
+            gp_out["gender"] = entry["gender"]
+        if "palettes" in entry:
+            palettes_path = f"{path}.genderProperties[{index}].palettes"
+            gp_out["palettes"] = [
+                reverse_palette(_require(pal, dict, f"{palettes_path}[{i}]"))
+                for i, pal in enumerate(_require(entry["palettes"], list, palettes_path))
+            ]
+        for k in entry:
+            if k not in gp_out:
+                gp_out[k] = entry[k]
+        out.append(gp_out)
+    return out
+
+REVERSE_FORM_PLAN = OrderingPlan(FORM_HEAD_ORDER + FORM_TAIL_ORDER, {
+    "genderProperties": _reverse_gender_properties,
+    "growth_data": lambda new_form, path: OMIT,
+}, keep_extra=True)
+
+def reverse_form(new_form: dict, path: str = "$.forms[0]") -> dict:
+    """Convert a NEW form back to the OLD format (growth_data is dropped)"""
+    return REVERSE_FORM_PLAN.build(_require(new_form, dict, path), path)
+
+def _reverse_forms(new_doc: dict, ctx):
+    if "forms" not in new_doc:
+        return OMIT
+    return [reverse_form(f, f"$.forms[{i}]") for i, f in enumerate(_require(new_doc["forms"], list, "$.forms"))]
+
+REVERSE_DOCUMENT_PLAN = OrderingPlan(TOP_ORDER, {"forms": _reverse_forms}, keep_extra=True)
+
+def reverse_document(new_doc: dict) -> dict:
+    """Convert entire document from new format back to old format"""
+    return REVERSE_DOCUMENT_PLAN.build(_require(new_doc, dict, "$"))
+
+# Document transform for each conversion direction
+DOCUMENT_TRANSFORMS = {
+    "forward": convert_document,
+    "reverse": reverse_document,
+}
+
+@lru_cache(maxsize=64)
+def _bound_transform(direction: str, profile):
+    transform = DOCUMENT_TRANSFORMS[direction]
+    return partial(transform, profile=profile) if transform is convert_document else transform
+
+def document_transform(direction: str = "forward", profile=None):
+    """Document transform for a direction, bound to a conversion profile for OLD to NEW
+
+    Bound transforms are built once per (direction, profile) pair.
+    """
+    if direction not in DOCUMENT_TRANSFORMS:
+        raise KeyError(direction)
+    return _bound_transform(direction, profile or get_profile())
 
 # --------------------------- I/O functions ---------------------------
 
-def convert_json_string(json_string: str) -> str:
-    """Convert JSON string from old format to new format"""
+def convert_json_string(json_string: str, direction: str = "forward", profile=None) -> str:
+    """Convert JSON string from old format to new format (or back with ``direction='reverse'``)"""
     try:
-        old_doc = json.loads(json_string)
-        new_doc = convert_document(old_doc)
-        return json.dumps(new_doc, ensure_ascii=False, indent=2)
+        transform = document_transform(direction, profile)
+        return get_serializer().transcode(json_string.encode('utf-8'), transform).decode('utf-8')
     except Exception as e:
         raise Exception(f"Error converting JSON: {str(e)}")
 
-def convert_json_file_content(file_content: str, filename: str = "unknown") -> str:
-    """Convert JSON file content from old format to new format"""
+def convert_json_file_content(file_content: str, filename: str = "unknown", direction: str = "forward",
+                              profile=None) -> str:
+    """Convert JSON file content from old format to new format (or back with ``direction='reverse'``)"""
+    raw = file_content.encode('utf-8')
+    return convert_json_bytes(raw, filename, direction=direction, profile=profile).decode('utf-8')
+
+def convert_json_bytes(raw: bytes, filename: str = "unknown", cache=None, serializer=None,
+                       timings: dict = None, direction: str = "forward", profile=None, inspect=None) -> bytes:
+    """Convert UTF-8 JSON bytes, returning UTF-8 output bytes
+
+    When a ``cache`` is given, identical inputs are served from it without
+    being parsed again. Invalid UTF-8 raises ``UnicodeDecodeError`` unwrapped.
+    Per-stage seconds are stored in ``timings`` when given (nothing for cache hits).
+    ``direction`` selects the document transform from ``DOCUMENT_TRANSFORMS``;
+    ``profile`` is the ``ConversionProfile`` for its defaults (None = configured default).
+    ``inspect`` is called with each converted document before it is serialized.
+    """
+    profile = profile or get_profile()
+    transform = document_transform(direction, profile)
+    if inspect is not None:
+        transform = _inspected(transform, inspect)
+    key = None
+    if cache is not None:
+        key = cache.key(raw, direction, profile)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    try:
+        converted = (serializer or get_serializer()).transcode(raw, transform, timings)
+    except UnicodeDecodeError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error converting JSON file '{filename}': {str(e)}")
+    if key is not None:
+        cache.put(key, converted)
+    return converted
+
+def _inspected(transform, inspect):
+    def run(doc):
+        new_doc = transform(doc)
+        inspect(new_doc)
+        return new_doc
+    return run
+
+# --------------------------- batch engine ---------------------------
+
+# Bump whenever conversion output changes so cached results are invalidated
+CONVERTER_VERSION = "1"
+
+DEFAULT_BATCH_CHUNK_SIZE = 8
+
+def converted_filename(original_name: str, direction: str = "forward") -> str:
+    """Generate the '_new.json' output name for an input file
+
+    Reverse conversions turn 'x_new.json' back into 'x.json' and any other
+    'x.json' into 'x_old.json'.
+    """
+    if direction == "reverse":
+        if original_name.endswith('_new.json'):
+            return f"{original_name[:-9]}.json"
+        if original_name.endswith('.json'):
+            original_name = original_name[:-5]
+        return f"{original_name}_old.json"
+    if original_name.endswith('.json'):
+        original_name = original_name[:-5]  # Remove .json
+    return f"{original_name}_new.json"
+
+def entry_record(filename: str, error: str = None, direction: str = "forward") -> dict:
+    """Build the per-file result record reported for batch conversions"""
+    if error is not None:
+        return {
+            'original': filename,
+            'converted': None,
+            'status': 'error',
+            'error': error
+        }
+    return {
+        'original': filename,
+        'converted': converted_filename(filename, direction),
+        'status': 'success'
+    }
+
+def convert_entry(filename: str, raw, direction: str = "forward", profile=None, inspect=None):
+    """Convert one archive entry, returning its result record and converted bytes
+
+    ``raw`` may be the exception raised while reading the entry, so read
+    failures are reported in the same record format as conversion failures.
+    Successful records carry the per-stage seconds under ``'timings'``.
+    ``inspect`` is passed on to ``convert_json_bytes``.
+    """
+    timings = {}
     try:
-        old_doc = json.loads(file_content)
-        new_doc = convert_document(old_doc)
-        return json.dumps(new_doc, ensure_ascii=False, indent=2)
+        if isinstance(raw, Exception):
+            raise raw
+        converted_content = convert_json_bytes(
+            raw, filename, timings=timings, direction=direction, profile=profile, inspect=inspect
+        )
     except Exception as e:
-        raise Exception(f"Error converting JSON file '{filename}': {str(e)}")
\ No newline at end of file
+        return entry_record(filename, str(e)), None
+    record = entry_record(filename, direction=direction)
+    record['timings'] = timings
+    return record, converted_content
+
+def validate_entry(filename: str, raw, direction: str = "forward", profile=None):
+    """Pre-flight one archive entry: parse and validate it without converting
+
+    Returns a record with status ``'valid'`` or the same ``'error'`` record
+    the conversion would have produced, and no output bytes. NEW-format
+    inputs of a reverse conversion are only checked to be JSON objects.
+    Validation does not depend on the conversion ``profile``.
+    """
+    try:
+        if isinstance(raw, Exception):
+            raise raw
+        try:
+            doc = get_serializer().loads(raw)
+            if direction == "reverse":
+                _require(doc, dict, "$")
+            else:
+                check_document(doc)
+        except UnicodeDecodeError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error converting JSON file '{filename}': {str(e)}")
+    except Exception as e:
+        return entry_record(filename, str(e)), None
+    return {'original': filename, 'status': 'valid'}, None
+
+def convert_ndjson_line(line_no: int, raw, direction: str = "forward", profile=None):
+    """Convert one NDJSON input line, returning its result record and output line
+
+    The output line is a compact JSON object with the line number, status and
+    either the converted ``document`` or the ``error``.
+    """
+    serializer = get_serializer()
+    try:
+        if isinstance(raw, Exception):
+            raise raw
+        document = document_transform(direction, profile)(serializer.loads(raw))
+        out = {'line': line_no, 'status': 'success', 'document': document}
+        record = {'line': line_no, 'status': 'success'}
+    except Exception as e:
+        out = record = {'line': line_no, 'status': 'error', 'error': str(e)}
+    return record, serializer.dumps_line(out)
+
+def _convert_chunk(chunk: list, convert=convert_entry, direction: str = "forward", profile=None) -> list:
+    """Worker entry point: convert a list of (filename, bytes) pairs"""
+    return [convert(filename, raw, direction, profile) for filename, raw in chunk]
+
+_batch_pools = {}
+_batch_pools_lock = threading.Lock()
+
+def _pool_context():
+    # The server process runs threads (jobs, compression, ASGI pool); forking it could copy held locks
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def get_batch_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared process pool for the given worker count"""
+    with _batch_pools_lock:
+        pool = _batch_pools.get(workers)
+        if pool is None:
+            pool = _batch_pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+        return pool
+
+def discard_batch_pool(workers: int, pool: ProcessPoolExecutor):
+    """Forget a broken pool so the next batch starts a fresh one"""
+    with _batch_pools_lock:
+        if _batch_pools.get(workers) is pool:
+            del _batch_pools[workers]
+
+class _PendingChunk:
+    """A chunk of entries whose cache misses are converted inline or on the pool"""
+
+    def __init__(self, items: list, pool, cache, convert, direction, profile):
+        self.cache = cache
+        self.keys = []
+        self.slots = []
+        misses = []
+        for filename, raw in items:
+            key = hit = None
+            if cache is not None and isinstance(raw, bytes):
+                key = cache.key(raw, direction, profile)
+                hit = cache.get(key)
+            self.keys.append(key)
+            if hit is not None:
+                self.slots.append((entry_record(filename, direction=direction), hit))
+            else:
+                self.slots.append(None)
+                misses.append((filename, raw))
+        self.future = None
+        self.converted = []
+        if misses and pool is not None:
+            self.future = pool.submit(_convert_chunk, misses, convert, direction, profile)
+        elif misses:
+            self.converted = _convert_chunk(misses, convert, direction, profile)
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+
+    def results(self) -> list:
+        converted = iter(self.future.result() if self.future is not None else self.converted)
+        out = []
+        for slot, key in zip(self.slots, self.keys):
+            if slot is None:
+                slot = next(converted)
+                if key is not None and slot[1] is not None:
+                    self.cache.put(key, slot[1])
+            out.append(slot)
+        return out
+
+def iter_convert_batch(entries, workers: int = None, chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE, cache=None,
+                       convert=convert_entry, direction: str = "forward", profile=None):
+    """Yield (record, converted_bytes) for (filename, bytes) entries in input order
+
+    Entries are grouped into chunks and spread across a process pool. At most
+    two chunks per worker are in flight, so a lazy ``entries`` iterable is only
+    read as fast as the workers consume it. Entries found in ``cache`` are not
+    sent to the workers at all. ``convert`` must be a module-level function so
+    it can be sent to the workers; it is called as ``convert(filename, raw, direction, profile)``
+    with the ``ConversionProfile`` to convert with (the configured default if None).
+    """
+    profile = profile or get_profile()
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, chunk_size or DEFAULT_BATCH_CHUNK_SIZE)
+    pool = get_batch_pool(workers) if workers > 1 else None
+    max_pending = workers * 2
+
+    pending = deque()
+    chunk = []
+    try:
+        for item in entries:
+            chunk.append(item)
+            if len(chunk) < chunk_size:
+                continue
+            pending.append(_PendingChunk(chunk, pool, cache, convert, direction, profile))
+            chunk = []
+            # Keep results in archive order and bound the read-ahead
+            while len(pending) >= max_pending:
+                yield from pending.popleft().results()
+        if chunk:
+            pending.append(_PendingChunk(chunk, pool, cache, convert, direction, profile))
+        while pending:
+            yield from pending.popleft().results()
+    except BrokenProcessPool:
+        discard_batch_pool(workers, pool)
+        raise
+    finally:
+        for item in pending:
+            item.cancel()
@@ -0,0 +1,99 @@
+"""
+Synthetic OLD format species documents for benchmarks
+"""
+import random
+
+GENDERS = ["male", "female"]
+PALETTE_NAMES = ["none", "shiny"]
+
+
+def make_palette(species: str, form: str, name: str, pqc_entries: int, rng: random.Random) -> dict:
+    """Build one OLD palette with textures, sounds and a PQC model locator"""
+    base = f"pixelmon/textures/pokemon/{species}/{form}"
+    palette = {
+        "name": name,
+        "texture": f"{base}/{name}.png",
+        "sprite": f"pixelmon/sprites/pokemon/{species}/{form}/{name}.png",
+        "sounds": [f"{species}", f"pixelmon:{species}_cry"],
+        "modelLocator": {
+            "pqc": [f"pixelmon/models/pokemon/{species}/{form}/model_{i}.pqc" for i in range(pqc_entries)]
+        },
+    }
+    if name == "shiny":
+        palette["particle"] = "shiny"
+    if rng.random() < 0.2:
+        palette["emissive"] = f"{base}/{name}_emissive.png"
+    return palette
+
+
+def make_form(species: str, index: int, gender_properties: int, palettes: int,
+              pqc_entries: int, spawn_blocks: int, rng: random.Random) -> dict:
+    """Build one OLD form with the requested amount of nested data"""
+    form = "base" if index == 0 else f"form{index}"
+    names = (PALETTE_NAMES + [f"variant{i}" for i in range(palettes)])[:palettes]
+    return {
+        "name": "" if index == 0 else form,
+        "experienceGroup": "MediumFast",
+        "dimensions": {"height": round(rng.uniform(0.2, 3.0), 1), "width": 1.0, "length": 1.0, "eyeHeight": 0.8},
+        "moves": {
+            "levelUpMoves": [{"level": lvl, "attacks": [f"Move{lvl}"]} for lvl in range(1, 50, 4)],
+            "tmMoves8": [f"Tm{i}" for i in range(20)],
+            "eggMoves": ["Curse", "Protect"],
+        },
+        "abilities": {"abilities": ["Overgrow"], "hiddenAbilities": ["Chlorophyll"]},
+        "movement": {"canFly": rng.random() < 0.3, "canSurf": rng.random() < 0.3, "rideable": False},
+        "aggression": {"timid": 40, "passive": 40, "aggressive": 20},
+        "battleStats": {"hp": 45, "attack": 49, "defense": 49, "specialAttack": 65, "specialDefense": 65, "speed": 45},
+        "tags": ["starter"] if index == 0 else [],
+        "spawn": {
+            "spawnLocations": ["LAND"],
+            "spawnLevelRange": 10,
+            "baseExp": 64,
+            "spawnLevel": 5,
+            "baseFriendship": 70,
+            "spawnBlocks": [
+                {"biomes": [f"minecraft:biome_{i}"], "times": ["DAY"], "weight": rng.randint(1, 20)}
+                for i in range(spawn_blocks)
+            ],
+        },
+        "possibleGenders": GENDERS[:max(1, gender_properties)],
+        "genderProperties": [
+            {
+                "gender": GENDERS[g % len(GENDERS)],
+                "palettes": [make_palette(species, form, n, pqc_entries, rng) for n in names],
+            }
+            for g in range(gender_properties)
+        ],
+        "eggGroups": ["Monster", "Grass"],
+        "types": ["Grass", "Poison"],
+        "preEvolutions": [],
+        "eggCycles": 20,
+        "weight": round(rng.uniform(1, 100), 1),
+        "catchRate": 45,
+        "malePercentage": 87.5,
+        "evolutions": [{"to": {"name": f"{species}_evo"}, "level": 16, "evoType": "leveling"}],
+        "evYields": {"specialAttack": 1},
+    }
+
+
+def make_species(dex: int, forms: int = 1, gender_properties: int = 2, palettes: int = 2,
+                 pqc_entries: int = 1, spawn_blocks: int = 2, seed: int = 0) -> dict:
+    """Build a synthetic OLD format species document"""
+    rng = random.Random(seed * 100003 + dex)
+    species = f"species{dex:04d}"
+    return {
+        "name": species.capitalize(),
+        "dex": dex,
+        "defaultForms": ["base"],
+        "forms": [
+            make_form(species, i, gender_properties, palettes, pqc_entries, spawn_blocks, rng)
+            for i in range(forms)
+        ],
+        "generation": 1 + dex % 9,
+    }
+
+
+def iter_corpus(count: int, **knobs):
+    """Yield (filename, document) pairs for ``count`` synthetic species"""
+    for dex in range(1, count + 1):
+        yield f"species/{dex:04d}.json", make_species(dex, **knobs)
@@ -0,0 +1,93 @@
+"""
+Per-form conversion for the live editor preview
+
+A form's conversion depends only on the form itself, the profile and
+whether the movement rules it falls back to (the document's first form's
+``movement``, unless it has its own) allow flying and swimming. Results are
+cached under a hash of that document context plus a hash of the form, so
+editing one form of a large species re-runs that form alone; every other
+form keeps hitting the cache until the movement flags change.
+"""
+import hashlib
+import json
+
+from .conversion_logic import (
+    convert_form, document_movement_fallback, normalize_form_name, wants_flying, wants_swimming,
+)
+from .profiles import get_profile
+from .serializers import get_serializer
+from .validation import SchemaError, json_type, validate_form
+
+
+def select_form(forms: list, selector) -> int:
+    """Index of the form named by ``selector``: its index (an int or digit string) or its name
+
+    Names match after the usual normalization ('' and null mean 'base').
+    Raises ``ValueError`` when no form matches.
+    """
+    if isinstance(selector, bool):
+        raise ValueError("form must be an index or a form name")
+    if isinstance(selector, str) and selector.strip().isdigit():
+        selector = int(selector)
+    if isinstance(selector, int):
+        if not 0 <= selector < len(forms):
+            raise ValueError(f"form index {selector} out of range (document has {len(forms)} forms)")
+        return selector
+    if selector is None or isinstance(selector, str):
+        wanted = str(normalize_form_name(selector)).strip().lower()
+        for index, form in enumerate(forms):
+            if isinstance(form, dict) and str(normalize_form_name(form.get("name"))).strip().lower() == wanted:
+                return index
+        raise ValueError(f"no form named '{normalize_form_name(selector)}'")
+    raise ValueError("form must be an index or a form name")
+
+
+def form_cache_key(cache, movement: tuple, form_bytes: bytes, profile) -> str:
+    """Cache key of one converted form: document context hash + form hash (+ version and profile)"""
+    document_hash = hashlib.sha256(repr(movement).encode('ascii')).digest()
+    form_hash = hashlib.sha256(form_bytes).digest()
+    return cache.key(b"form\0" + document_hash + form_hash, "forward", profile)
+
+
+def preview_form(raw: bytes, selector, cache=None, profile=None) -> dict:
+    """Convert the form ``selector`` picks from an OLD document given as UTF-8 bytes
+
+    Returns the form's index, name and converted JSON text, the document's
+    form count and whether the result came from ``cache``. Raises
+    ``ValueError`` (``SchemaError`` for shape errors) for unusable input.
+    """
+    profile = profile or get_profile()
+    serializer = get_serializer()
+    doc = serializer.loads(raw)
+    if not isinstance(doc, dict):
+        raise SchemaError([f"$: expected object, got {json_type(doc)}"])
+    forms = doc.get("forms", [])
+    if not isinstance(forms, list):
+        raise SchemaError([f"$.forms: expected array, got {json_type(forms)}"])
+    index = select_form(forms, selector)
+    old_form = forms[index]
+    errors = validate_form(old_form, f"$.forms[{index}]")
+    if errors:
+        raise SchemaError(errors)
+
+    movement_fallback = document_movement_fallback(doc)
+    rules = old_form.get("movement") or movement_fallback or {}
+    key = None
+    converted = None
+    if cache is not None:
+        # The stdlib encoder takes every value a parsed document can hold (big ints, NaN)
+        form_bytes = json.dumps(old_form, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        key = form_cache_key(cache, (wants_flying(rules), wants_swimming(rules)), form_bytes, profile)
+        converted = cache.get(key)
+    cached = converted is not None
+    if not cached:
+        converted = serializer.dumps_converted(convert_form(old_form, movement_fallback, profile), raw.decode('utf-8'))
+        if key is not None:
+            cache.put(key, converted)
+    return {
+        'index': index,
+        'name': normalize_form_name(old_form.get("name")),
+        'form_count': len(forms),
+        'converted_form': converted.decode('utf-8'),
+        'cached': cached,
+    }
@@ -0,0 +1,301 @@
+"""
+Background conversion jobs for large ZIP archives
+
+Job state lives on disk under MEDIA_ROOT/conversion_jobs/<job_id>/ so any
+worker process can report progress and serve the result:
+
+    input.zip    the uploaded archive
+    status.json  progress, updated while the job runs
+    previous.zip optional earlier result for incremental conversion
+    output.zip   the converted archive once the job is done
+"""
+import contextlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from .asset_registry import AssetRegistry
+from .profiles import get_profile
+from .zip_input import check_zip_limits, open_input_zip
+from .zip_batch import CompressionProfile, list_json_entries, preflight_zip, PreflightRejected, stream_converted_zip
+
+JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Progress is flushed to status.json at most this often while a job runs
+STATUS_INTERVAL = 0.5
+
+# Jobs still waiting for or held by a worker are kept; only a crashed process leaves one this old
+ACTIVE_STATES = ('queued', 'validating', 'running')
+ABANDONED_AFTER = 24 * 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+_cleanup_thread = None
+
+
+def jobs_root() -> Path:
+    return Path(settings.MEDIA_ROOT) / 'conversion_jobs'
+
+
+def job_dir(job_id: str) -> Path:
+    """Directory of a job; raises ValueError for malformed ids"""
+    if not JOB_ID_RE.match(job_id or ''):
+        raise ValueError(f"Invalid job id: {job_id}")
+    return jobs_root() / job_id
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide job worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CONVERTER_JOB_WORKERS', 2),
+                thread_name_prefix='conversion-job',
+            )
+        return _executor
+
+
+def start_cleanup_timer():
+    """Start this process's periodic removal of expired jobs, once"""
+    global _cleanup_thread
+    with _executor_lock:
+        if _cleanup_thread is None:
+            _cleanup_thread = threading.Thread(
+                target=_cleanup_loop,
+                args=(getattr(settings, 'CONVERTER_JOB_CLEANUP_INTERVAL', 300),),
+                name='conversion-job-cleanup',
+                daemon=True,
+            )
+            _cleanup_thread.start()
+
+
+def _cleanup_loop(interval: float):
+    while True:
+        try:
+            cleanup_expired_jobs()
+        except Exception:
+            pass  # retried on the next tick
+        time.sleep(interval)
+
+
+def write_status(job_id: str, status: dict):
+    """Atomically replace a job's status.json"""
+    path = job_dir(job_id) / 'status.json'
+    status['updated'] = time.time()
+    tmp = path.with_name(f"status.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(status), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def read_status(job_id: str):
+    """Return a job's status dict, or None if the job does not exist"""
+    try:
+        return json.loads((job_dir(job_id) / 'status.json').read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def spool_upload(uploaded_file, path: Path):
+    """Copy an uploaded file to ``path`` chunk by chunk"""
+    with open(path, 'wb') as out:
+        for chunk in uploaded_file.chunks():
+            out.write(chunk)
+
+
+def create_job(uploaded_file, previous_file=None, preflight: tuple = ('off', None), direction: str = "forward",
+               asset_manifest: bool = False, compression: CompressionProfile = None, profile=None) -> dict:
+    """Spool an uploaded archive to disk and queue it for conversion
+
+    ``previous_file`` is an optional earlier converted archive whose
+    unchanged members are reused. ``preflight`` is a (mode, max_invalid)
+    pair as returned by ``preflight_options``; ``direction`` is 'forward'
+    (OLD to NEW) or 'reverse'. With ``asset_manifest`` the output archive
+    also carries the pack-wide asset manifest. ``compression`` is the output
+    ``CompressionProfile`` (deflate at the default level if None) and
+    ``profile`` the ``ConversionProfile`` (the configured default if None).
+    Raises ``zipfile.BadZipFile`` for invalid archives and ``ValueError`` when
+    the archive holds no JSON files or exceeds the ZIP limits.
+    """
+    start_cleanup_timer()
+    compression = compression or CompressionProfile()
+    profile = profile or get_profile()
+    job_id = uuid.uuid4().hex
+    directory = job_dir(job_id)
+    directory.mkdir(parents=True)
+    try:
+        input_path = directory / 'input.zip'
+        spool_upload(uploaded_file, input_path)
+        with open_input_zip(input_path) as zip_file:
+            json_files = list_json_entries(zip_file, direction)
+            if json_files:
+                check_zip_limits(zip_file, json_files)
+        total = len(json_files)
+        if not total:
+            raise ValueError('No JSON files found in ZIP archive')
+        if previous_file is not None:
+            previous_path = directory / 'previous.zip'
+            spool_upload(previous_file, previous_path)
+            try:
+                zipfile.ZipFile(previous_path, 'r').close()
+            except zipfile.BadZipFile:
+                raise ValueError('Invalid previous ZIP file')
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    name = uploaded_file.name
+    if name.endswith('.zip'):
+        name = name[:-4]  # Remove .zip
+    status = {
+        'job_id': job_id,
+        'incremental': previous_file is not None,
+        'direction': direction,
+        'asset_manifest': asset_manifest,
+        'compression': compression.name,
+        'compression_level': compression.level,
+        'profile': profile.name,
+        'preflight': preflight[0],
+        'max_invalid': preflight[1],
+        'state': 'queued',
+        'filename': f"{name}_converted.zip",
+        'total': total,
+        'done': 0,
+        'converted': 0,
+        'reused': 0,
+        'failed': 0,
+        'errors': [],
+        'stage_seconds': {},
+        'created': time.time(),
+        'finished': None,
+    }
+    write_status(job_id, status)
+    get_executor().submit(run_job, job_id)
+    return status
+
+
+def run_job(job_id: str):
+    """Convert a queued job's archive into output.zip, reporting progress"""
+    status = read_status(job_id)
+    if status is None:
+        return
+    directory = job_dir(job_id)
+    status['state'] = 'running'
+    write_status(job_id, status)
+
+    results = []
+    reported = 0
+    last_write = time.monotonic()
+    partial = directory / 'output.zip.part'
+    try:
+        # Both archives are closed however the job ends; the worker thread outlives it
+        with contextlib.ExitStack() as archives:
+            zip_file = archives.enter_context(
+                open_input_zip(directory / 'input.zip', limits=False)  # checked when the job was created
+            )
+            previous = None
+            if (directory / 'previous.zip').exists():
+                previous = archives.enter_context(zipfile.ZipFile(directory / 'previous.zip', 'r'))
+            direction = status.get('direction', 'forward')
+            json_files = list_json_entries(zip_file, direction)
+            assets = AssetRegistry() if status.get('asset_manifest') else None
+            compression = CompressionProfile(status.get('compression', 'deflate'), status.get('compression_level'))
+            profile = get_profile(status.get('profile'))
+            skip = None
+            if status.get('preflight', 'off') != 'off':
+                status['state'] = 'validating'
+                write_status(job_id, status)
+                try:
+                    skip = preflight_zip(zip_file, json_files, status.get('max_invalid'), direction)
+                except PreflightRejected as e:
+                    status['errors'] = [{'original': name, 'error': error} for name, error in e.invalid.items()]
+                    raise
+                status['state'] = 'running'
+                write_status(job_id, status)
+            with open(partial, 'wb') as out:
+                for chunk in stream_converted_zip(
+                    zip_file, json_files, results, previous, skip, direction, assets, compression, profile
+                ):
+                    out.write(chunk)
+                    if time.monotonic() - last_write >= STATUS_INTERVAL:
+                        reported = _record_progress(status, results, reported)
+                        write_status(job_id, status)
+                        last_write = time.monotonic()
+        os.replace(partial, directory / 'output.zip')
+        _record_progress(status, results, reported)
+        status['state'] = 'done'
+    except Exception as e:
+        status['state'] = 'failed'
+        status['error'] = str(e)
+        try:
+            partial.unlink()
+        except OSError:
+            pass
+    finally:
+        # Inputs go before the final status, so a finished job never still holds them
+        for name in ('input.zip', 'previous.zip'):
+            try:
+                (directory / name).unlink()
+            except OSError:
+                pass
+        status['finished'] = time.time()
+        write_status(job_id, status)
+
+
+def _record_progress(status: dict, results: list, reported: int) -> int:
+    """Fold result records added since the last report into ``status``"""
+    for record in results[reported:]:
+        status['done'] += 1
+        if record.get('reused'):
+            status['reused'] += 1
+        elif record['status'] == 'success':
+            status['converted'] += 1
+            for stage, seconds in record.get('timings', {}).items():
+                status['stage_seconds'][stage] = status['stage_seconds'].get(stage, 0.0) + seconds
+        else:
+            status['failed'] += 1
+            status['errors'].append({'original': record['original'], 'error': record['error']})
+    return len(results)
+
+
+def output_path(job_id: str) -> Path:
+    return job_dir(job_id) / 'output.zip'
+
+
+def cleanup_expired_jobs(ttl: int = None):
+    """Delete finished and failed jobs whose status has not changed for longer than the TTL
+
+    Queued and running jobs (and jobs still being created) are kept until
+    ``ABANDONED_AFTER``, however long they wait for a worker.
+    """
+    ttl = ttl if ttl is not None else getattr(settings, 'CONVERTER_JOB_TTL', 3600)
+    root = jobs_root()
+    if not root.is_dir():
+        return
+    now = time.time()
+    for directory in root.iterdir():
+        if not JOB_ID_RE.match(directory.name):
+            continue
+        try:
+            mtime = (directory / 'status.json').stat().st_mtime
+        except OSError:
+            try:
+                mtime = directory.stat().st_mtime
+            except OSError:
+                continue  # removed meanwhile
+        status = read_status(directory.name)
+        if status is None or status.get('state') in ACTIVE_STATES:
+            expired = now - mtime > max(ttl, ABANDONED_AFTER)
+        else:
+            expired = now - mtime > ttl
+        if expired:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,148 @@
+"""
+Benchmark the conversion pipeline on a synthetic species corpus
+"""
+import io
+import json
+import time
+import zipfile
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from converter.conversion_logic import convert_document
+from converter.corpus import iter_corpus
+from converter.serializers import get_serializer
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, if the platform reports it"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+
+class Command(BaseCommand):
+    help = "Time convert_document, serialization and the /convert-zip/ view on a synthetic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=200, help='Number of species documents')
+        parser.add_argument('--forms', type=int, default=3, help='Forms per species')
+        parser.add_argument('--gender-properties', type=int, default=2, help='genderProperties per form')
+        parser.add_argument('--palettes', type=int, default=2, help='Palettes per gender')
+        parser.add_argument('--pqc', type=int, default=1, help='pqc entries per palette')
+        parser.add_argument('--spawn-blocks', type=int, default=2, help='Spawn blocks per form')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the best one is reported')
+        parser.add_argument('--backend', default=None, help='JSON backend (json, orjson, auto)')
+        parser.add_argument('--with-cache', action='store_true', help='Leave the result cache enabled for the view stage')
+        parser.add_argument('--compression', help='Output ZIP profile for the view stage (stored, deflate, bzip2, lzma)')
+        parser.add_argument('--compression-level', type=int, help='Level for the deflate or bzip2 profile')
+        parser.add_argument('--write-corpus', help='Also write the generated OLD files into this directory')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        serializer = get_serializer(options['backend'])
+        knobs = {
+            'forms': options['forms'],
+            'gender_properties': options['gender_properties'],
+            'palettes': options['palettes'],
+            'pqc_entries': options['pqc'],
+            'spawn_blocks': options['spawn_blocks'],
+            'seed': options['seed'],
+        }
+        corpus = [
+            (name, json.dumps(doc, ensure_ascii=False, indent=2).encode('utf-8'))
+            for name, doc in iter_corpus(options['files'], **knobs)
+        ]
+        if options['write_corpus']:
+            root = Path(options['write_corpus'])
+            for name, raw in corpus:
+                path = root / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(raw)
+
+        bytes_in = sum(len(raw) for _, raw in corpus)
+        parsed = [serializer.loads(raw) for _, raw in corpus]
+        converted = [convert_document(doc) for doc in parsed]
+        bytes_out = sum(len(serializer.dumps(doc)) for doc in converted)
+
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, raw in corpus:
+                zf.writestr(name, raw)
+        zip_bytes = zip_buffer.getvalue()
+
+        client = Client()
+        url = reverse('converter:convert_zip')
+
+        def view_path():
+            upload = io.BytesIO(zip_bytes)
+            upload.name = 'benchmark.zip'
+            data = {'zip_file': upload}
+            if options['compression']:
+                data['compression'] = options['compression']
+            if options['compression_level'] is not None:
+                data['compression_level'] = options['compression_level']
+            response = client.post(url, data)
+            if response.status_code != 200:
+                raise RuntimeError(f"/convert-zip/ returned {response.status_code}")
+            for _ in response.streaming_content:
+                pass
+
+        stages = [
+            ('parse', lambda: [serializer.loads(raw) for _, raw in corpus], bytes_in),
+            ('convert_document', lambda: [convert_document(doc) for doc in parsed], bytes_in),
+            ('serialize', lambda: [serializer.dumps(doc) for doc in converted], bytes_out),
+            ('convert_zip view', view_path, bytes_in),
+        ]
+
+        report = {
+            'files': len(corpus),
+            'backend': serializer.name,
+            'input_mb': bytes_in / (1024 * 1024),
+            'output_mb': bytes_out / (1024 * 1024),
+            'knobs': knobs,
+            'stages': {},
+        }
+        for label, run, nbytes in stages:
+            best = None
+            for _ in range(max(1, options['repeat'])):
+                if label == 'convert_zip view' and not options['with_cache']:
+                    with override_settings(CONVERTER_CACHE_MAX_BYTES=0):
+                        start = time.perf_counter()
+                        run()
+                else:
+                    start = time.perf_counter()
+                    run()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            report['stages'][label] = {
+                'seconds': best,
+                'files_per_sec': len(corpus) / best if best else 0.0,
+                'mb_per_sec': nbytes / (1024 * 1024) / best if best else 0.0,
+            }
+        report['peak_rss_mb'] = peak_rss_mb()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['files']} files, {report['input_mb']:.2f} MB in, "
+            f"{report['output_mb']:.2f} MB out, backend={report['backend']}"
+        )
+        for label, stats in report['stages'].items():
+            self.stdout.write(
+                f"  {label:<18} {stats['seconds']:8.3f}s  "
+                f"{stats['files_per_sec']:9.1f} files/s  {stats['mb_per_sec']:8.2f} MB/s"
+            )
+        if report['peak_rss_mb'] is not None:
+            self.stdout.write(f"  peak RSS           {report['peak_rss_mb']:.1f} MB")
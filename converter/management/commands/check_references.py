@@ -0,0 +1,45 @@
+"""
+Report evolution/form references that do not resolve within a pack
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.reference_index import build_reference_index
+from converter.zip_batch import iter_pack_entries
+
+
+class Command(BaseCommand):
+    help = "Index every species in a directory or ZIP and report dangling evolutions, preEvolutions and default forms"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory (scanned recursively) or ZIP archive of .json files')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            entries = iter_pack_entries(options['source'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        index, errors = build_reference_index(entries)
+        report = {**index.report(), 'errors': errors, 'seconds': round(time.perf_counter() - start, 3)}
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for error in errors:
+            self.stderr.write(f"✗ {error['original']}: {error['error']}")
+        for issue in report['dangling']:
+            self.stdout.write(
+                f"{issue['source']} {issue['path']}: {issue['kind']} -> {issue['target']} ({issue['reason']})"
+            )
+        self.stdout.write(
+            f"{report['species']} species, {report['forms']} forms, {report['references']} references in "
+            f"{report['files']} file(s): {len(report['dangling'])} dangling, {len(errors)} unreadable "
+            f"({report['seconds']:.2f}s)"
+        )
+        if report['dangling']:
+            self.stdout.write(self.style.WARNING(f"{len(report['dangling'])} reference(s) do not resolve"))
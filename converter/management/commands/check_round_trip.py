@@ -0,0 +1,68 @@
+"""
+Report what a pack loses when converted to the other format and back
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.conversion_logic import iter_convert_batch
+from converter.round_trip import merge_reports, round_trip_entry
+from converter.zip_batch import iter_pack_entries
+
+
+class Command(BaseCommand):
+    help = "Round-trip every JSON file in a directory or ZIP (OLD -> NEW -> OLD by default) and report loss per field"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory (scanned recursively) or ZIP archive of .json files')
+        parser.add_argument('--reverse', action='store_true', help='Files are NEW format: check NEW -> OLD -> NEW')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'CONVERTER_BATCH_WORKERS', None),
+                            help='Worker processes (default: one per CPU core)')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'CONVERTER_BATCH_CHUNK_SIZE', None),
+                            help='Files handed to a worker per task')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        direction = 'reverse' if options['reverse'] else 'forward'
+        try:
+            entries = iter_pack_entries(options['source'], direction)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        fields = {}
+        summary = {'files': 0, 'lossless': 0, 'errors': 0}
+        start = time.perf_counter()
+        batch = iter_convert_batch(
+            entries, workers=options['workers'], chunk_size=options['chunk_size'],
+            convert=round_trip_entry, direction=direction,
+        )
+        for record, _ in batch:
+            summary['files'] += 1
+            if record['status'] != 'success':
+                summary['errors'] += 1
+                self.stderr.write(f"✗ {record['original']}: {record['error']}")
+                continue
+            if not record['fields']:
+                summary['lossless'] += 1
+            elif options['verbosity'] > 1:
+                self.stdout.write(f"~ {record['original']}: {', '.join(sorted(record['fields']))}")
+            merge_reports(fields, record['fields'])
+        summary['seconds'] = round(time.perf_counter() - start, 3)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'direction': direction, **summary, 'fields': fields}, indent=2))
+            return
+        self.stdout.write(
+            f"{summary['files']} file(s): {summary['lossless']} lossless, "
+            f"{summary['files'] - summary['lossless'] - summary['errors']} with losses, "
+            f"{summary['errors']} error(s) in {summary['seconds']:.2f}s"
+        )
+        if fields:
+            width = max(len(field) for field in fields)
+            self.stdout.write(f"{'field'.ljust(width)}  {'lost':>7}  {'added':>7}  {'changed':>7}")
+            for field, counts in sorted(fields.items(), key=lambda item: -sum(item[1].values())):
+                self.stdout.write(
+                    f"{field.ljust(width)}  {counts['lost']:>7}  {counts['added']:>7}  {counts['changed']:>7}"
+                )
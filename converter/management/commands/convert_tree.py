@@ -0,0 +1,114 @@
+"""
+Bulk-convert a directory tree of OLD format species JSON files
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.asset_registry import AssetRegistry, convert_entry_with_assets, manifest_json
+from converter.conversion_logic import convert_entry, converted_filename, iter_convert_batch
+from converter.profiles import get_profile
+
+
+class Command(BaseCommand):
+    help = "Convert every species JSON under a directory, writing '_new.json' files next to them or into a mirror tree"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory to scan recursively for .json files')
+        parser.add_argument('--output-dir', help='Write outputs into this mirror tree instead of next to the inputs')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'CONVERTER_BATCH_WORKERS', None),
+                            help='Worker processes (default: one per CPU core)')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'CONVERTER_BATCH_CHUNK_SIZE', None),
+                            help='Files handed to a worker per task')
+        parser.add_argument('--force', action='store_true', help='Convert even if the output is newer than the input')
+        parser.add_argument('--reverse', action='store_true',
+                            help="Convert NEW format files back to OLD ('x_new.json' -> 'x.json', else 'x_old.json')")
+        parser.add_argument('--profile', help='Conversion profile for the defaults filled in (default: the configured one)')
+        parser.add_argument('--asset-manifest', metavar='PATH',
+                            help='Also write a manifest of the unique models, textures and animations used')
+
+    def handle(self, *args, **options):
+        source = Path(options['source'])
+        if not source.is_dir():
+            raise CommandError(f"Not a directory: {source}")
+        direction = 'reverse' if options['reverse'] else 'forward'
+        if direction == 'reverse' and not options['output_dir']:
+            # 'x_new.json' reverses to 'x.json', which would overwrite the original OLD file in place
+            raise CommandError("--reverse requires --output-dir")
+        if direction == 'reverse' and options['asset_manifest']:
+            raise CommandError("--asset-manifest is only available for OLD to NEW conversions")
+        assets = AssetRegistry() if options['asset_manifest'] else None
+        try:
+            profile = get_profile(options['profile'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        target = Path(options['output_dir']) if options['output_dir'] else source
+        produced = '_old.json' if direction == 'reverse' else '_new.json'
+
+        pending = []
+        skipped = 0
+        for path in sorted(source.rglob('*.json')):
+            if path.name.endswith(produced) or not path.is_file():
+                continue
+            rel = path.relative_to(source).as_posix()
+            out_path = target / converted_filename(rel, direction)
+            if not options['force'] and out_path.exists() and out_path.stat().st_mtime >= path.stat().st_mtime:
+                skipped += 1
+                continue
+            pending.append(rel)
+
+        stats = {'converted': 0, 'errors': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+        def entries():
+            # Read lazily so only the in-flight chunks are held in memory
+            for rel in pending:
+                try:
+                    raw = (source / rel).read_bytes()
+                except OSError as e:
+                    yield rel, e
+                    continue
+                stats['bytes_in'] += len(raw)
+                yield rel, raw
+
+        start = time.perf_counter()
+        batch = iter_convert_batch(
+            entries(), workers=options['workers'], chunk_size=options['chunk_size'],
+            convert=convert_entry_with_assets if assets is not None else convert_entry, direction=direction,
+            profile=profile,
+        )
+        for record, converted_content in batch:
+            if record['status'] != 'success':
+                stats['errors'] += 1
+                self.stderr.write(f"✗ {record['original']}: {record['error']}")
+                continue
+            data = converted_content
+            out_path = target / record['converted']
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            out_path.write_bytes(data)
+            stats['converted'] += 1
+            if assets is not None:
+                assets.add(record['original'], record.pop('assets'))
+            stats['bytes_out'] += len(data)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"✓ {record['original']} -> {record['converted']}")
+        elapsed = time.perf_counter() - start
+        if assets is not None:
+            manifest = assets.manifest()
+            Path(options['asset_manifest']).write_bytes(manifest_json(manifest))
+            self.stdout.write(
+                f"Asset manifest: {manifest['unique_models']} model(s), {manifest['unique_textures']} texture(s), "
+                f"{len(manifest['hints'])} hint(s) -> {options['asset_manifest']}"
+            )
+
+        processed = stats['converted'] + stats['errors']
+        rate = processed / elapsed if elapsed else 0.0
+        mb_rate = stats['bytes_in'] / (1024 * 1024) / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"Converted {stats['converted']} file(s), {stats['errors']} error(s), {skipped} up to date "
+            f"in {elapsed:.2f}s ({rate:.1f} files/s, {mb_rate:.2f} MB/s in, "
+            f"{stats['bytes_out'] / (1024 * 1024):.2f} MB written)"
+        )
+        if stats['errors']:
+            self.stdout.write(self.style.WARNING(f"{stats['errors']} file(s) failed to convert"))
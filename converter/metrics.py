@@ -0,0 +1,206 @@
+"""
+Conversion pipeline metrics
+
+Per-stage timings, byte counts and per-view request counters, kept in
+process memory (each gunicorn worker reports its own numbers) and rendered
+as Prometheus text or JSON by the metrics view.
+"""
+import bisect
+import functools
+import threading
+import time
+
+STAGES = ["zip_read", "preflight", "parse", "convert", "serialize", "zip_deflate"]
+
+SECONDS_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+BYTES_BUCKETS = [1024 * 2 ** i for i in range(0, 15, 2)]  # 1KB .. 16MB
+
+TIMING_HEADER = 'X-Conversion-Timing'
+
+
+class Histogram:
+    """Cumulative bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets: list):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + [float('inf')], self.counts):
+            running += n
+            cumulative.append(('+Inf' if bound == float('inf') else bound, running))
+        return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class ConversionMetrics:
+    """Thread-safe registry of pipeline histograms and request counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {stage: Histogram(SECONDS_BUCKETS) for stage in STAGES}
+            self.bytes = {kind: Histogram(BYTES_BUCKETS) for kind in ("input", "output")}
+            self.files = {"converted": 0, "failed": 0, "cached": 0}
+            self.compression = {}
+            self.requests = {}
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    def observe_file(self, status: str, timings: dict = None, bytes_in: int = None, bytes_out: int = None):
+        """Record one converted (or failed, or cache-served) file"""
+        with self._lock:
+            self.files[status] += 1
+            for stage, seconds in (timings or {}).items():
+                self.stages[stage].observe(seconds)
+            if bytes_in is not None:
+                self.bytes["input"].observe(bytes_in)
+            if bytes_out is not None:
+                self.bytes["output"].observe(bytes_out)
+
+    def observe_compression(self, profile: str, seconds: float, bytes_in: int, bytes_out: int):
+        """Record one ZIP member compressed with the given output profile"""
+        with self._lock:
+            totals = self.compression.get(profile)
+            if totals is None:
+                totals = self.compression[profile] = {'files': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0}
+            totals['files'] += 1
+            totals['seconds'] += seconds
+            totals['bytes_in'] += bytes_in
+            totals['bytes_out'] += bytes_out
+
+    def observe_request(self, view: str, status_code: int, seconds: float):
+        with self._lock:
+            counters = self.requests.get(view)
+            if counters is None:
+                counters = self.requests[view] = {
+                    'requests': 0, 'client_errors': 0, 'server_errors': 0,
+                    'duration': Histogram(SECONDS_BUCKETS),
+                }
+            counters['requests'] += 1
+            if 400 <= status_code < 500:
+                counters['client_errors'] += 1
+            elif status_code >= 500:
+                counters['server_errors'] += 1
+            counters['duration'].observe(seconds)
+
+    def snapshot(self) -> dict:
+        """JSON-friendly copy of every metric"""
+        with self._lock:
+            requests = {}
+            for view, counters in self.requests.items():
+                errors = counters['client_errors'] + counters['server_errors']
+                requests[view] = {
+                    'requests': counters['requests'],
+                    'client_errors': counters['client_errors'],
+                    'server_errors': counters['server_errors'],
+                    'error_rate': errors / counters['requests'] if counters['requests'] else 0.0,
+                    'duration_seconds': counters['duration'].snapshot(),
+                }
+            return {
+                'files': dict(self.files),
+                'stage_seconds': {stage: h.snapshot() for stage, h in self.stages.items()},
+                'file_bytes': {kind: h.snapshot() for kind, h in self.bytes.items()},
+                'compression': {profile: dict(totals) for profile, totals in self.compression.items()},
+                'requests': requests,
+            }
+
+    def prometheus(self, extra_families: list = None) -> str:
+        """Render metrics in the Prometheus text exposition format
+
+        ``extra_families`` adds ``(name, type, help, samples)`` families, each
+        sample a ``(labels dict, value)`` pair.
+        """
+        snap = self.snapshot()
+        lines = []
+
+        def histogram(name, help_text, label, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in histograms.items():
+                for bound, n in h['buckets']:
+                    lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {n}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {h["sum"]}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {h["count"]}')
+
+        lines.append("# HELP converter_files_total Files processed by outcome")
+        lines.append("# TYPE converter_files_total counter")
+        for status, n in snap['files'].items():
+            lines.append(f'converter_files_total{{status="{status}"}} {n}')
+        histogram("converter_stage_seconds", "Per-file time spent in each pipeline stage", "stage", snap['stage_seconds'])
+        histogram("converter_file_bytes", "Per-file input and output sizes", "kind", snap['file_bytes'])
+
+        lines.append("# HELP converter_zip_compress_seconds_total Time spent compressing ZIP members per output profile")
+        lines.append("# TYPE converter_zip_compress_seconds_total counter")
+        for profile, totals in snap['compression'].items():
+            lines.append(f'converter_zip_compress_seconds_total{{profile="{profile}"}} {totals["seconds"]}')
+        lines.append("# HELP converter_zip_compress_bytes_total Bytes before and after compression per output profile")
+        lines.append("# TYPE converter_zip_compress_bytes_total counter")
+        for profile, totals in snap['compression'].items():
+            lines.append(f'converter_zip_compress_bytes_total{{profile="{profile}",kind="input"}} {totals["bytes_in"]}')
+            lines.append(f'converter_zip_compress_bytes_total{{profile="{profile}",kind="output"}} {totals["bytes_out"]}')
+
+        lines.append("# HELP converter_requests_total Requests per view")
+        lines.append("# TYPE converter_requests_total counter")
+        for view, counters in snap['requests'].items():
+            lines.append(f'converter_requests_total{{view="{view}"}} {counters["requests"]}')
+        lines.append("# HELP converter_request_errors_total Failed requests per view and class")
+        lines.append("# TYPE converter_request_errors_total counter")
+        for view, counters in snap['requests'].items():
+            lines.append(f'converter_request_errors_total{{view="{view}",class="4xx"}} {counters["client_errors"]}')
+            lines.append(f'converter_request_errors_total{{view="{view}",class="5xx"}} {counters["server_errors"]}')
+        histogram("converter_request_seconds", "View duration until the response is returned", "view",
+                  {view: counters['duration_seconds'] for view, counters in snap['requests'].items()})
+
+        for name, kind, help_text, samples in extra_families or ():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = ConversionMetrics()
+
+
+def instrument_view(name: str):
+    """Count requests, errors and duration of a view under ``name``"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            status_code = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status_code = response.status_code
+                return response
+            finally:
+                metrics.observe_request(name, status_code, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def wants_timing(request) -> bool:
+    """Check if the client opted into the timing header"""
+    return request.headers.get(TIMING_HEADER, '').lower() in ('1', 'true', 'yes')
+
+
+def format_timing(timings: dict) -> str:
+    """Render stage timings as ``stage=milliseconds`` pairs"""
+    if not timings:
+        return "cache=hit"
+    return ", ".join(f"{stage}={seconds * 1000:.3f}ms" for stage, seconds in timings.items())
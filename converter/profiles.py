@@ -0,0 +1,233 @@
+"""
+Named conversion profiles
+
+A profile is a declarative rule set for the defaults the converter fills
+in: the growth_data block added to every form, the particle emitted for
+palettes that name one, the range of converted sounds and the scale of
+model entries. Rule sets come from the CONVERTER_PROFILES setting and the
+JSON file named by CONVERTER_PROFILES_FILE, e.g.::
+
+    {"retro": {"extends": "default", "sound_range": 16, "growth_data": {"mean": 45.0},
+               "particle": {"options": {"tint": {"red": 200}}}}}
+
+Objects are merged key by key over the profile they extend, and ``null``
+for ``particle`` drops the particle altogether. Every profile is compiled
+once per process into a ``ConversionProfile`` whose attributes the
+conversion helpers read directly.
+"""
+import hashlib
+import json
+import math
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .serializers import OrjsonSerializer
+
+DEFAULT_PROFILE_NAME = "default"
+
+# Built-in defaults; the output of the 'default' profile matches the golden corpus
+DEFAULT_RULES = {
+    "growth_data": {
+        "mean": 40.0,
+        "standard_deviation": 2.0,
+        "min_render_scale": 0.7,
+        "max_render_scale": 1.3,
+    },
+    "particle": {
+        "probability": 0.1,
+        "options": {
+            "type": "pixelmon:shiny",
+            "diameter": 2.5,
+            "lifetime": 30,
+            "tint": {"red": 255, "green": 215, "blue": 0, "alpha": 255},
+        },
+    },
+    "sound_range": 14,
+    "model_scale": 1.0,
+}
+
+
+def _fingerprint(rules: dict) -> str:
+    # json.dumps tells 40 from 40.0, which serialize differently in the output; keys
+    # keep their order, which is the order the rule objects are emitted in
+    return hashlib.sha256(json.dumps(rules).encode('utf-8')).hexdigest()[:16]
+
+
+DEFAULT_FINGERPRINT = _fingerprint(DEFAULT_RULES)
+
+
+def _template(value):
+    """Compile a JSON value into a function returning fresh copies of it"""
+    if isinstance(value, dict):
+        if not any(isinstance(v, (dict, list)) for v in value.values()):
+            return value.copy
+        items = [(key, _template(v)) for key, v in value.items()]
+        return lambda: {key: build() for key, build in items}
+    if isinstance(value, list):
+        builders = [_template(v) for v in value]
+        return lambda: [build() for build in builders]
+    return lambda: value
+
+
+class ConversionProfile:
+    """A compiled rule set; helpers read its attributes instead of looking anything up"""
+
+    def __init__(self, name: str, rules: dict):
+        self.name = name
+        self.rules = rules
+        self.fingerprint = _fingerprint(rules)
+        # Empty for the built-in defaults, so their cache keys and ZIP manifests stay unchanged
+        self.tag = "" if self.fingerprint == DEFAULT_FINGERPRINT else self.fingerprint
+        self.sound_range = rules["sound_range"]
+        self.model_scale = rules["model_scale"]
+        self.growth_data = _template(rules["growth_data"])
+        self.particle = _template(rules["particle"]) if rules["particle"] is not None else None
+
+    def __reduce__(self):
+        # Compiled templates are closures; batch workers recompile from the rules once
+        return restore_profile, (self.name, self.rules)
+
+    def __repr__(self):
+        return f"<ConversionProfile {self.name} {self.fingerprint}>"
+
+
+_restored = {}
+
+
+def restore_profile(name: str, rules: dict) -> ConversionProfile:
+    """Unpickle a profile, compiling each distinct rule set only once per process"""
+    key = (name, _fingerprint(rules))
+    profile = _restored.get(key)
+    if profile is None:
+        profile = _restored[key] = ConversionProfile(name, rules)
+    return profile
+
+
+BUILTIN_PROFILE = ConversionProfile(DEFAULT_PROFILE_NAME, DEFAULT_RULES)
+
+
+def _merge(base, override):
+    if isinstance(base, dict) and isinstance(override, dict):
+        merged = dict(base)
+        for key, value in override.items():
+            merged[key] = _merge(base.get(key), value)
+        return merged
+    return override
+
+
+def _check_numbers(name: str, path: str, value):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _check_numbers(name, f"{path}.{key}", item)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _check_numbers(name, f"{path}[{index}]", item)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool) and (
+        not math.isfinite(value) or OrjsonSerializer.needs_stdlib(json.dumps(value).encode('ascii'))
+    ):
+        # Output must read the same with every JSON backend; these would not
+        raise ValueError(f"profile '{name}': {path} must be a plain decimal number, got {value!r}")
+
+
+def _check_rules(name: str, rules: dict):
+    for key in rules:
+        if key not in DEFAULT_RULES:
+            raise ValueError(f"profile '{name}': unknown rule '{key}' (expected one of: {', '.join(DEFAULT_RULES)})")
+    if not isinstance(rules["growth_data"], dict):
+        raise ValueError(f"profile '{name}': growth_data must be an object")
+    if rules["particle"] is not None and not isinstance(rules["particle"], dict):
+        raise ValueError(f"profile '{name}': particle must be an object or null")
+    for key in ("sound_range", "model_scale"):
+        value = rules[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"profile '{name}': {key} must be a number")
+    _check_numbers(name, "$", rules)
+
+
+def compile_profiles(specs: dict) -> dict:
+    """Compile {name: rule set} into {name: ConversionProfile}, resolving ``extends``
+
+    Profiles extend 'default' unless they name another one; 'default' itself
+    may be redefined and then extends the built-in rules. Raises ``ValueError``
+    for unknown rules, bad values, unknown parents and ``extends`` cycles.
+    """
+    resolved = {}
+
+    def resolve(name, chain):
+        if name in resolved:
+            return resolved[name]
+        if name in chain:
+            raise ValueError(f"profile '{name}': extends cycle {' -> '.join(chain + (name,))}")
+        spec = specs.get(name)
+        if spec is None:
+            if name == DEFAULT_PROFILE_NAME:
+                return DEFAULT_RULES
+            raise ValueError(f"profile '{chain[-1]}' extends unknown profile '{name}'")
+        if not isinstance(spec, dict):
+            raise ValueError(f"profile '{name}': rule set must be an object")
+        spec = dict(spec)
+        parent = spec.pop("extends", None)
+        if parent is None:
+            base = DEFAULT_RULES if name == DEFAULT_PROFILE_NAME else resolve(DEFAULT_PROFILE_NAME, chain + (name,))
+        else:
+            base = resolve(parent, chain + (name,))
+        rules = _merge(base, spec)
+        _check_rules(name, rules)
+        resolved[name] = rules
+        return rules
+
+    profiles = {DEFAULT_PROFILE_NAME: BUILTIN_PROFILE}
+    for name in specs:
+        rules = resolve(name, ())
+        profiles[name] = ConversionProfile(name, rules)
+    return profiles
+
+
+_profiles = None
+_default_name = DEFAULT_PROFILE_NAME
+_profiles_lock = threading.Lock()
+
+
+def load_profiles() -> dict:
+    """Compile the configured profiles once per process and return them by name
+
+    Without Django settings (the converter used as a plain library) only the
+    built-in 'default' profile exists.
+    """
+    global _profiles, _default_name
+    with _profiles_lock:
+        if _profiles is None:
+            try:
+                specs = dict(getattr(settings, 'CONVERTER_PROFILES', None) or {})
+                path = getattr(settings, 'CONVERTER_PROFILES_FILE', None)
+                default_name = getattr(settings, 'CONVERTER_DEFAULT_PROFILE', None) or DEFAULT_PROFILE_NAME
+            except ImproperlyConfigured:
+                specs, path, default_name = {}, None, DEFAULT_PROFILE_NAME
+            if path:
+                specs.update(json.loads(Path(path).read_text(encoding='utf-8')))
+            profiles = compile_profiles(specs)
+            if default_name not in profiles:
+                raise ValueError(f"CONVERTER_DEFAULT_PROFILE names unknown profile '{default_name}'")
+            _profiles, _default_name = profiles, default_name
+        return _profiles
+
+
+def get_profile(name: str = None) -> ConversionProfile:
+    """Return a compiled profile by name (the configured default when empty)
+
+    Raises ``ValueError`` for unknown names.
+    """
+    profiles = _profiles if _profiles is not None else load_profiles()
+    profile = profiles.get(name or _default_name)
+    if profile is None:
+        raise ValueError(f"Unknown conversion profile '{name}' (available: {', '.join(profiles)})")
+    return profile
+
+
+def profile_names() -> list:
+    """Names of the configured profiles, the default one first"""
+    profiles = load_profiles()
+    return [_default_name] + [name for name in profiles if name != _default_name]
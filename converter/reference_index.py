@@ -0,0 +1,198 @@
+"""
+Cross-file reference index for species packs
+
+One pass over a batch extracts, per file, only the species name, dex, form
+names and the references it makes (``evolutions[].to``, ``preEvolutions``,
+``defaultForms``, ``defaultBaseForm``). Documents are dropped as soon as
+they are summarized, so the index for a full national-dex pack stays small.
+The index then resolves every reference and reports the dangling ones.
+
+Works on OLD and NEW documents alike: conversion copies these keys unchanged.
+"""
+import re
+
+from django.conf import settings
+
+from .conversion_logic import iter_convert_batch, normalize_form_name
+from .serializers import get_serializer
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]')
+
+
+def species_key(name) -> str:
+    """Lookup key for a species name: 'Mr. Mime', 'mr_mime' and 'mrmime' all match"""
+    return _NON_ALNUM.sub('', str(name).lower())
+
+
+def form_key(name) -> str:
+    """Lookup key for a form name ('' and None mean the base form)"""
+    return str(normalize_form_name(name)).strip().lower()
+
+
+def parse_reference(ref) -> tuple:
+    """Return (species, form) named by a reference, or None if it names nothing
+
+    Accepts ``{"name": ..., "form": ...}`` objects (``species`` also works for
+    the name) and spec strings such as ``"ivysaur"`` or ``"ivysaur form:alolan"``.
+    """
+    if isinstance(ref, dict):
+        name = ref.get("name", ref.get("species"))
+        form = ref.get("form")
+    elif isinstance(ref, str):
+        parts = ref.split()
+        if not parts:
+            return None
+        name, form = parts[0], None
+        for part in parts[1:]:
+            key, sep, value = part.partition(":") if ":" in part else part.partition("=")
+            if sep and key.lower() == "form":
+                form = value
+    else:
+        return None
+    if not isinstance(name, str) or not name.strip():
+        return None
+    return name, (form if isinstance(form, str) and form.strip() else None)
+
+
+def summarize_document(doc: dict) -> tuple:
+    """Extract (name, dex, form names, references) from a species document
+
+    References are (json_path, kind, species, form) tuples; ``species`` is
+    None for references to a form of the document itself.
+    """
+    if not isinstance(doc, dict):
+        raise ValueError("expected a JSON object")
+    forms = doc.get("forms")
+    forms = forms if isinstance(forms, list) else []
+    form_names = tuple(form_key(f.get("name")) for f in forms if isinstance(f, dict))
+    refs = []
+    default_forms = doc.get("defaultForms")
+    if isinstance(default_forms, list):
+        for i, name in enumerate(default_forms):
+            if isinstance(name, str) and name.strip():
+                refs.append((f"$.defaultForms[{i}]", "defaultForm", None, name))
+    for i, form in enumerate(forms):
+        if not isinstance(form, dict):
+            continue
+        path = f"$.forms[{i}]"
+        base = form.get("defaultBaseForm")
+        if isinstance(base, str) and base.strip():
+            refs.append((f"{path}.defaultBaseForm", "defaultBaseForm", None, base))
+        evolutions = form.get("evolutions")
+        if isinstance(evolutions, list):
+            for j, evo in enumerate(evolutions):
+                target = parse_reference(evo.get("to")) if isinstance(evo, dict) else None
+                if target:
+                    refs.append((f"{path}.evolutions[{j}].to", "evolution", *target))
+        pre = form.get("preEvolutions")
+        if isinstance(pre, list):
+            for j, ref in enumerate(pre):
+                target = parse_reference(ref)
+                if target:
+                    refs.append((f"{path}.preEvolutions[{j}]", "preEvolution", *target))
+    name = doc.get("name")
+    return (name if isinstance(name, str) else None), doc.get("dex"), form_names, tuple(refs)
+
+
+def summarize_entry(filename: str, raw, direction: str = "forward", profile=None):
+    """Batch engine entry point: parse one file and keep only its reference summary"""
+    try:
+        if isinstance(raw, Exception):
+            raise raw
+        summary = summarize_document(get_serializer().loads(raw))
+    except Exception as e:
+        return {'original': filename, 'status': 'error', 'error': str(e)}, None
+    return {'original': filename, 'status': 'success', 'summary': summary}, None
+
+
+class ReferenceIndex:
+    """species name -> dex -> forms, plus the references every file makes"""
+
+    def __init__(self):
+        self.species = {}   # species_key -> (name, dex, frozenset of form keys, source)
+        self.by_dex = {}    # dex -> [species_key, ...]
+        self.sources = {}   # source -> (species_key or None, form keys, references)
+        self.duplicates = []
+
+    def add(self, source: str, summary: tuple):
+        """Register one file's summary (as returned by ``summarize_document``)"""
+        name, dex, form_names, refs = summary
+        key = species_key(name) if name else None
+        if key:
+            if key in self.species:
+                self.duplicates.append((source, name, self.species[key][3]))
+            else:
+                self.species[key] = (name, dex, frozenset(form_names), source)
+                if isinstance(dex, int) and not isinstance(dex, bool):
+                    self.by_dex.setdefault(dex, []).append(key)
+        self.sources[source] = (key, frozenset(form_names), refs)
+
+    def resolve(self, species: str, form: str = None):
+        """Return (name, dex, form key) for a reference, or None if it is dangling"""
+        entry = self.species.get(species_key(species))
+        if entry is None:
+            return None
+        name, dex, forms, _ = entry
+        if form is None:
+            return name, dex, None
+        key = form_key(form)
+        return (name, dex, key) if key in forms else None
+
+    def dangling(self) -> list:
+        """Every reference that does not resolve, with the file and JSON path it came from"""
+        issues = []
+        for source, (key, own_forms, refs) in self.sources.items():
+            for path, kind, species, form in refs:
+                if species is None:
+                    if form_key(form) not in own_forms:
+                        issues.append(self._issue(source, path, kind, form, "unknown form"))
+                    continue
+                entry = self.species.get(species_key(species))
+                target = f"{species}:{form}" if form else species
+                if entry is None:
+                    issues.append(self._issue(source, path, kind, target, "unknown species"))
+                elif form is not None and form_key(form) not in entry[2]:
+                    issues.append(self._issue(source, path, kind, target, "unknown form"))
+        for source, name, first in self.duplicates:
+            issues.append(self._issue(source, "$.name", "species", name, f"duplicate of {first}"))
+        return issues
+
+    @staticmethod
+    def _issue(source, path, kind, target, reason) -> dict:
+        return {'source': source, 'path': path, 'kind': kind, 'target': target, 'reason': reason}
+
+    def stats(self) -> dict:
+        return {
+            'files': len(self.sources),
+            'species': len(self.species),
+            'dex_numbers': len(self.by_dex),
+            'forms': sum(len(entry[2]) for entry in self.species.values()),
+            'references': sum(len(refs) for _, _, refs in self.sources.values()),
+        }
+
+    def report(self) -> dict:
+        """Summary counts plus the dangling references"""
+        dangling = self.dangling()
+        return {**self.stats(), 'dangling': dangling}
+
+
+def build_reference_index(entries) -> tuple:
+    """Index (filename, bytes) entries in one pass on the batch engine, returning (index, errors)
+
+    Workers parse and summarize; only the summaries travel back, so at most
+    the in-flight chunks are ever held as whole documents.
+    """
+    index = ReferenceIndex()
+    errors = []
+    batch = iter_convert_batch(
+        entries,
+        workers=getattr(settings, 'CONVERTER_BATCH_WORKERS', None),
+        chunk_size=getattr(settings, 'CONVERTER_BATCH_CHUNK_SIZE', None),
+        convert=summarize_entry,
+    )
+    for record, _ in batch:
+        if record['status'] == 'success':
+            index.add(record['original'], record['summary'])
+        else:
+            errors.append({'original': record['original'], 'error': record['error']})
+    return index, errors
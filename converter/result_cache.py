@@ -0,0 +1,199 @@
+"""
+Content-addressed cache for converted documents
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+from .conversion_logic import CONVERTER_VERSION
+
+
+class ConversionCache:
+    """Two-tier cache of converted output bytes keyed on a hash of the input
+
+    The memory tier is an LRU bounded by the total size of stored outputs.
+    The optional disk tier keeps one file per key under ``disk_dir`` and
+    refills the memory tier on hits. It is bounded by ``disk_max_bytes``
+    (0 = no limit): once over it, the least recently written or hit files
+    are deleted down to 90% of the limit.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir=None, version: str = CONVERTER_VERSION,
+                 disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_size = None  # scanned on first write
+        self._disk_lock = threading.Lock()
+        self.version = version.encode('utf-8')
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def key(self, raw: bytes, direction: str = "forward", profile=None) -> str:
+        """Hash input bytes together with the converter version (and non-forward direction, non-default profile)"""
+        h = hashlib.sha256(self.version)
+        h.update(b"\0")
+        if direction != "forward":
+            h.update(direction.encode('ascii') + b"\0")
+        if profile is not None and profile.tag:
+            h.update(b"profile:" + profile.tag.encode('ascii') + b"\0")
+        h.update(raw)
+        return h.hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str):
+        """Return cached output bytes for ``key`` or None"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.disk_dir is not None:
+            try:
+                data = self._disk_path(key).read_bytes()
+            except OSError:
+                data = None
+            if data is not None:
+                self._touch(key)
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """Store output bytes in both tiers"""
+        self._remember(key, data)
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError:
+                return  # disk tier is best effort
+            if self.disk_max_bytes:
+                self._account_disk(len(data))
+
+    def _touch(self, key: str):
+        # The disk tier evicts by mtime, so a hit counts as a use
+        if self.disk_max_bytes:
+            try:
+                os.utime(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _disk_files(self) -> list:
+        files = []
+        for path in self.disk_dir.glob('*/*.json'):
+            try:
+                st = path.stat()
+            except OSError:
+                continue  # evicted by another process
+            files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _account_disk(self, size: int):
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_size += size
+            if self._disk_size <= self.disk_max_bytes:
+                return
+            # Rescan: other processes may share the directory (and overwrites were counted twice)
+            files = sorted(self._disk_files(), key=lambda f: f[0])
+            total = sum(size for _, size, _ in files)
+            target = self.disk_max_bytes * 9 // 10
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                total -= size
+                self.disk_evictions += 1
+            self._disk_size = total
+
+    def _remember(self, key: str, data: bytes):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop the memory tier and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.disk_hits = self.evictions = 0
+            self.disk_evictions = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current memory tier usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version.decode('utf-8'),
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'disk_enabled': self.disk_dir is not None,
+                'disk_bytes': self._disk_size,
+                'disk_max_bytes': self.disk_max_bytes,
+                'disk_evictions': self.disk_evictions,
+            }
+
+
+_conversion_cache = None
+_conversion_cache_lock = threading.Lock()
+
+def get_conversion_cache():
+    """Return the process-wide cache configured from settings, or None if disabled"""
+    global _conversion_cache
+    max_bytes = getattr(settings, 'CONVERTER_CACHE_MAX_BYTES', 0)
+    if not max_bytes:
+        return None
+    with _conversion_cache_lock:
+        if _conversion_cache is None:
+            disk_dir = None
+            if getattr(settings, 'CONVERTER_CACHE_DISK', False):
+                disk_dir = Path(settings.MEDIA_ROOT) / 'conversion_cache'
+            _conversion_cache = ConversionCache(
+                max_bytes=max_bytes,
+                disk_dir=disk_dir,
+                disk_max_bytes=getattr(settings, 'CONVERTER_CACHE_DISK_MAX_BYTES', 0),
+            )
+        return _conversion_cache
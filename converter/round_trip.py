@@ -0,0 +1,77 @@
+"""
+Round-trip verification between the OLD and NEW formats
+
+A document is converted to the other format and back, then compared with
+the original field by field. Losses are counted per field pattern, with
+array indices collapsed (``forms[].genderProperties[].palettes[].sounds``),
+so a whole pack can be summarized in one table.
+"""
+from .conversion_logic import convert_document, entry_record, reverse_document
+from .serializers import get_serializer
+
+# Converting out of the starting format and back again
+ROUND_TRIPS = {
+    "forward": (convert_document, reverse_document),  # OLD -> NEW -> OLD
+    "reverse": (reverse_document, convert_document),  # NEW -> OLD -> NEW
+}
+
+
+def _count(report: dict, field: str, kind: str):
+    counts = report.setdefault(field or "$", {"lost": 0, "added": 0, "changed": 0})
+    counts[kind] += 1
+
+
+def diff_fields(before, after, report: dict, field: str = ""):
+    """Add per-field lost/added/changed counts for ``after`` relative to ``before`` to ``report``"""
+    if isinstance(before, dict) and isinstance(after, dict):
+        for key, value in before.items():
+            sub = f"{field}.{key}" if field else key
+            if key in after:
+                diff_fields(value, after[key], report, sub)
+            else:
+                _count(report, sub, "lost")
+        for key in after:
+            if key not in before:
+                _count(report, f"{field}.{key}" if field else key, "added")
+    elif isinstance(before, list) and isinstance(after, list):
+        sub = f"{field}[]"
+        for old_item, new_item in zip(before, after):
+            diff_fields(old_item, new_item, report, sub)
+        for _ in range(len(after), len(before)):
+            _count(report, sub, "lost")
+        for _ in range(len(before), len(after)):
+            _count(report, sub, "added")
+    elif before != after or type(before) is not type(after):
+        _count(report, field, "changed")
+    return report
+
+
+def round_trip(doc: dict, direction: str = "forward") -> tuple:
+    """Convert ``doc`` out of its format and back, returning (restored, per-field report)"""
+    there, back = ROUND_TRIPS[direction]
+    restored = back(there(doc))
+    return restored, diff_fields(doc, restored, {})
+
+
+def merge_reports(total: dict, report: dict) -> dict:
+    """Add the counts of one per-field report into ``total``"""
+    for field, counts in report.items():
+        target = total.setdefault(field, {"lost": 0, "added": 0, "changed": 0})
+        for kind, n in counts.items():
+            target[kind] += n
+    return total
+
+
+def round_trip_entry(filename: str, raw, direction: str = "forward", profile=None):
+    """Batch engine entry point: round-trip one file, recording its per-field report
+
+    Format losses do not depend on the conversion ``profile``; the default one is used.
+    """
+    try:
+        if isinstance(raw, Exception):
+            raise raw
+        _, report = round_trip(get_serializer().loads(raw), direction)
+    except Exception as e:
+        return entry_record(filename, str(e)), None
+    record = {'original': filename, 'status': 'success', 'fields': report}
+    return record, None
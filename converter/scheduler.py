@@ -0,0 +1,260 @@
+"""
+Admission control for conversion requests
+
+Every conversion request is admitted as one of two classes before any
+work is done: 'interactive' (single files, text) or 'batch' (ZIP archives,
+NDJSON streams, reference checks). Each class has its own concurrency
+limit, and while interactive requests are waiting no batch request is
+admitted, so small conversions never queue behind a pack.
+
+Admitted requests also hold their estimated cost (bytes of JSON to
+convert) against a per-process budget. A batch request must fit what is
+left of the budget after everything in flight; an interactive one only
+what other interactive requests hold, so packs never crowd out small
+conversions. A request that does not fit is refused at once (503) instead
+of queueing inside the server; one that waits too long for a slot gets a
+503 as well, and one that finds its class queue full a 429. Refusals carry a
+Retry-After estimated from how long requests of the class have recently
+held their slot.
+"""
+import functools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.http import FileResponse, JsonResponse
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Classes in priority order
+REQUEST_CLASSES = (INTERACTIVE, BATCH)
+
+# Cost charged per ZIP entry on top of its uncompressed size
+ENTRY_OVERHEAD = 4096
+
+MAX_RETRY_AFTER = 300
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; ``status`` is 429 or 503"""
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request's slot and budget share, returned by ``release``"""
+
+    def __init__(self, scheduler, request_class: str, cost: int):
+        self.scheduler = scheduler
+        self.request_class = request_class
+        self.cost = cost
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmittedStream:
+    """Streamed response content that keeps its ticket until sent or closed"""
+
+    def __init__(self, ticket: Ticket, content):
+        self.ticket = ticket
+        self.content = iter(content)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except StopIteration:
+            self.ticket.release()
+            raise
+
+    def close(self):
+        try:
+            close = getattr(self.content, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.ticket.release()
+
+
+class ConversionScheduler:
+    """Per-class concurrency limits, interactive-first ordering and a shared cost budget
+
+    ``concurrency`` maps each request class to its limit; ``budget`` caps
+    the estimated cost in flight (0 = none): batch requests are charged
+    against the cost of every class, interactive ones against interactive
+    cost alone, so batches can never take the budget interactive requests
+    need; ``max_wait`` the seconds a
+    request may wait for a slot and ``max_queue`` how many may wait per
+    class (0 = no limit).
+    """
+
+    def __init__(self, concurrency: dict, budget: int = 0, max_wait: float = 0.0, max_queue: int = 0):
+        self.concurrency = dict(concurrency)
+        self.budget = budget
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self.inflight_cost = 0
+        self.class_cost = {cls: 0 for cls in REQUEST_CLASSES}
+        self.active = {cls: 0 for cls in REQUEST_CLASSES}
+        self.waiting = {cls: 0 for cls in REQUEST_CLASSES}
+        self.admitted = {cls: 0 for cls in REQUEST_CLASSES}
+        self.rejected = {cls: {429: 0, 503: 0} for cls in REQUEST_CLASSES}
+        self.hold_seconds = {cls: 1.0 for cls in REQUEST_CLASSES}  # moving average
+
+    def _fits(self, request_class: str, cost: int) -> bool:
+        if not self.budget:
+            return True
+        charged = self.class_cost[INTERACTIVE] if request_class == INTERACTIVE else self.inflight_cost
+        if charged + cost <= self.budget:
+            return True
+        # A request larger than the whole budget still runs, but only with nothing else in flight
+        return cost > self.budget and not any(self.active.values())
+
+    def _has_slot(self, request_class: str) -> bool:
+        if self.active[request_class] >= self.concurrency[request_class]:
+            return False
+        ahead = REQUEST_CLASSES[:REQUEST_CLASSES.index(request_class)]
+        return not any(self.waiting[cls] for cls in ahead)
+
+    def _reject(self, request_class: str, status: int, reason: str):
+        self.rejected[request_class][status] += 1
+        retry_after = min(MAX_RETRY_AFTER, max(1, math.ceil(self.hold_seconds[request_class])))
+        raise AdmissionRejected(status, reason, retry_after)
+
+    def admit(self, request_class: str, cost: int = 0) -> Ticket:
+        """Admit a request or raise ``AdmissionRejected``; the ticket must be released"""
+        with self._cond:
+            if not self._fits(request_class, cost):
+                self._reject(request_class, 503, "Server is over its conversion budget")
+            if not self._has_slot(request_class):
+                if self.max_queue and self.waiting[request_class] >= self.max_queue:
+                    self._reject(request_class, 429, f"Too many {request_class} conversions queued")
+                deadline = time.monotonic() + self.max_wait
+                self.waiting[request_class] += 1
+                try:
+                    while not self._has_slot(request_class):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject(request_class, 503, f"Too many {request_class} conversions in progress")
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting[request_class] -= 1
+                    # Lower-priority requests may have been held back by this one waiting
+                    self._cond.notify_all()
+                if not self._fits(request_class, cost):
+                    self._reject(request_class, 503, "Server is over its conversion budget")
+            self.active[request_class] += 1
+            self.admitted[request_class] += 1
+            self.inflight_cost += cost
+            self.class_cost[request_class] += cost
+            return Ticket(self, request_class, cost)
+
+    def _release(self, ticket: Ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.active[ticket.request_class] -= 1
+            self.inflight_cost -= ticket.cost
+            self.class_cost[ticket.request_class] -= ticket.cost
+            held = time.monotonic() - ticket.admitted_at
+            average = self.hold_seconds[ticket.request_class]
+            self.hold_seconds[ticket.request_class] = average + 0.2 * (held - average)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'budget': self.budget,
+                'inflight_cost': self.inflight_cost,
+                'classes': {
+                    cls: {
+                        'limit': self.concurrency[cls],
+                        'active': self.active[cls],
+                        'inflight_cost': self.class_cost[cls],
+                        'waiting': self.waiting[cls],
+                        'admitted': self.admitted[cls],
+                        'rejected': dict(self.rejected[cls]),
+                        'hold_seconds': round(self.hold_seconds[cls], 3),
+                    }
+                    for cls in REQUEST_CLASSES
+                },
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ConversionScheduler:
+    """Return the process-wide scheduler configured from the settings"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ConversionScheduler(
+                {
+                    INTERACTIVE: getattr(settings, 'CONVERTER_INTERACTIVE_CONCURRENCY', 16),
+                    BATCH: getattr(settings, 'CONVERTER_BATCH_CONCURRENCY', 2),
+                },
+                budget=getattr(settings, 'CONVERTER_ADMISSION_BUDGET', 0),
+                max_wait=getattr(settings, 'CONVERTER_ADMISSION_WAIT', 0.0),
+                max_queue=getattr(settings, 'CONVERTER_ADMISSION_QUEUE', 0),
+            )
+        return _scheduler
+
+
+def zip_cost(zip_file, json_files: list) -> int:
+    """Estimated cost of converting ZIP entries, from the sizes in the central directory"""
+    return sum(zip_file.getinfo(name).file_size for name in json_files) + ENTRY_OVERHEAD * len(json_files)
+
+
+def rejected_response(rejected: AdmissionRejected) -> JsonResponse:
+    """429/503 response for a refused request, with Retry-After"""
+    response = JsonResponse({'error': str(rejected), 'retry_after': rejected.retry_after}, status=rejected.status)
+    response['Retry-After'] = str(rejected.retry_after)
+    return response
+
+
+def hold_until_sent(ticket: Ticket, response):
+    """Keep ``ticket`` while a streamed response is still being produced, otherwise release it"""
+    # File responses are already converted; only generators still do the work while streaming
+    if response.streaming and not isinstance(response, FileResponse):
+        response.streaming_content = AdmittedStream(ticket, response.streaming_content)
+    else:
+        ticket.release()
+    return response
+
+
+def admitted(request_class: str):
+    """Admit a view's requests as ``request_class``, costed by their body size"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                ticket = get_scheduler().admit(request_class, int(request.META.get('CONTENT_LENGTH') or 0))
+            except AdmissionRejected as e:
+                return rejected_response(e)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                ticket.release()
+                raise
+            return hold_until_sent(ticket, response)
+        return wrapper
+    return decorator
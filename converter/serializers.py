@@ -0,0 +1,127 @@
+"""
+JSON backends for reading OLD documents and writing NEW ones
+
+All backends work on UTF-8 bytes and produce output byte-identical to
+``json.dumps(doc, ensure_ascii=False, indent=2)``.
+"""
+import json
+import os
+import time
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class JsonSerializer:
+    """Standard library backend"""
+
+    name = "json"
+
+    def loads(self, raw: bytes):
+        """Parse UTF-8 bytes (invalid UTF-8 raises UnicodeDecodeError)"""
+        return json.loads(raw.decode('utf-8'))
+
+    def dumps(self, obj) -> bytes:
+        """Serialize to indented UTF-8 bytes"""
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+    def dumps_converted(self, obj, source: str) -> bytes:
+        """Serialize ``obj`` that was converted from the JSON text ``source``"""
+        return self.dumps(obj)
+
+    def dumps_line(self, obj) -> bytes:
+        """Serialize to a single compact line terminated by a newline (NDJSON)"""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+
+    def transcode(self, raw: bytes, transform, timings: dict = None) -> bytes:
+        """Parse ``raw``, apply ``transform`` to the document and serialize the result
+
+        When ``timings`` is given, the seconds spent in the parse, convert and
+        serialize stages are stored in it.
+        """
+        start = time.perf_counter()
+        return self._finish(self.loads(raw), start, transform, timings)
+
+    def _finish(self, doc, start: float, transform, timings: dict) -> bytes:
+        parsed = time.perf_counter()
+        new_doc = transform(doc)
+        converted = time.perf_counter()
+        out = self.dumps(new_doc)
+        if timings is not None:
+            timings['parse'] = parsed - start
+            timings['convert'] = converted - parsed
+            timings['serialize'] = time.perf_counter() - converted
+        return out
+
+
+_stdlib = JsonSerializer()
+
+
+class OrjsonSerializer(JsonSerializer):
+    """orjson backend, falling back to the standard library where output would differ"""
+
+    name = "orjson"
+
+    # orjson prints exponent floats differently (1e16 vs 1e+16, 0.00001 vs 1e-05);
+    # any document that may contain one goes through the standard library instead.
+    # Digits are mapped to '0' so the checks are plain substring searches, not a regex scan.
+    _DIGITS = bytes.maketrans(b'0123456789', b'0000000000')
+
+    @classmethod
+    def needs_stdlib(cls, raw: bytes) -> bool:
+        """Whether ``raw`` may hold a digit+exponent, '0.0000' or a 16+ digit run"""
+        digits = raw.translate(cls._DIGITS)
+        return b'0e' in digits or b'0E' in digits or b'0' * 16 in digits or b'0.0000' in raw
+
+    def loads(self, raw: bytes):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Re-parse with the standard library so errors read the same as before
+            return _stdlib.loads(raw)
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+    def dumps_converted(self, obj, source: str) -> bytes:
+        if self.needs_stdlib(source.encode('utf-8')):
+            return _stdlib.dumps(obj)
+        return self.dumps(obj)
+
+    def dumps_line(self, obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+    def transcode(self, raw: bytes, transform, timings: dict = None) -> bytes:
+        if self.needs_stdlib(raw):
+            return _stdlib.transcode(raw, transform, timings)
+        start = time.perf_counter()
+        try:
+            doc = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # NaN/Infinity, BOMs, bad UTF-8...: let the standard library accept or report it
+            return _stdlib.transcode(raw, transform, timings)
+        return self._finish(doc, start, transform, timings)
+
+
+SERIALIZERS = {"json": JsonSerializer}
+if orjson is not None:
+    SERIALIZERS["orjson"] = OrjsonSerializer
+
+_instances = {}
+
+def get_serializer(name: str = None) -> JsonSerializer:
+    """Return a serializer by name; "auto" (the default) prefers orjson when installed
+
+    The default can be overridden with the CONVERTER_JSON_BACKEND environment variable.
+    """
+    name = name or os.environ.get('CONVERTER_JSON_BACKEND', 'auto')
+    if name == "auto":
+        name = "orjson" if "orjson" in SERIALIZERS else "json"
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown JSON backend '{name}' (available: {', '.join(SERIALIZERS)})")
+    serializer = _instances.get(name)
+    if serializer is None:
+        serializer = _instances[name] = SERIALIZERS[name]()
+    return serializer
@@ -46,6 +46,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Add copy functionality for output textarea
     setupCopyFunctionality();
+
+    // Convert only the edited form while typing
+    setupFormPreview();
 });
 
 function setupDragAndDrop() {
@@ -131,6 +134,98 @@ function setupCopyFunctionality() {
     }
 }
 
+function getCsrfToken() {
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]*)/);
+    return match ? decodeURIComponent(match[1]) : '';
+}
+
+function setupFormPreview() {
+    const input = document.getElementById('json-input');
+    const output = document.getElementById('json-output');
+    const toggle = document.getElementById('live-preview');
+    const picker = document.getElementById('preview-form');
+
+    if (!input || !output || !toggle || !picker || !input.dataset.formUrl) return;
+
+    let lastForms = [];  // each form's JSON at the previous refresh
+    let timer = null;
+    let sequence = 0;
+
+    async function requestForm(index) {
+        const current = ++sequence;
+        const reverse = document.getElementById('reverse-direction');
+        const profile = document.getElementById('conversion-profile');
+        if (reverse && reverse.checked) {
+            output.value = '';
+            output.placeholder = 'The live preview only converts OLD to NEW.';
+            return;
+        }
+        try {
+            const response = await fetch(input.dataset.formUrl, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCsrfToken(),
+                },
+                body: JSON.stringify({
+                    json_text: input.value,
+                    form: Number(index),
+                    profile: profile ? profile.value : '',
+                }),
+            });
+            const data = await response.json();
+            if (current !== sequence) return;  // a newer edit already asked again
+            if (response.ok) {
+                output.value = data.converted_form;
+                autoResize(output);
+            } else {
+                output.value = '';
+                output.placeholder = data.error;
+            }
+        } catch (e) {
+            if (current === sequence) output.placeholder = `Connection error: ${e.message}`;
+        }
+    }
+
+    function refresh() {
+        let doc;
+        try {
+            doc = JSON.parse(input.value);
+        } catch (e) {
+            return;  // keep the last preview until the text parses again
+        }
+        if (!doc || !Array.isArray(doc.forms) || doc.forms.length === 0) return;
+
+        const forms = doc.forms.map(form => JSON.stringify(form));
+        const labels = doc.forms.map((form, i) => `${i}: ${(form && form.name) || 'base'}`);
+        const selected = picker.value;
+        if (labels.join('\n') !== Array.from(picker.options, option => option.text).join('\n')) {
+            picker.innerHTML = '';
+            labels.forEach((label, i) => picker.add(new Option(label, i)));
+            if (selected !== '' && Number(selected) < labels.length) picker.value = selected;
+        }
+
+        // Follow the form being edited
+        const changed = forms.findIndex((form, i) => form !== lastForms[i]);
+        lastForms = forms;
+        if (changed >= 0) picker.value = changed;
+        requestForm(picker.value);
+    }
+
+    input.addEventListener('input', () => {
+        if (!toggle.checked) return;
+        clearTimeout(timer);
+        timer = setTimeout(refresh, 300);
+    });
+    toggle.addEventListener('change', () => {
+        lastForms = [];
+        if (toggle.checked) refresh();
+    });
+    picker.addEventListener('change', () => {
+        if (toggle.checked) requestForm(picker.value);
+    });
+}
+
 // Utility function to format JSON
 function formatJSON(jsonString) {
     try {
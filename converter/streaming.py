@@ -0,0 +1,207 @@
+"""
+Memory-bounded conversion of oversized species documents
+
+The input is read incrementally: top-level members are decoded one at a
+time and every element of ``forms`` is converted and written out before the
+next one is read. Converted forms are spooled to a temporary file (on disk
+once large) because the output header (name, dex, defaultForms) may depend
+on members that come later in the input. Peak memory is therefore bounded by
+the largest single form rather than the whole document.
+
+Output is byte-identical to ``convert_json_file_content``.
+"""
+import codecs
+import json
+import shutil
+import tempfile
+
+from .conversion_logic import convert_form, normalize_form_name
+from .profiles import get_profile
+from .serializers import get_serializer
+from .validation import SchemaError, check_document, validate_form
+
+READ_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 4 * 1024 * 1024
+NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+_decoder = json.JSONDecoder()
+
+
+class JsonStreamReader:
+    """Pull-style reader of JSON values from a UTF-8 byte stream"""
+
+    def __init__(self, fp, read_size: int = READ_SIZE):
+        self.fp = fp
+        self.read_size = read_size
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.last_text = ''
+
+    def _fill(self, size: int) -> bool:
+        """Append at least ``size`` more bytes of input; False once the stream is exhausted"""
+        if self.eof:
+            return False
+        data = self.fp.read(size)
+        if not data:
+            self.eof = True
+            rest = self.text.decode(b'', final=True)
+            self.buf = self.buf[self.pos:] + rest
+            self.pos = 0
+            return bool(rest)
+        self.buf = self.buf[self.pos:] + self.text.decode(data)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ('' at end of input)"""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in ' \t\n\r':
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill(self.read_size):
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expecting '{char}' but found {found!r}" if found else f"Expecting '{char}' but input ended")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, keeping its source text in ``last_text``"""
+        self.peek()
+        while True:
+            try:
+                val, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Possibly a truncated value: grow the buffer geometrically and retry
+                if self._fill(max(self.read_size, len(self.buf))):
+                    continue
+                raise
+            if not self.eof and (end == len(self.buf) or self.buf[end] in NUMBER_CHARS):
+                # A number may continue in the next chunk ("1" of "1.5e3")
+                self._fill(self.read_size)
+                continue
+            self.last_text = self.buf[self.pos:end]
+            self.pos = end
+            return val
+
+
+def _member(key: str, value) -> str:
+    """Render a top-level member the way json.dumps(indent=2) nests it"""
+    text = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+    return f'  {json.dumps(key, ensure_ascii=False)}: {text}'
+
+
+def _write_form(spool, index: int, form, source: str):
+    """Append a converted form to the spooled ``forms`` array body"""
+    text = get_serializer().dumps_converted(form, source).replace(b'\n', b'\n    ')
+    spool.write((b",\n    " if index else b"    ") + text)
+
+
+def convert_json_stream(fp_in, fp_out, filename: str = "unknown", read_size: int = READ_SIZE, profile=None):
+    """Convert an OLD document read from ``fp_in``, writing NEW UTF-8 bytes to ``fp_out``
+
+    Invalid UTF-8 raises ``UnicodeDecodeError`` unwrapped, as in ``convert_json_bytes``.
+    """
+    try:
+        _convert_stream(JsonStreamReader(fp_in, read_size), fp_out, profile or get_profile())
+    except UnicodeDecodeError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error converting JSON file '{filename}': {str(e)}")
+
+
+def _convert_stream(reader: JsonStreamReader, fp_out, profile):
+    header = {}
+    first_form = None
+    form_count = 0
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.value()
+                if not isinstance(key, str):
+                    raise ValueError("Expecting property name enclosed in double quotes")
+                reader.expect(':')
+                if key == "forms":
+                    # A repeated key replaces the earlier value, as with json.loads
+                    spool.seek(0)
+                    spool.truncate()
+                    first_form = None
+                    form_count = 0
+                    if reader.peek() == '[':
+                        reader.pos += 1
+                        movement_fallback = {}
+                        if reader.peek() == ']':
+                            reader.pos += 1
+                        else:
+                            while True:
+                                old_form = reader.value()
+                                errors = validate_form(old_form, f"$.forms[{form_count}]")
+                                if errors:
+                                    raise SchemaError(errors)
+                                if first_form is None:
+                                    first_form = old_form
+                                    mf = old_form.get("movement", {})
+                                    if isinstance(mf, dict):
+                                        movement_fallback = mf
+                                new_form = convert_form(old_form, movement_fallback, profile)
+                                _write_form(spool, form_count, new_form, reader.last_text)
+                                form_count += 1
+                                sep = reader.peek()
+                                reader.pos += 1
+                                if sep == ']':
+                                    break
+                                if sep != ',':
+                                    raise ValueError("Expecting ',' delimiter in forms")
+                    else:
+                        # Not a list: only empty strings/objects pass, and they hold no forms
+                        check_document({"forms": reader.value()})
+                elif key in ("name", "dex", "defaultForms", "generation"):
+                    header[key] = reader.value()
+                else:
+                    reader.value()  # dropped by the conversion; parsed only to validate
+                sep = reader.peek()
+                reader.pos += 1
+                if sep == '}':
+                    break
+                if sep != ',':
+                    raise ValueError("Expecting ',' delimiter")
+        if reader.peek():
+            raise ValueError("Extra data after document")
+
+        check_document({"defaultForms": header.get("defaultForms")})
+        norm_first_form = "base"
+        if first_form is not None:
+            norm_first_form = normalize_form_name(first_form.get("name"))
+        odf = header.get("defaultForms") or []
+        desired_default = odf[0] if (odf and str(odf[0]).strip()) else norm_first_form
+
+        members = []
+        if "name" in header:
+            members.append(_member("name", header["name"]))
+        if "dex" in header:
+            members.append(_member("dex", header["dex"]))
+        members.append(_member("defaultForms", [desired_default]))
+        fp_out.write(("{\n" + ",\n".join(members) + ",\n").encode('utf-8'))
+
+        if form_count:
+            fp_out.write(b'  "forms": [\n')
+            spool.seek(0)
+            shutil.copyfileobj(spool, fp_out)
+            fp_out.write(b'\n  ]')
+        else:
+            fp_out.write(b'  "forms": []')
+        if "generation" in header:
+            fp_out.write((",\n" + _member("generation", header["generation"])).encode('utf-8'))
+        fp_out.write(b"\n}")
+
@@ -0,0 +1,844 @@
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase
+
+from . import async_views, jobs, views
+from .asset_registry import AssetRegistry, convert_entry_with_assets, manifest_json, summarize_assets
+from .conversion_logic import (
+    OMIT,
+    OrderingPlan,
+    clone_models_for_shiny_wrapped,
+    convert_document,
+    convert_json_bytes,
+    convert_json_file_content,
+    convert_palette,
+    discard_batch_pool,
+    get_batch_pool,
+    iter_convert_batch,
+    make_model_entry,
+    reverse_document,
+    wrap_models_with_predicate,
+)
+from .corpus import iter_corpus
+from .form_preview import preview_form
+from .metrics import TIMING_HEADER, metrics
+from .profiles import BUILTIN_PROFILE, compile_profiles
+from .scheduler import BATCH, INTERACTIVE, AdmissionRejected, AdmittedStream, ConversionScheduler, get_scheduler
+from .serializers import SERIALIZERS, get_serializer
+from .result_cache import ConversionCache
+from .reference_index import ReferenceIndex, summarize_document
+from .round_trip import round_trip
+from .streaming import convert_json_stream
+from .validation import validate_document
+from .zip_batch import CompressionProfile, stream_converted_zip
+from .zip_input import MappedZipFile, ZipLimitExceeded, check_zip_limits, open_input_zip
+
+GOLDEN_DIR = Path(__file__).resolve().parent / 'testdata' / 'golden'
+
+
+def golden_inputs() -> list:
+    """OLD documents of the recorded corpus; each has its expected output next to it"""
+    return sorted(p for p in GOLDEN_DIR.glob('*.json') if not p.name.endswith('_new.json'))
+
+
+def golden_output(path: Path) -> bytes:
+    return path.with_name(f"{path.stem}_new.json").read_bytes()
+
+
+def golden_zip(count: int) -> bytes:
+    """A ZIP archive holding the first ``count`` corpus inputs"""
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, 'w') as zf:
+        for path in golden_inputs()[:count]:
+            zf.writestr(path.name, path.read_bytes())
+    return source.getvalue()
+
+
+class GoldenConversionTests(SimpleTestCase):
+    """Converted output must stay byte-identical to the recorded corpus"""
+
+    def test_golden_corpus(self):
+        inputs = golden_inputs()
+        self.assertTrue(inputs)
+        for path in inputs:
+            with self.subTest(case=path.name):
+                expected = golden_output(path).decode('utf-8')
+                converted = convert_json_file_content(path.read_text(encoding='utf-8'), path.name)
+                self.assertEqual(converted, expected)
+
+    def test_golden_corpus_every_backend(self):
+        for name in SERIALIZERS:
+            serializer = get_serializer(name)
+            for path in golden_inputs():
+                with self.subTest(backend=name, case=path.name):
+                    self.assertEqual(serializer.transcode(path.read_bytes(), convert_document), golden_output(path))
+
+    def test_streaming_matches_golden_corpus_at_tiny_reads(self):
+        for path in golden_inputs():
+            with self.subTest(case=path.name):
+                out = io.BytesIO()
+                convert_json_stream(io.BytesIO(path.read_bytes()), out, path.name, read_size=3)
+                self.assertEqual(out.getvalue(), golden_output(path))
+
+
+class StreamingZipTests(SimpleTestCase):
+    """ZIP packs are converted and sent entry by entry"""
+
+    def test_streamed_members_match_single_file_conversion(self):
+        source = io.BytesIO(golden_zip(len(golden_inputs())))
+        with zipfile.ZipFile(source, 'a') as zf:
+            zf.writestr('broken.json', b'{"forms": [')
+            zf.writestr('readme.txt', b'not a species')
+        upload = SimpleUploadedFile('pack.zip', source.getvalue(), 'application/zip')
+        response = views.convert_zip_file(RequestFactory().post('/convert-zip/', {'zip_file': upload}))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="pack_converted.zip"')
+        chunks = list(response.streaming_content)
+        response.close()
+        self.assertGreater(len(chunks), len(golden_inputs()))  # at least one chunk per member
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        names = [path.name for path in golden_inputs()]
+        self.assertEqual(archive.namelist(), [f"{name[:-5]}_new.json" for name in names])
+        for path in golden_inputs():
+            with self.subTest(case=path.name):
+                self.assertEqual(archive.read(f"{path.stem}_new.json"), golden_output(path))
+
+    def test_results_report_failed_entries_in_archive_order(self):
+        source = io.BytesIO()
+        with zipfile.ZipFile(source, 'w') as zf:
+            zf.writestr('a.json', b'{"name": "A"}')
+            zf.writestr('b.json', b'[1')
+            zf.writestr('c.json', b'{"name": "C"}')
+        results = []
+        zip_file = zipfile.ZipFile(source)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_converted_zip(zip_file, zip_file.namelist(), results))))
+        self.assertEqual(archive.namelist(), ['a_new.json', 'c_new.json'])
+        self.assertEqual([(r['original'], r['status']) for r in results],
+                         [('a.json', 'success'), ('b.json', 'error'), ('c.json', 'success')])
+
+
+class BatchEngineTests(SimpleTestCase):
+    """Process-pool batch conversion"""
+
+    def test_pool_output_matches_serial_in_input_order(self):
+        entries = [(path.name, path.read_bytes()) for path in golden_inputs()]
+        entries.insert(3, ('broken.json', b'{"forms": ['))
+        serial = list(iter_convert_batch(entries, workers=1))
+        pooled = list(iter_convert_batch(iter(entries), workers=2, chunk_size=2))
+        self.assertEqual(
+            [(record['original'], record['status'], converted) for record, converted in pooled],
+            [(record['original'], record['status'], converted) for record, converted in serial],
+        )
+        self.assertEqual([record['original'] for record, _ in pooled], [name for name, _ in entries])
+        self.assertEqual(pooled[0][1], golden_output(golden_inputs()[0]))
+
+    def test_concurrent_callers_share_one_pool(self):
+        barrier = threading.Barrier(8)
+        pools = []
+
+        def get_pool():
+            barrier.wait()
+            pools.append(get_batch_pool(3))
+
+        threads = [threading.Thread(target=get_pool) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.addCleanup(pools[0].shutdown)
+        self.addCleanup(discard_batch_pool, 3, pools[0])
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+
+
+class ConvertTreeCommandTests(SimpleTestCase):
+    """Offline bulk conversion of directory trees"""
+
+    def run_command(self, *args, **options) -> str:
+        out = io.StringIO()
+        call_command('convert_tree', *args, workers=1, stdout=out, stderr=io.StringIO(), **options)
+        return out.getvalue()
+
+    def test_converts_tree_into_mirror_and_skips_up_to_date_files(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+            for index, path in enumerate(golden_inputs()):
+                nested = Path(source) / f"gen{index % 2}" / path.name
+                nested.parent.mkdir(exist_ok=True)
+                nested.write_bytes(path.read_bytes())
+            (Path(source) / 'broken.json').write_bytes(b'{"forms": [')
+            count = len(golden_inputs())
+            self.assertIn(f"Converted {count} file(s), 1 error(s), 0 up to date",
+                          self.run_command(source, output_dir=target))
+            for index, path in enumerate(golden_inputs()):
+                with self.subTest(case=path.name):
+                    converted = Path(target) / f"gen{index % 2}" / f"{path.stem}_new.json"
+                    self.assertEqual(converted.read_bytes(), golden_output(path))
+            self.assertFalse(list(Path(source).rglob('*_new.json')))
+            self.assertIn(f"Converted 0 file(s), 1 error(s), {count} up to date",
+                          self.run_command(source, output_dir=target))
+            self.assertIn(f"Converted {count} file(s)", self.run_command(source, output_dir=target, force=True))
+
+    def test_asset_manifest_keeps_non_ascii_names(self):
+        document = json.loads(golden_inputs()[0].read_text(encoding='utf-8'))
+        document['name'] = 'Flabébé'
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+            (Path(source) / 'flabebe.json').write_text(json.dumps(document), encoding='utf-8')
+            manifest_path = Path(target) / 'assets.json'
+            self.run_command(source, output_dir=target, asset_manifest=str(manifest_path))
+            manifest = manifest_path.read_bytes()
+        self.assertIn('"Flabébé"'.encode('utf-8'), manifest)
+        self.assertEqual(manifest, manifest_json(json.loads(manifest)))
+
+    def test_rejects_unusable_arguments(self):
+        with tempfile.TemporaryDirectory() as source:
+            with self.assertRaises(CommandError):
+                self.run_command(source, reverse=True)  # would overwrite the OLD files in place
+            with self.assertRaises(CommandError):
+                self.run_command(str(Path(source) / 'missing'))
+            with self.assertRaises(CommandError):
+                self.run_command(source, profile='no-such-profile')
+
+
+class IncrementalZipTests(SimpleTestCase):
+    """Re-uploaded packs reuse unchanged members of the previous result"""
+
+    def convert(self, source: bytes, previous: bytes = None, profile=None) -> tuple:
+        results = []
+        zip_file = zipfile.ZipFile(io.BytesIO(source))
+        previous_zip = zipfile.ZipFile(io.BytesIO(previous)) if previous is not None else None
+        with self.settings(CONVERTER_CACHE_MAX_BYTES=0):
+            output = b''.join(stream_converted_zip(
+                zip_file, zip_file.namelist(), results, previous_zip, profile=profile,
+            ))
+        return output, {record['original']: bool(record.get('reused')) for record in results}
+
+    def test_only_changed_entries_are_converted_again(self):
+        names = [path.name for path in golden_inputs()[:3]]
+        first, reused = self.convert(golden_zip(3))
+        self.assertEqual(set(reused.values()), {False})
+
+        source = io.BytesIO()
+        with zipfile.ZipFile(source, 'w') as zf:
+            for path in golden_inputs()[:3]:
+                raw = path.read_bytes()
+                if path.name == names[1]:
+                    raw = json.dumps({**json.loads(raw), 'generation': 9}).encode()
+                zf.writestr(path.name, raw)
+        second, reused = self.convert(source.getvalue(), first)
+        self.assertEqual(reused, {names[0]: True, names[1]: False, names[2]: True})
+        before, after = zipfile.ZipFile(io.BytesIO(first)), zipfile.ZipFile(io.BytesIO(second))
+        self.assertEqual(after.namelist(), before.namelist())
+        for name in (names[0], names[2]):
+            member = f"{name[:-5]}_new.json"
+            self.assertEqual(after.read(member), before.read(member))
+            self.assertEqual(after.getinfo(member).comment, before.getinfo(member).comment)
+        self.assertIn(b'"generation": 9', after.read(f"{names[1][:-5]}_new.json"))
+
+    def test_other_profiles_do_not_reuse(self):
+        first, _ = self.convert(golden_zip(2))
+        profile = compile_profiles({"retro": {"sound_range": 16}})["retro"]
+        _, reused = self.convert(golden_zip(2), first, profile)
+        self.assertEqual(set(reused.values()), {False})
+
+
+class ConversionCacheTests(SimpleTestCase):
+    """Content-addressed result cache and its memory and disk tiers"""
+
+    def test_hits_and_keys(self):
+        cache = ConversionCache()
+        raw = golden_inputs()[0].read_bytes()
+        first = convert_json_bytes(raw, cache=cache)
+        self.assertEqual(first, golden_output(golden_inputs()[0]))
+        self.assertIs(convert_json_bytes(raw, cache=cache), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        keys = {
+            cache.key(raw),
+            cache.key(raw, "reverse"),
+            cache.key(raw + b" "),
+            ConversionCache(version="2").key(raw),
+        }
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(cache.key(raw, "forward", BUILTIN_PROFILE), cache.key(raw))
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = ConversionCache(max_bytes=30)
+        for key in "abc":
+            cache.put(key, key.encode() * 10)
+        cache.get("a")  # 'b' is now the least recently used
+        cache.put("d", b"d" * 10)
+        self.assertEqual([key for key in "abcd" if cache.get(key) is not None], ["a", "c", "d"])
+        self.assertEqual((cache.stats()['bytes'], cache.evictions), (30, 1))
+        cache.put("huge", b"x" * 31)  # larger than the whole tier: not kept
+        self.assertIsNone(cache.get("huge"))
+
+    def test_disk_tier_refills_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ConversionCache(disk_dir=tmp).put("k" * 64, b"converted")
+            cache = ConversionCache(disk_dir=tmp)  # a fresh process
+            self.assertEqual(cache.get("k" * 64), b"converted")
+            self.assertEqual(cache.get("k" * 64), b"converted")
+            self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (2, 1, 0))
+            self.assertIsNone(cache.get("m" * 64))
+
+    def test_disk_tier_evicts_least_recently_used_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ConversionCache(disk_dir=tmp, disk_max_bytes=1000)
+            keys = [cache.key(bytes([i])) for i in range(12)]
+            for age, key in enumerate(keys):
+                cache.put(key, b'x' * 100)
+                os.utime(cache._disk_path(key), (age, age))
+            # The 11th write went over the limit: the two oldest files went, down to 90%
+            self.assertEqual(sorted(p.stem for p in Path(tmp).glob('*/*.json')), sorted(keys[2:]))
+            self.assertEqual((cache.stats()['disk_bytes'], cache.stats()['disk_evictions']), (1000, 2))
+
+
+class JobTests(SimpleTestCase):
+    """Background ZIP conversion jobs"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = self.settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def make_job_dir(self, state: str, age: float) -> str:
+        job_id = uuid.uuid4().hex
+        jobs.job_dir(job_id).mkdir(parents=True)
+        jobs.write_status(job_id, {'job_id': job_id, 'state': state})
+        stamp = time.time() - age
+        os.utime(jobs.job_dir(job_id) / 'status.json', (stamp, stamp))
+        return job_id
+
+    def wait_for(self, job_id: str) -> dict:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            status = jobs.read_status(job_id)
+            if status['state'] in ('done', 'failed'):
+                return status
+            time.sleep(0.02)
+        self.fail(f"job {job_id} did not finish")
+
+    def test_job_reports_status_and_serves_the_archive(self):
+        upload = SimpleUploadedFile('pack.zip', golden_zip(3), 'application/zip')
+        response = views.create_zip_job(RequestFactory().post('/convert-zip/jobs/', {'zip_file': upload}))
+        self.assertEqual(response.status_code, 202)
+        created = json.loads(response.content)
+        self.assertEqual((created['state'], created['total']), ('queued', 3))
+        status = self.wait_for(created['job_id'])
+        self.assertEqual((status['state'], status['done'], status['converted'], status['failed']), ('done', 3, 3, 0))
+
+        request = RequestFactory().get('/')
+        payload = json.loads(views.zip_job_status(request, created['job_id']).content)
+        self.assertTrue(payload['download_url'].endswith(f"/convert-zip/jobs/{created['job_id']}/download/"))
+        download = views.zip_job_download(request, created['job_id'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(download.streaming_content)))
+        download.close()
+        for path in golden_inputs()[:3]:
+            self.assertEqual(archive.read(f"{path.stem}_new.json"), golden_output(path))
+        self.assertFalse((jobs.job_dir(created['job_id']) / 'input.zip').exists())
+
+    def test_failed_jobs_keep_only_their_status(self):
+        counters = {'done': 0, 'converted': 0, 'reused': 0, 'failed': 0, 'errors': [], 'stage_seconds': {}}
+        for case, profile in (('unknown profile', 'missing'), ('output not replaceable', None)):
+            with self.subTest(case=case):
+                job_id = self.make_job_dir('queued', 0)
+                directory = jobs.job_dir(job_id)
+                (directory / 'input.zip').write_bytes(golden_zip(2))
+                (directory / 'previous.zip').write_bytes(golden_zip(1))
+                if profile is None:
+                    (directory / 'output.zip').mkdir()  # the converted archive cannot be moved into place
+                jobs.write_status(job_id, {'job_id': job_id, 'state': 'queued', 'profile': profile, **counters})
+                jobs.run_job(job_id)
+                self.assertEqual(jobs.read_status(job_id)['state'], 'failed')
+                expected = ['status.json'] if profile else ['output.zip', 'status.json']
+                self.assertEqual(sorted(path.name for path in directory.iterdir()), expected)
+
+    def test_unknown_and_unfinished_jobs(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(views.zip_job_status(request, 'not-a-job-id').status_code, 404)
+        self.assertEqual(views.zip_job_download(request, uuid.uuid4().hex).status_code, 404)
+        queued = self.make_job_dir('queued', 0)
+        self.assertEqual(views.zip_job_download(request, queued).status_code, 409)
+        upload = SimpleUploadedFile('pack.zip', b'not a zip', 'application/zip')
+        response = views.create_zip_job(RequestFactory().post('/convert-zip/jobs/', {'zip_file': upload}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([path.name for path in jobs.jobs_root().iterdir()], [queued])
+
+    def test_cleanup_keeps_queued_and_running_jobs(self):
+        expired = {state: self.make_job_dir(state, 120) for state in ('queued', 'running', 'done', 'failed')}
+        fresh = self.make_job_dir('done', 10)
+        abandoned = self.make_job_dir('running', jobs.ABANDONED_AFTER + 1)
+        jobs.cleanup_expired_jobs(ttl=60)
+        kept = {path.name for path in jobs.jobs_root().iterdir()}
+        self.assertEqual(kept, {expired['queued'], expired['running'], fresh})
+        self.assertNotIn(abandoned, kept)
+
+
+class BenchmarkTests(SimpleTestCase):
+    """Synthetic species corpus and the benchmark command"""
+
+    def test_corpus_is_deterministic_and_valid(self):
+        first = list(iter_corpus(3, forms=2, palettes=3, pqc_entries=2, seed=7))
+        self.assertEqual(first, list(iter_corpus(3, forms=2, palettes=3, pqc_entries=2, seed=7)))
+        self.assertNotEqual(first, list(iter_corpus(3, forms=2, palettes=3, pqc_entries=2, seed=8)))
+        self.assertEqual([name for name, _ in first], ["species/0001.json", "species/0002.json", "species/0003.json"])
+        for name, doc in first:
+            with self.subTest(case=name):
+                self.assertEqual(validate_document(doc), [])
+                self.assertEqual(len(doc["forms"]), 2)
+                palettes = convert_document(doc)["forms"][1]["genderProperties"][0]["palettes"]
+                self.assertEqual([len(p["models"][0]["models"]) for p in palettes], [2, 2, 2])
+
+    def test_benchmark_command_reports_every_stage(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command('benchmark_conversion', files=3, repeat=1, json=True, write_corpus=tmp, stdout=out)
+            self.assertEqual(len(list(Path(tmp).rglob('*.json'))), 3)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['files'], 3)
+        self.assertEqual(list(report['stages']), ['parse', 'convert_document', 'serialize', 'convert_zip view'])
+        self.assertTrue(all(stage['seconds'] > 0 for stage in report['stages'].values()))
+
+
+class MetricsTests(SimpleTestCase):
+    """Request, file and stage metrics are exported as Prometheus text or JSON"""
+
+    def setUp(self):
+        metrics.reset()
+
+    def convert_text(self, json_text: str, **headers):
+        body = json.dumps({'json_text': json_text})
+        return views.convert_text_input(RequestFactory().post(
+            '/convert-text/', body, content_type='application/json', headers=headers,
+        ))
+
+    def test_prometheus_text_counts_requests_files_and_stages(self):
+        with self.settings(CONVERTER_CACHE_MAX_BYTES=0):
+            self.assertEqual(self.convert_text(golden_inputs()[0].read_text(encoding='utf-8')).status_code, 200)
+            self.assertEqual(self.convert_text('').status_code, 400)
+            response = views.metrics_view(RequestFactory().get('/metrics/'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        for line in (
+            'converter_files_total{status="converted"} 1',
+            'converter_requests_total{view="convert_text"} 2',
+            'converter_request_errors_total{view="convert_text",class="4xx"} 1',
+            'converter_request_errors_total{view="convert_text",class="5xx"} 0',
+            'converter_stage_seconds_count{stage="convert"} 1',
+            'converter_admission_active{class="interactive"} 0',
+            'converter_admission_waiting{class="batch"} 0',
+            '# TYPE converter_admission_active gauge',
+            '# TYPE converter_admission_inflight_cost gauge',
+            '# TYPE converter_admission_rejected_total counter',
+        ):
+            self.assertIn(line, lines)
+        self.assertFalse(any(line.startswith('converter_cache_') for line in lines))
+        self.assertEqual(len([line for line in lines if line.startswith('# HELP ')]),
+                         len([line for line in lines if line.startswith('# TYPE ')]))
+
+    def test_prometheus_text_types_cache_and_rejection_families(self):
+        rejected = get_scheduler().stats()['classes'][BATCH]['rejected'][429]
+        with self.settings(CONVERTER_CACHE_MAX_BYTES=1024 * 1024):
+            lines = views.metrics_view(RequestFactory().get('/metrics/')).content.decode().splitlines()
+        for line in (
+            '# TYPE converter_cache_hits_total counter',
+            '# TYPE converter_cache_misses_total counter',
+            '# TYPE converter_cache_evictions_total counter',
+            '# TYPE converter_cache_bytes gauge',
+            f'converter_admission_rejected_total{{class="batch",status="429"}} {rejected}',
+        ):
+            self.assertIn(line, lines)
+
+    def test_json_format_reports_error_rate_cache_and_admission(self):
+        self.convert_text('')
+        response = views.metrics_view(RequestFactory().get('/metrics/', {'format': 'json'}))
+        snapshot = json.loads(response.content)
+        self.assertEqual(snapshot['requests']['convert_text']['error_rate'], 1.0)
+        self.assertEqual(snapshot['files'], {'converted': 0, 'failed': 0, 'cached': 0})
+        self.assertIn('hits', snapshot['cache'])
+        self.assertEqual(set(snapshot['admission']['classes']), {INTERACTIVE, BATCH})
+
+    def test_timing_header_is_opt_in_and_marks_cache_hits(self):
+        json_text = json.dumps({'name': uuid.uuid4().hex, 'forms': []})
+        self.assertNotIn(TIMING_HEADER, self.convert_text(json_text))
+        self.assertEqual(self.convert_text(json_text, **{TIMING_HEADER: '1'})[TIMING_HEADER], 'cache=hit')
+        with self.settings(CONVERTER_CACHE_MAX_BYTES=0):
+            timing = self.convert_text(json_text, **{TIMING_HEADER: '1'})[TIMING_HEADER]
+        stages = dict(pair.split('=') for pair in timing.split(', '))
+        self.assertIn('convert', stages)
+        self.assertTrue(all(value.endswith('ms') for value in stages.values()))
+
+
+class ConversionLogicTests(SimpleTestCase):
+    """Palette, model entry and key ordering building blocks of the converter"""
+
+    def test_convert_palette_uses_movement_rules(self):
+        pal = convert_palette({"name": "none", "texture": "a/b/none.png"}, {"canFly": True, "canSurf": True})
+        anims = [a["type"] for a in pal["models"][0]["models"][0]["animations"]]
+        self.assertEqual(anims, ["idle", "walk", "fly", "swim"])
+
+    def test_shiny_clone_leaves_shared_templates_untouched(self):
+        entry = make_model_entry("m/a/model.bmd", "t/none.png", None, True, False)
+        base = wrap_models_with_predicate([entry])
+        shiny = clone_models_for_shiny_wrapped(base, "t/shiny.png")
+        self.assertEqual(base[0]["models"][0]["texture"], "t/none.png")
+        self.assertEqual(shiny[0]["models"][0]["texture"], "t/shiny.png")
+        self.assertEqual(shiny[0]["model_predicate"], {"type": "pixelmon:always"})
+        self.assertIsNot(shiny[0]["model_predicate"], base[0]["model_predicate"])
+        fresh = make_model_entry("m/a/model.bmd", None, None, True, False)
+        self.assertNotIn("texture", fresh)
+        self.assertEqual(fresh["animations"], base[0]["models"][0]["animations"])
+        self.assertIsNot(fresh["animations"], base[0]["models"][0]["animations"])
+        self.assertIsNot(fresh["animations"][0], base[0]["models"][0]["animations"][0])
+
+    def test_ordering_plan_rules_and_extras(self):
+        plan = OrderingPlan(["b", "a", "c"], {"c": lambda src, ctx: OMIT if ctx else src["x"] * 2}, keep_extra=True)
+        built = plan.build({"x": 1, "a": 2, "b": 3})
+        self.assertEqual(list(built.items()), [("b", 3), ("a", 2), ("c", 2), ("x", 1)])
+        self.assertEqual(list(plan.build({"x": 1}, ctx=True)), ["x"])
+        with self.assertRaises(ValueError):
+            OrderingPlan(["a"], {"b": lambda src, ctx: None})
+
+
+class SerializerTests(SimpleTestCase):
+    """Every JSON backend must produce the same bytes"""
+
+    def test_backends_agree_on_exponent_floats(self):
+        raw = b'{"forms": [{"weight": 1e16, "catchRate": 0.00001, "eggCycles": 1E-7}]}'
+        outputs = {get_serializer(name).transcode(raw, convert_document) for name in SERIALIZERS}
+        self.assertEqual(len(outputs), 1)
+        self.assertIn(b'"weight": 1e+16', outputs.pop())
+
+
+class ValidationTests(SimpleTestCase):
+    """Up-front shape validation of OLD documents"""
+
+    def test_validation_reports_json_paths(self):
+        palettes = [{"modelLocator": {"pqc": ["m/a.pqc", 7]}}, "x"]
+        doc = {"forms": [{"genderProperties": [{"palettes": palettes}]}]}
+        self.assertEqual(validate_document(doc), [
+            "$.forms[0].genderProperties[0].palettes[0].modelLocator.pqc[1]: expected string, got number",
+            "$.forms[0].genderProperties[0].palettes[1]: expected object, got string",
+        ])
+        self.assertEqual(
+            validate_document({"forms": [], "defaultForms": 3}),
+            ["$.defaultForms: expected array, got number"],
+        )
+        for path in golden_inputs():
+            with self.subTest(case=path.name):
+                self.assertEqual(validate_document(get_serializer().loads(path.read_bytes())), [])
+
+
+class RoundTripTests(SimpleTestCase):
+    """Reverse conversion back to the OLD format"""
+
+    def test_reverse_restores_old_palette_fields(self):
+        palette = {
+            "name": "none", "texture": "t/none.png", "emissive": "t/emi.png",
+            "modelLocator": {"pqc": ["m/a.pqc", "m/b.pqc"]},
+            "sounds": ["pixelmon:cry"], "particle": "shiny", "tags": ["t"],
+        }
+        old = {"name": "X", "dex": 1, "defaultForms": ["base"], "forms": [
+            {"name": "base", "genderProperties": [{"gender": "male", "palettes": [palette]}]},
+        ]}
+        restored, report = round_trip(old)
+        self.assertEqual(report, {})
+        self.assertEqual(restored, old)
+        self.assertEqual(list(restored["forms"][0]["genderProperties"][0]["palettes"][0]), [
+            "name", "texture", "emissive", "modelLocator", "sounds", "particle", "tags",
+        ])
+        self.assertNotIn("growth_data", reverse_document(convert_document(old))["forms"][0])
+        _, report = round_trip({"forms": [{"name": "", "extra": 1}]})
+        self.assertEqual(report["forms[].extra"], {"lost": 1, "added": 0, "changed": 0})
+        self.assertEqual(report["forms[].name"]["changed"], 1)
+
+
+class ReferenceIndexTests(SimpleTestCase):
+    """Cross-file evolution and form references of a pack"""
+
+    def test_reference_index_reports_dangling_references(self):
+        index = ReferenceIndex()
+        index.add("a.json", summarize_document({"name": "Mr. Mime", "dex": 122, "defaultForms": ["galarian"], "forms": [
+            {"name": "", "evolutions": [{"to": {"name": "mr_rime"}}]},
+            {"name": "Galarian", "evolutions": [{"to": {"name": "mrrime", "form": "alolan"}}]},
+        ]}))
+        index.add("b.json", summarize_document({"name": "Mr. Rime", "dex": 866, "forms": [
+            {"name": "base", "preEvolutions": ["mrmime form:galarian", "mime_jr"], "defaultBaseForm": "base"},
+        ]}))
+        self.assertEqual(index.resolve("MR-MIME", "galarian"), ("Mr. Mime", 122, "galarian"))
+        self.assertEqual(
+            [(i["source"], i["path"], i["reason"]) for i in index.dangling()],
+            [("a.json", "$.forms[1].evolutions[0].to", "unknown form"),
+             ("b.json", "$.forms[0].preEvolutions[1]", "unknown species")],
+        )
+
+
+class AssetRegistryTests(SimpleTestCase):
+    """Pack-wide asset manifest"""
+
+    def test_asset_registry_interns_paths_and_hints(self):
+        registry = AssetRegistry()
+        for species in ("Bulbasaur", "Ivysaur"):
+            palette = {"name": "none", "texture": f"t/{species}/none.png",
+                       "modelLocator": {"pqc": ["m/shared/model.pqc"]}}
+            doc = convert_document({"name": species, "forms": [{"genderProperties": [{"palettes": [palette]}]}]})
+            registry.add(f"{species}.json", summarize_assets(doc))
+        manifest = registry.manifest()
+        self.assertEqual(manifest["unique_models"], 1)
+        self.assertEqual(manifest["models"][0]["species"], ["Bulbasaur", "Ivysaur"])
+        self.assertEqual({h["hint"] for h in manifest["hints"]}, {"no_shiny"})
+        self.assertIs(registry.intern("m/shared/model.bmd"), manifest["models"][0]["model"])
+
+    def test_derived_model_hint_only_when_siblings_use_other_models(self):
+        def species(name, pqc):
+            none = {"name": "none", "texture": f"t/{name}/none.png"}
+            if pqc:
+                none["modelLocator"] = {"pqc": [f"m/{name}/model.pqc"]}
+            shiny = {"name": "shiny", "texture": f"t/{name}/shiny.png"}
+            return {"name": name, "forms": [{"genderProperties": [{"palettes": [none, shiny]}]}]}
+
+        registry = AssetRegistry()
+        for name, pqc in (("Mixed", True), ("Derived", False)):
+            record, converted = convert_entry_with_assets(f"{name}.json", json.dumps(species(name, pqc)).encode())
+            self.assertEqual(record['assets'], summarize_assets(json.loads(converted)))
+            registry.add(record['original'], record['assets'])
+        hints = [(h["species"], h["palette"], h["hint"]) for h in registry.manifest()["hints"]]
+        self.assertEqual(hints, [("Mixed", "shiny", "derived_model")])
+
+
+class CompressionProfileTests(SimpleTestCase):
+    """ZIP output compression profiles"""
+
+    def test_zip_compression_profiles_keep_contents(self):
+        source = golden_zip(3)
+        outputs = {}
+        for profile in (CompressionProfile('stored'), CompressionProfile('deflate', 1), CompressionProfile('lzma')):
+            archive = zipfile.ZipFile(io.BytesIO(source))
+            converted = b''.join(stream_converted_zip(archive, archive.namelist(), compression=profile))
+            out = zipfile.ZipFile(io.BytesIO(converted))
+            self.assertIsNone(out.testzip())
+            self.assertEqual({info.compress_type for info in out.infolist()}, {profile.method})
+            reference = io.BytesIO()
+            with zipfile.ZipFile(reference, 'w') as ref_zip:
+                ref_zip.writestr('member.json', b'{}', compress_type=profile.method)
+            expected_flags = zipfile.ZipFile(reference).getinfo('member.json').flag_bits
+            self.assertEqual({info.flag_bits for info in out.infolist()}, {expected_flags})
+            outputs[profile.label] = {name: out.read(name) for name in out.namelist()}
+        self.assertEqual(outputs['stored'], outputs['deflate-1'])
+        self.assertEqual(outputs['stored'], outputs['lzma'])
+        with self.assertRaises(ValueError):
+            CompressionProfile('stored', 3)
+
+
+class ConversionProfileTests(SimpleTestCase):
+    """Named conversion profiles and their rules"""
+
+    def test_conversion_profiles_replace_defaults(self):
+        profiles = compile_profiles({
+            "retro": {"sound_range": 16, "model_scale": 1.2, "growth_data": {"mean": 45.0}},
+            "plain": {"extends": "retro", "particle": None},
+        })
+        self.assertEqual(profiles["default"].tag, "")
+        old = {"name": "A", "forms": [{"genderProperties": [{"palettes": [
+            {"name": "none", "texture": "t/none.png", "sounds": ["cry"], "particle": "shiny"},
+        ]}]}]}
+        form = convert_document(old, pickle.loads(pickle.dumps(profiles["plain"])))["forms"][0]
+        palette = form["genderProperties"][0]["palettes"][0]
+        self.assertEqual(palette["sounds"], [{"sound_id": "pixelmon:cry", "range": 16}])
+        self.assertEqual(palette["models"][0]["models"][0]["scale"], 1.2)
+        self.assertNotIn("particle", palette)
+        self.assertEqual(form["growth_data"], {**BUILTIN_PROFILE.rules["growth_data"], "mean": 45.0})
+        retro_palette = convert_document(old, profiles["retro"])["forms"][0]["genderProperties"][0]["palettes"][0]
+        self.assertEqual(retro_palette["particle"], BUILTIN_PROFILE.rules["particle"])
+        bad_profiles = (
+            {"retro": {"scale": 2}},
+            {"a": {"extends": "b"}, "b": {"extends": "a"}},
+            {"x": {"model_scale": 1e-7}},
+        )
+        for bad in bad_profiles:
+            with self.assertRaises(ValueError):
+                compile_profiles(bad)
+
+    def test_key_order_is_part_of_the_profile_tag(self):
+        profiles = compile_profiles({
+            "xy": {"growth_data": {"x": 1, "y": 2}},
+            "yx": {"growth_data": {"y": 2, "x": 1}},
+        })
+        self.assertNotEqual(profiles["xy"].tag, profiles["yx"].tag)
+        cache = ConversionCache()
+        raw = b'{"forms": [{"name": "base"}]}'
+        self.assertNotEqual(cache.key(raw, "forward", profiles["xy"]), cache.key(raw, "forward", profiles["yx"]))
+        growth = convert_document(json.loads(raw), profiles["yx"])["forms"][0]["growth_data"]
+        self.assertEqual(list(growth)[-2:], ["y", "x"])
+
+
+class ZipInputTests(SimpleTestCase):
+    """Memory-mapped input ZIPs and their central-directory limits"""
+
+    def test_mapped_zip_reads_match_zipfile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'pack.zip'
+            with zipfile.ZipFile(path, 'w') as zf:
+                zf.writestr('stored.json', b'{"name": "A"}', zipfile.ZIP_STORED)
+                zf.writestr('bomb.json', b' ' * (2 * 1024 * 1024), zipfile.ZIP_DEFLATED)
+                zf.writestr('packed.json', b'{"x": 1}', zipfile.ZIP_BZIP2)
+            with zipfile.ZipFile(path) as plain, MappedZipFile(path) as mapped:
+                for name in plain.namelist():
+                    self.assertEqual(mapped.read(name), plain.read(name))
+                with self.settings(CONVERTER_ZIP_MAX_RATIO=100):
+                    with self.assertRaises(ZipLimitExceeded):
+                        check_zip_limits(mapped, mapped.namelist())
+                with self.settings(CONVERTER_ZIP_MAX_RATIO=0, CONVERTER_ZIP_MAX_UNCOMPRESSED=1024):
+                    with self.assertRaises(ZipLimitExceeded):
+                        check_zip_limits(mapped, ['bomb.json'])
+                    check_zip_limits(mapped, ['stored.json'])
+            with self.settings(CONVERTER_ZIP_MAX_ENTRIES=2), self.assertRaises(ZipLimitExceeded):
+                open_input_zip(path)
+
+
+class NdjsonTests(SimpleTestCase):
+    """The NDJSON endpoint streams one result line per input line"""
+
+    def post(self, body: bytes, **params):
+        query = '&'.join(f"{key}={value}" for key, value in params.items())
+        request = RequestFactory().post(f'/convert-ndjson/?{query}', body, content_type='application/x-ndjson')
+        return views.convert_ndjson(request)
+
+    def records(self, response) -> list:
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = list(response.streaming_content)
+        response.close()
+        self.assertTrue(all(line.endswith(b'\n') for line in lines))
+        return [json.loads(line) for line in lines]
+
+    def test_lines_keep_input_order_and_report_errors(self):
+        inputs = golden_inputs()[:3]
+        lines = [path.read_bytes().replace(b'\n', b'') for path in inputs]
+        body = b'\n'.join([lines[0], b'{"forms": [', b'', lines[1], b'[]', lines[2]]) + b'\n'
+        records = self.records(self.post(body))
+        self.assertEqual([(r['line'], r['status']) for r in records], [
+            (1, 'success'), (2, 'error'), (4, 'success'), (5, 'error'), (6, 'success'),
+        ])
+        for record, path in zip([records[0], records[2], records[4]], inputs):
+            self.assertEqual(record['document'], json.loads(golden_output(path)))
+        self.assertNotIn('document', records[1])
+        self.assertTrue(records[1]['error'])
+
+    def test_reverse_direction(self):
+        outputs = [golden_output(path) for path in golden_inputs()[:2]]
+        body = b'\n'.join(json.dumps(json.loads(raw)).encode() for raw in outputs)  # no trailing newline
+        records = self.records(self.post(body, direction='reverse'))
+        self.assertEqual([record['status'] for record in records], ['success', 'success'])
+        for record, raw in zip(records, outputs):
+            self.assertEqual(record['document'], reverse_document(json.loads(raw)))
+
+    def test_unknown_direction_or_profile_is_rejected(self):
+        for params in ({'direction': 'sideways'}, {'profile': 'missing'}):
+            with self.subTest(**params):
+                response = self.post(b'{}\n', **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', json.loads(response.content))
+
+
+class AsyncViewTests(SimpleTestCase):
+    """ASGI views offloading conversions to the pool"""
+
+    async def test_async_views_stream_from_the_pool(self):
+        upload = SimpleUploadedFile('pack.zip', golden_zip(3), 'application/zip')
+        request = AsyncRequestFactory().post('/convert-zip/', {'zip_file': upload})
+        response = await async_views.convert_zip_file(request)
+        self.assertTrue(response.is_async)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join([chunk async for chunk in response.streaming_content])))
+        self.assertEqual(len(archive.namelist()), 3)
+        response = await async_views.convert_text_input(AsyncRequestFactory().get('/convert-text/'))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_async_ndjson_streams_one_line_per_document(self):
+        inputs = golden_inputs()[:3]
+        body = b'\n'.join(path.read_bytes().replace(b'\n', b'') for path in inputs) + b'\n'
+        request = AsyncRequestFactory().post('/convert-ndjson/', body, content_type='application/x-ndjson')
+        response = await async_views.convert_ndjson(request)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), len(inputs))
+        for line_no, (chunk, path) in enumerate(zip(chunks, inputs), 1):
+            record = json.loads(chunk)
+            self.assertEqual((record['line'], record['status']), (line_no, 'success'))
+            self.assertEqual(record['document'], json.loads(golden_output(path)))
+
+
+class SchedulerTests(SimpleTestCase):
+    """Admission control of conversion requests"""
+
+    def test_batch_cost_never_refuses_interactive_requests(self):
+        scheduler = ConversionScheduler({INTERACTIVE: 2, BATCH: 2}, budget=100, max_wait=0)
+        with scheduler.admit(BATCH, 90):
+            with scheduler.admit(INTERACTIVE, 20), scheduler.admit(INTERACTIVE, 80):
+                with self.assertRaises(AdmissionRejected) as rejected:
+                    scheduler.admit(INTERACTIVE, 1)  # interactive cost is capped on its own
+                self.assertEqual(rejected.exception.status, 503)
+                with self.assertRaises(AdmissionRejected):
+                    scheduler.admit(BATCH, 1)
+            with self.assertRaises(AdmissionRejected):
+                scheduler.admit(BATCH, 20)
+        self.assertEqual(scheduler.inflight_cost, 0)
+
+    def test_oversized_requests_run_alone(self):
+        scheduler = ConversionScheduler({INTERACTIVE: 2, BATCH: 2}, budget=100, max_wait=0)
+        with scheduler.admit(INTERACTIVE, 60):
+            with self.assertRaises(AdmissionRejected):
+                scheduler.admit(BATCH, 500)
+        ticket = scheduler.admit(BATCH, 500)
+        with scheduler.admit(INTERACTIVE, 1):
+            self.assertEqual(scheduler.stats()['classes'][INTERACTIVE]['inflight_cost'], 1)
+        stream = AdmittedStream(ticket, iter([b'a']))
+        self.assertEqual(list(stream), [b'a'])
+        self.assertEqual(scheduler.stats()['classes'][BATCH]['active'], 0)
+        self.assertEqual(scheduler.inflight_cost, 0)
+
+    def test_class_concurrency_limits(self):
+        scheduler = ConversionScheduler({INTERACTIVE: 1, BATCH: 1}, max_wait=0, max_queue=1)
+        with scheduler.admit(INTERACTIVE):
+            with self.assertRaises(AdmissionRejected) as rejected:
+                scheduler.admit(INTERACTIVE)
+            self.assertEqual(rejected.exception.status, 503)
+            with scheduler.admit(BATCH):
+                pass
+        self.assertEqual(scheduler.stats()['classes'][INTERACTIVE]['rejected'], {429: 0, 503: 1})
+
+
+class FormPreviewTests(SimpleTestCase):
+    """Per-form conversion for the live editor preview"""
+
+    def test_form_preview_converts_and_caches_one_form(self):
+        old = {"name": "A", "forms": [
+            {"name": "", "movement": {"canFly": True},
+             "genderProperties": [{"palettes": [{"name": "none", "texture": "a/b/none.png"}]}]},
+            {"name": "alolan", "genderProperties": [{"palettes": [{"name": "none", "texture": "a/c/none.png"}]}]},
+        ]}
+        expected = convert_document(old)["forms"]
+        cache = ConversionCache()
+        raw = json.dumps(old).encode()
+        first = preview_form(raw, "alolan", cache)
+        self.assertEqual((first["index"], first["form_count"], first["cached"]), (1, 2, False))
+        self.assertEqual(json.loads(first["converted_form"]), expected[1])
+        self.assertTrue(preview_form(raw, 1, cache)["cached"])
+        old["forms"][0]["name"] = "base"  # editing another form keeps this one cached
+        self.assertTrue(preview_form(json.dumps(old).encode(), "1", cache)["cached"])
+        old["forms"][0]["movement"] = {}
+        self.assertFalse(preview_form(json.dumps(old).encode(), 1, cache)["cached"])
+        with self.assertRaises(ValueError):
+            preview_form(raw, 5, cache)
@@ -1,12 +1,27 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the conversion endpoints are served by their async counterparts
+if settings.CONVERTER_ASYNC_VIEWS:
+    from . import async_views as conversion_views
+else:
+    conversion_views = views
+
 app_name = 'converter'
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('convert-file/', views.convert_single_file, name='convert_file'),
-    path('convert-zip/', views.convert_zip_file, name='convert_zip'),
-    path('convert-text/', views.convert_text_input, name='convert_text'),
+    path('convert-file/', conversion_views.convert_single_file, name='convert_file'),
+    path('convert-zip/', conversion_views.convert_zip_file, name='convert_zip'),
+    path('convert-zip/jobs/', conversion_views.create_zip_job, name='zip_job_create'),
+    path('convert-zip/jobs/<str:job_id>/', views.zip_job_status, name='zip_job_status'),
+    path('convert-zip/jobs/<str:job_id>/download/', conversion_views.zip_job_download, name='zip_job_download'),
+    path('convert-text/', conversion_views.convert_text_input, name='convert_text'),
+    path('convert-form/', conversion_views.convert_form_preview, name='convert_form'),
+    path('convert-ndjson/', conversion_views.convert_ndjson, name='convert_ndjson'),
+    path('check-references/', conversion_views.check_references, name='check_references'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('help/', views.help_view, name='help'),
 ]
\ No newline at end of file
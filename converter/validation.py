@@ -0,0 +1,143 @@
+"""
+Structural validation of OLD-format documents
+
+The checks mirror what the converter actually relies on, so a document
+that passes converts without shape errors and one that fails would have
+failed deep inside the conversion. Errors carry the JSON path of the
+offending value, e.g. ``$.forms[0].genderProperties[1].palettes[0]``.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+# Stop collecting after this many errors; one precise error is enough to reject a file
+MAX_ERRORS = 20
+
+
+class SchemaError(ValueError):
+    """Raised when a document does not have the OLD-format shape"""
+
+    def __init__(self, errors: list):
+        self.errors = errors
+        message = "; ".join(errors[:3])
+        if len(errors) > 3:
+            message += f" (+{len(errors) - 3} more)"
+        super().__init__(message)
+
+
+def json_type(value) -> str:
+    """JSON type name of a decoded value"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return type(value).__name__
+
+
+@lru_cache(maxsize=8192)
+def _is_model_path(value: str) -> bool:
+    # pqc_to_bmd_path needs a final path component to swap the suffix on
+    return bool(Path(value).name)
+
+
+class _Errors(list):
+    """Error list that stops the walk once MAX_ERRORS is reached"""
+
+    def add(self, path: str, message: str):
+        self.append(f"{path}: {message}")
+        if len(self) >= MAX_ERRORS:
+            raise _Full()
+
+
+class _Full(Exception):
+    pass
+
+
+def _items(value, path: str, errors: _Errors):
+    """Yield (path, item) for an array that the converter iterates over"""
+    if isinstance(value, list):
+        for index, item in enumerate(value):
+            yield f"{path}[{index}]", item
+    elif not (isinstance(value, (str, dict)) and not value):
+        # Empty strings/objects iterate to nothing; anything else is not iterable or yields keys
+        errors.add(path, f"expected array, got {json_type(value)}")
+
+
+def _check_palette(palette: dict, path: str, errors: _Errors):
+    locator = palette.get("modelLocator") or {}
+    pqc = locator.get("pqc", []) if isinstance(locator, dict) else []
+    if isinstance(pqc, str):
+        if not _is_model_path(pqc):
+            errors.add(f"{path}.modelLocator.pqc", "expected a model path")
+        return
+    if isinstance(pqc, list) and pqc:
+        for index, item in enumerate(pqc):
+            item_path = f"{path}.modelLocator.pqc[{index}]"
+            if not isinstance(item, str):
+                errors.add(item_path, f"expected string, got {json_type(item)}")
+            elif not _is_model_path(item):
+                errors.add(item_path, "expected a model path")
+        return
+    # Without pqc entries the model is derived from the texture (or sprite) path
+    key = "texture" if palette.get("texture") else "sprite"
+    hint = palette.get(key)
+    if hint and not isinstance(hint, str):
+        errors.add(f"{path}.{key}", f"expected string, got {json_type(hint)}")
+
+
+def validate_form(form, path: str = "$.forms[0]", errors: _Errors = None) -> list:
+    """Return the structural errors of one OLD-format form"""
+    own = errors is None
+    if own:
+        errors = _Errors()
+    try:
+        if not isinstance(form, dict):
+            errors.add(path, f"expected object, got {json_type(form)}")
+            return errors
+        gender_properties = form.get("genderProperties", [])
+        if not isinstance(gender_properties, list):
+            return errors  # ignored by the converter
+        for index, entry in enumerate(gender_properties):
+            if not isinstance(entry, dict):
+                continue  # skipped by the converter
+            entry_path = f"{path}.genderProperties[{index}]"
+            for palette_path, palette in _items(entry.get("palettes", []), f"{entry_path}.palettes", errors):
+                if not isinstance(palette, dict):
+                    errors.add(palette_path, f"expected object, got {json_type(palette)}")
+                else:
+                    _check_palette(palette, palette_path, errors)
+    except _Full:
+        if not own:
+            raise
+    return errors
+
+
+def validate_document(doc) -> list:
+    """Return the structural errors of an OLD-format document (empty when valid)"""
+    errors = _Errors()
+    try:
+        if not isinstance(doc, dict):
+            errors.add("$", f"expected object, got {json_type(doc)}")
+            return errors
+        default_forms = doc.get("defaultForms")
+        if default_forms and not isinstance(default_forms, (list, str)):
+            errors.add("$.defaultForms", f"expected array, got {json_type(default_forms)}")
+        for form_path, form in _items(doc.get("forms", []), "$.forms", errors):
+            validate_form(form, form_path, errors)
+    except _Full:
+        pass
+    return errors
+
+
+def check_document(doc):
+    """Raise SchemaError if ``doc`` does not have the OLD-format shape"""
+    errors = validate_document(doc)
+    if errors:
+        raise SchemaError(errors)
@@ -1,22 +1,55 @@
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.contrib import messages
 import json
+import tempfile
 import zipfile
-import io
 import traceback
-from .conversion_logic import convert_json_file_content
+from django.conf import settings
+from .conversion_logic import (
+    DOCUMENT_TRANSFORMS, convert_json_bytes, converted_filename, convert_ndjson_line, iter_convert_batch,
+)
+from .result_cache import get_conversion_cache
+from .profiles import get_profile, profile_names
+from .zip_input import ZipLimitExceeded, check_zip_limits, open_input_zip
+from .scheduler import (
+    BATCH, INTERACTIVE, AdmissionRejected, admitted, get_scheduler, hold_until_sent, rejected_response, zip_cost,
+)
+from .streaming import convert_json_stream
+from .form_preview import preview_form
+from . import jobs
+from .asset_registry import AssetRegistry
+from .metrics import metrics, instrument_view, wants_timing, format_timing, TIMING_HEADER
+from .reference_index import build_reference_index
+from .zip_batch import (
+    compression_options, list_json_entries, preflight_options, preflight_zip, PreflightRejected, read_zip_entry,
+    stream_converted_zip,
+)
 
 def index(request):
     """Main page view"""
-    return render(request, 'converter/index.html')
+    return render(request, 'converter/index.html', {'profiles': profile_names()})
+
+def requested_profile(data):
+    """Conversion profile named in request data (the configured default when absent)"""
+    return get_profile(data.get('profile') or None)
+
+def requested_direction(data) -> str:
+    """Conversion direction from request data: 'forward' (OLD to NEW, default) or 'reverse'"""
+    direction = data.get('direction') or 'forward'
+    if direction not in DOCUMENT_TRANSFORMS:
+        raise ValueError(f"direction must be one of: {', '.join(DOCUMENT_TRANSFORMS)}")
+    return direction
 
 @csrf_exempt
+@instrument_view('convert_file')
 @require_http_methods(["POST"])
+@admitted(INTERACTIVE)
 def convert_single_file(request):
     """Convert a single JSON file"""
     try:
@@ -28,28 +61,57 @@ def convert_single_file(request):
         # Validate file type
         if not uploaded_file.name.endswith('.json'):
             return JsonResponse({'error': 'File must be a JSON file'}, status=400)
+
+        try:
+            direction = requested_direction(request.POST)
+            profile = requested_profile(request.POST)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        # Read file content
+        # Oversized documents are converted form by form with bounded memory
+        streaming_threshold = getattr(settings, 'CONVERTER_STREAMING_THRESHOLD', float('inf'))
+        if direction == 'forward' and uploaded_file.size > streaming_threshold:
+            output = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+            try:
+                convert_json_stream(uploaded_file, output, uploaded_file.name, profile=profile)
+            except UnicodeDecodeError:
+                output.close()
+                metrics.observe_file('failed')
+                return JsonResponse({'error': 'File must be UTF-8 encoded'}, status=400)
+            except Exception as e:
+                output.close()
+                metrics.observe_file('failed')
+                return JsonResponse({'error': f'Conversion error: {str(e)}'}, status=400)
+            metrics.observe_file('converted', None, uploaded_file.size, output.tell())
+            output.seek(0)
+            response = FileResponse(output, content_type='application/json')
+            response['Content-Disposition'] = f'attachment; filename="{converted_filename(uploaded_file.name)}"'
+            return response
+
+        # Convert the JSON (identical uploads are served from the result cache)
+        raw = uploaded_file.read()
+        timings = {}
         try:
-            file_content = uploaded_file.read().decode('utf-8')
+            converted_content = convert_json_bytes(
+                raw, uploaded_file.name, get_conversion_cache(), timings=timings, direction=direction,
+                profile=profile,
+            )
         except UnicodeDecodeError:
+            metrics.observe_file('failed')
             return JsonResponse({'error': 'File must be UTF-8 encoded'}, status=400)
-        
-        # Convert the JSON
-        try:
-            converted_content = convert_json_file_content(file_content, uploaded_file.name)
         except Exception as e:
+            metrics.observe_file('failed')
             return JsonResponse({'error': f'Conversion error: {str(e)}'}, status=400)
+        metrics.observe_file('converted' if timings else 'cached', timings, len(raw), len(converted_content))
         
         # Generate new filename
-        original_name = uploaded_file.name
-        if original_name.endswith('.json'):
-            original_name = original_name[:-5]  # Remove .json
-        new_filename = f"{original_name}_new.json"
+        new_filename = converted_filename(uploaded_file.name, direction)
         
         # Return the converted file as download
         response = HttpResponse(converted_content, content_type='application/json')
         response['Content-Disposition'] = f'attachment; filename="{new_filename}"'
+        if wants_timing(request):
+            response[TIMING_HEADER] = format_timing(timings)
         
         return response
         
@@ -57,9 +119,11 @@ def convert_single_file(request):
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
 @csrf_exempt
+@instrument_view('convert_zip')
 @require_http_methods(["POST"])
 def convert_zip_file(request):
     """Convert multiple JSON files from a ZIP archive"""
+    ticket = None
     try:
         if 'zip_file' not in request.FILES:
             return JsonResponse({'error': 'No ZIP file provided'}, status=400)
@@ -70,72 +134,181 @@ def convert_zip_file(request):
         if not uploaded_file.name.endswith('.zip'):
             return JsonResponse({'error': 'File must be a ZIP archive'}, status=400)
         
-        results = []
-        converted_files = {}
-        
         try:
-            # Read the ZIP file
-            with zipfile.ZipFile(uploaded_file, 'r') as zip_file:
-                json_files = [name for name in zip_file.namelist() if name.endswith('.json') and not name.endswith('_new.json')]
-                
-                if not json_files:
-                    return JsonResponse({'error': 'No JSON files found in ZIP archive'}, status=400)
-                
-                for json_filename in json_files:
-                    try:
-                        # Read JSON file from ZIP
-                        with zip_file.open(json_filename) as json_file:
-                            file_content = json_file.read().decode('utf-8')
-                        
-                        # Convert the JSON
-                        converted_content = convert_json_file_content(file_content, json_filename)
-                        
-                        # Generate new filename
-                        original_name = json_filename
-                        if original_name.endswith('.json'):
-                            original_name = original_name[:-5]  # Remove .json
-                        new_filename = f"{original_name}_new.json"
-                        
-                        converted_files[new_filename] = converted_content
-                        results.append({
-                            'original': json_filename,
-                            'converted': new_filename,
-                            'status': 'success'
-                        })
-                        
-                    except Exception as e:
-                        results.append({
-                            'original': json_filename,
-                            'converted': None,
-                            'status': 'error',
-                            'error': str(e)
-                        })
-                
+            # Only the central directory is read here; entries are streamed below
+            zip_file = open_input_zip(uploaded_file)
         except zipfile.BadZipFile:
             return JsonResponse({'error': 'Invalid ZIP file'}, status=400)
-        
-        # Create a new ZIP with converted files
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename, content in converted_files.items():
-                zip_file.writestr(filename, content)
-        
-        zip_buffer.seek(0)
-        
-        # Return the ZIP file as download
-        response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
+        except ZipLimitExceeded as e:
+            return JsonResponse({'error': f'ZIP rejected: {e}'}, status=400)
+
+        try:
+            direction = requested_direction(request.POST)
+            assets = AssetRegistry() if wants_asset_manifest(request.POST, direction) else None
+            compression = compression_options(request.POST)
+            profile = requested_profile(request.POST)
+        except ValueError as e:
+            zip_file.close()
+            return JsonResponse({'error': str(e)}, status=400)
+
+        json_files = list_json_entries(zip_file, direction)
+        if not json_files:
+            zip_file.close()
+            return JsonResponse({'error': 'No JSON files found in ZIP archive'}, status=400)
+        try:
+            check_zip_limits(zip_file, json_files)
+        except ZipLimitExceeded as e:
+            zip_file.close()
+            return JsonResponse({'error': f'ZIP rejected: {e}'}, status=400)
+
+        # Admission: the cost is known from the central directory before anything is decompressed
+        try:
+            ticket = get_scheduler().admit(BATCH, zip_cost(zip_file, json_files))
+        except AdmissionRejected as e:
+            zip_file.close()
+            return rejected_response(e)
+
+        # Pre-flight: parse and validate every entry before any CPU is spent converting
+        skip = None
+        try:
+            mode, max_invalid = preflight_options(request.POST)
+            if mode != 'off':
+                skip = preflight_zip(zip_file, json_files, max_invalid, direction)
+        except ValueError as e:
+            zip_file.close()
+            ticket.release()
+            return JsonResponse({'error': str(e)}, status=400)
+        except PreflightRejected as e:
+            zip_file.close()
+            ticket.release()
+            return JsonResponse(preflight_payload(e), status=400)
+
+        # Incremental mode: unchanged entries are copied from the previously converted archive
+        previous = None
+        if 'previous_zip' in request.FILES:
+            try:
+                previous = zipfile.ZipFile(request.FILES['previous_zip'], 'r')
+            except zipfile.BadZipFile:
+                zip_file.close()
+                ticket.release()
+                return JsonResponse({'error': 'Invalid previous ZIP file'}, status=400)
+
+        # Each entry is converted and compressed only when the client pulls the next chunk,
+        # so memory stays bounded by the largest single file instead of the whole pack
+        response = StreamingHttpResponse(
+            stream_converted_zip(
+                zip_file, json_files, previous=previous, skip=skip, direction=direction, assets=assets,
+                compression=compression, profile=profile,
+            ),
+            content_type='application/zip'
+        )
         original_zip_name = uploaded_file.name
         if original_zip_name.endswith('.zip'):
             original_zip_name = original_zip_name[:-4]  # Remove .zip
         response['Content-Disposition'] = f'attachment; filename="{original_zip_name}_converted.zip"'
         
-        return response
+        # The batch slot is held until the last entry has been streamed
+        return hold_until_sent(ticket, response)
         
     except Exception as e:
+        if ticket is not None:
+            ticket.release()
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
+def wants_asset_manifest(data, direction: str) -> bool:
+    """Whether the converted ZIP should include the pack-wide asset manifest"""
+    if data.get('asset_manifest') not in ('1', 'true', 'on'):
+        return False
+    if direction != 'forward':
+        raise ValueError('The asset manifest is only available for OLD to NEW conversions')
+    return True
+
+def preflight_payload(rejected: PreflightRejected) -> dict:
+    """Error response for an archive refused by the pre-flight pass"""
+    return {
+        'error': f'ZIP rejected: {rejected}',
+        'checked': rejected.checked,
+        'total': rejected.total,
+        'invalid': [{'original': name, 'error': error} for name, error in rejected.invalid.items()],
+    }
+
+def job_payload(request, status: dict) -> dict:
+    """Public view of a job status with its polling/download URLs"""
+    job_id = status['job_id']
+    payload = {k: v for k, v in status.items() if k != 'updated'}
+    payload['status_url'] = request.build_absolute_uri(reverse('converter:zip_job_status', args=[job_id]))
+    if status['state'] == 'done':
+        payload['download_url'] = request.build_absolute_uri(reverse('converter:zip_job_download', args=[job_id]))
+    return payload
+
+@csrf_exempt
+@instrument_view('zip_job_create')
+@require_http_methods(["POST"])
+def create_zip_job(request):
+    """Queue a ZIP archive for background conversion and return its job id"""
+    try:
+        if 'zip_file' not in request.FILES:
+            return JsonResponse({'error': 'No ZIP file provided'}, status=400)
+
+        uploaded_file = request.FILES['zip_file']
+        if not uploaded_file.name.endswith('.zip'):
+            return JsonResponse({'error': 'File must be a ZIP archive'}, status=400)
+
+        try:
+            direction = requested_direction(request.POST)
+            status = jobs.create_job(
+                uploaded_file,
+                request.FILES.get('previous_zip'),
+                preflight_options(request.POST),
+                direction,
+                wants_asset_manifest(request.POST, direction),
+                compression_options(request.POST),
+                requested_profile(request.POST),
+            )
+        except zipfile.BadZipFile:
+            return JsonResponse({'error': 'Invalid ZIP file'}, status=400)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return JsonResponse(job_payload(request, status), status=202)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+
+@require_http_methods(["GET"])
+def zip_job_status(request, job_id):
+    """Report progress of a background ZIP conversion"""
+    jobs.start_cleanup_timer()
+    try:
+        status = jobs.read_status(job_id)
+    except ValueError:
+        status = None
+    if status is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(job_payload(request, status))
+
+@require_http_methods(["GET"])
+def zip_job_download(request, job_id):
+    """Serve the converted archive of a finished job"""
+    jobs.start_cleanup_timer()
+    try:
+        status = jobs.read_status(job_id)
+    except ValueError:
+        status = None
+    if status is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    if status['state'] != 'done':
+        return JsonResponse({'error': f"Job is {status['state']}"}, status=409)
+    try:
+        output = open(jobs.output_path(job_id), 'rb')
+    except OSError:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return FileResponse(output, as_attachment=True, filename=status['filename'], content_type='application/zip')
+
 @csrf_exempt
+@instrument_view('convert_text')
 @require_http_methods(["POST"])
+@admitted(INTERACTIVE)
 def convert_text_input(request):
     """Convert JSON from text input"""
     try:
@@ -144,23 +317,186 @@ def convert_text_input(request):
         
         if not json_text:
             return JsonResponse({'error': 'No JSON text provided'}, status=400)
+
+        try:
+            direction = requested_direction(data)
+            profile = requested_profile(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
         # Convert the JSON
+        raw = json_text.encode('utf-8')
+        timings = {}
         try:
-            converted_content = convert_json_file_content(json_text, "text_input")
+            converted_content = convert_json_bytes(
+                raw, "text_input", get_conversion_cache(), timings=timings, direction=direction,
+                profile=profile,
+            )
         except Exception as e:
+            metrics.observe_file('failed')
             return JsonResponse({'error': f'Conversion error: {str(e)}'}, status=400)
+        metrics.observe_file('converted' if timings else 'cached', timings, len(raw), len(converted_content))
         
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
-            'converted_json': converted_content
+            'converted_json': converted_content.decode('utf-8')
         })
+        if wants_timing(request):
+            response[TIMING_HEADER] = format_timing(timings)
+        return response
         
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid request format'}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
+@csrf_exempt
+@instrument_view('convert_form')
+@require_http_methods(["POST"])
+@admitted(INTERACTIVE)
+def convert_form_preview(request):
+    """Convert one form of an OLD document, picked by index or name, for the live preview"""
+    try:
+        data = json.loads(request.body)
+        json_text = data.get('json_text', '').strip()
+        if not json_text:
+            return JsonResponse({'error': 'No JSON text provided'}, status=400)
+        try:
+            if requested_direction(data) != 'forward':
+                raise ValueError('Form preview is only available for OLD to NEW conversions')
+            profile = requested_profile(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        try:
+            result = preview_form(
+                json_text.encode('utf-8'), data.get('form', 0), get_conversion_cache(), profile,
+            )
+        except Exception as e:
+            return JsonResponse({'error': f'Conversion error: {str(e)}'}, status=400)
+        return JsonResponse({'success': True, **result})
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid request format'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+
+@csrf_exempt
+@instrument_view('check_references')
+@require_http_methods(["POST"])
+def check_references(request):
+    """Index the species in a ZIP and report evolution/form references that do not resolve"""
+    try:
+        if 'zip_file' not in request.FILES:
+            return JsonResponse({'error': 'No ZIP file provided'}, status=400)
+        try:
+            zip_file = open_input_zip(request.FILES['zip_file'])
+        except zipfile.BadZipFile:
+            return JsonResponse({'error': 'Invalid ZIP file'}, status=400)
+        except ZipLimitExceeded as e:
+            return JsonResponse({'error': f'ZIP rejected: {e}'}, status=400)
+        with zip_file:
+            json_files = list_json_entries(zip_file)
+            if not json_files:
+                return JsonResponse({'error': 'No JSON files found in ZIP archive'}, status=400)
+            try:
+                check_zip_limits(zip_file, json_files)
+                ticket = get_scheduler().admit(BATCH, zip_cost(zip_file, json_files))
+            except ZipLimitExceeded as e:
+                return JsonResponse({'error': f'ZIP rejected: {e}'}, status=400)
+            except AdmissionRejected as e:
+                return rejected_response(e)
+            # Entries are read lazily; only their extracted keys are kept
+            with ticket:
+                index, errors = build_reference_index((name, read_zip_entry(zip_file, name)) for name in json_files)
+        return JsonResponse({**index.report(), 'errors': errors})
+
+    except Exception as e:
+        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+
+@require_http_methods(["GET"])
+def cache_stats(request):
+    """Report conversion result cache counters"""
+    cache = get_conversion_cache()
+    if cache is None:
+        return JsonResponse({'enabled': False})
+    return JsonResponse({'enabled': True, **cache.stats()})
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Expose pipeline metrics as Prometheus text, or JSON with ?format=json"""
+    cache = get_conversion_cache()
+    cache_info = cache.stats() if cache is not None else None
+    if request.GET.get('format') == 'json':
+        return JsonResponse({**metrics.snapshot(), 'cache': cache_info, 'admission': get_scheduler().stats()})
+    families = []
+    if cache_info is not None:
+        tiers = ['memory', 'disk'] if cache_info['disk_enabled'] else ['memory']
+        evictions = {'memory': cache_info['evictions'], 'disk': cache_info['disk_evictions']}
+        cache_bytes = {'memory': cache_info['bytes'], 'disk': cache_info['disk_bytes']}
+        families += [
+            ('converter_cache_hits_total', 'counter', 'Result cache lookups answered from memory or disk',
+             [({}, cache_info['hits'])]),
+            ('converter_cache_misses_total', 'counter', 'Result cache lookups that had to convert',
+             [({}, cache_info['misses'])]),
+            ('converter_cache_disk_hits_total', 'counter', 'Result cache hits answered from the disk tier',
+             [({}, cache_info['disk_hits'])]),
+            ('converter_cache_evictions_total', 'counter', 'Entries evicted from the result cache per tier',
+             [({'tier': tier}, evictions[tier]) for tier in tiers]),
+            ('converter_cache_bytes', 'gauge', 'Bytes held by the result cache per tier',
+             [({'tier': tier}, cache_bytes[tier]) for tier in tiers]),
+            ('converter_cache_entries', 'gauge', 'Entries held in the memory tier of the result cache',
+             [({}, cache_info['entries'])]),
+        ]
+    classes = get_scheduler().stats()['classes']
+    families += [
+        ('converter_admission_active', 'gauge', 'Requests running per class',
+         [({'class': cls}, counters['active']) for cls, counters in classes.items()]),
+        ('converter_admission_waiting', 'gauge', 'Requests waiting for admission per class',
+         [({'class': cls}, counters['waiting']) for cls, counters in classes.items()]),
+        ('converter_admission_inflight_cost', 'gauge', 'Cost of the admitted requests still running per class',
+         [({'class': cls}, counters['inflight_cost']) for cls, counters in classes.items()]),
+        ('converter_admission_rejected_total', 'counter', 'Requests refused by admission control per class and status',
+         [({'class': cls, 'status': status}, n) for cls, counters in classes.items()
+          for status, n in counters['rejected'].items()]),
+    ]
+    return HttpResponse(metrics.prometheus(families), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def stream_ndjson_conversion(request, direction: str = 'forward', profile=None):
+    """Read NDJSON lines from the request body and yield converted NDJSON lines"""
+    # Lines are pulled from the body only as fast as the batch engine consumes them
+    entries = ((line_no, line) for line_no, line in enumerate(request, 1) if line.strip())
+    batch = iter_convert_batch(
+        entries,
+        workers=getattr(settings, 'CONVERTER_BATCH_WORKERS', None),
+        chunk_size=getattr(settings, 'CONVERTER_BATCH_CHUNK_SIZE', None),
+        convert=convert_ndjson_line,
+        direction=direction,
+        profile=profile,
+    )
+    for record, line in batch:
+        metrics.observe_file('converted' if record['status'] == 'success' else 'failed')
+        yield line
+
+@csrf_exempt
+@instrument_view('convert_ndjson')
+@require_http_methods(["POST"])
+@admitted(BATCH)
+def convert_ndjson(request):
+    """Convert newline-delimited OLD documents, streaming one result line per input line
+
+    ``?direction=reverse`` converts NEW documents back to the OLD format and
+    ``?profile=<name>`` picks the conversion profile.
+    """
+    try:
+        direction = requested_direction(request.GET)
+        profile = requested_profile(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return StreamingHttpResponse(
+        stream_ndjson_conversion(request, direction, profile), content_type='application/x-ndjson'
+    )
+
 def help_view(request):
     """Help page view"""
     return render(request, 'converter/help.html')
\ No newline at end of file
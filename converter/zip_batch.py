@@ -0,0 +1,442 @@
+"""
+Streaming conversion of ZIP archives
+
+Every converted member carries a small JSON comment in the central
+directory recording the CRC, size and converter version of the entry it
+was produced from. Uploading that archive again as ``previous`` lets
+unchanged entries be copied over byte for byte instead of reconverted.
+
+Members are compressed according to a ``CompressionProfile`` on a
+background thread, so compressing one entry overlaps with converting the
+next ones.
+"""
+import copy
+import json
+import struct
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import bz2
+except ImportError:  # Python may be built without bz2
+    bz2 = None
+try:
+    import lzma
+except ImportError:  # Python may be built without lzma
+    lzma = None
+
+from django.conf import settings
+
+from .asset_registry import MANIFEST_NAME, convert_entry_with_assets, manifest_json, summarize_assets
+from .conversion_logic import CONVERTER_VERSION, convert_entry, converted_filename, iter_convert_batch, validate_entry
+from .metrics import metrics
+from .profiles import get_profile
+from .result_cache import get_conversion_cache
+from .serializers import get_serializer
+from .zip_input import MappedZipFile
+
+# Raw member copies are streamed in blocks of this size
+COPY_BLOCK_SIZE = 1024 * 1024
+
+PREFLIGHT_MODES = ('off', 'skip', 'reject')
+
+# Output compression profiles: name -> (zipfile method, accepted levels or None)
+COMPRESSION_METHODS = {
+    'stored': (zipfile.ZIP_STORED, None),
+    'deflate': (zipfile.ZIP_DEFLATED, range(0, 10)),
+}
+if bz2 is not None:
+    COMPRESSION_METHODS['bzip2'] = (zipfile.ZIP_BZIP2, range(1, 10))
+if lzma is not None:
+    COMPRESSION_METHODS['lzma'] = (zipfile.ZIP_LZMA, None)
+    # Raw LZMA1 with the defaults zipfile uses; ZIP prefixes each member with the
+    # LZMA SDK version (9.4), the size of the properties and the properties themselves
+    LZMA_FILTER = {'id': lzma.FILTER_LZMA1, 'lc': 3, 'lp': 0, 'pb': 2, 'dict_size': 8 * 1024 * 1024}
+    LZMA_HEADER = struct.pack('<BBHBI', 9, 4, 5, (2 * 5 + 0) * 9 + 3, LZMA_FILTER['dict_size'])
+
+# Converted entries waiting on the compression thread before they are written
+COMPRESS_AHEAD = 4
+
+
+def list_json_entries(zip_file, direction: str = "forward") -> list:
+    """Names of the convertible JSON entries in an archive, in archive order"""
+    produced = '_old.json' if direction == "reverse" else '_new.json'
+    return [
+        name for name in zip_file.namelist()
+        if name.endswith('.json') and not name.endswith(produced) and name != MANIFEST_NAME
+    ]
+
+
+class ZipStreamBuffer:
+    """Write-only sink that hands finished ZIP bytes back to the response"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        """Return and forget everything written since the last pop"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_pack_entries(source, direction: str = "forward"):
+    """Return an iterator of (name, bytes or exception) for the JSON files of a directory tree or ZIP
+
+    Raises ``ValueError`` right away when ``source`` is neither.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return _iter_directory_entries(source, '_old.json' if direction == "reverse" else '_new.json')
+    if zipfile.is_zipfile(source):
+        return _iter_archive_entries(source, direction)
+    raise ValueError(f"Not a directory or ZIP archive: {source}")
+
+
+def _iter_directory_entries(source: Path, produced: str):
+    for path in sorted(source.rglob('*.json')):
+        if path.is_file() and not path.name.endswith(produced):
+            try:
+                raw = path.read_bytes()
+            except OSError as e:
+                raw = e
+            yield path.relative_to(source).as_posix(), raw
+
+
+def _iter_archive_entries(source: Path, direction: str):
+    with MappedZipFile(source) as zip_file:
+        for name in list_json_entries(zip_file, direction):
+            yield name, read_zip_entry(zip_file, name)
+
+
+def read_zip_entry(zip_file, name):
+    """Read a ZIP entry, returning the exception instead of raising it"""
+    start = time.perf_counter()
+    try:
+        return zip_file.read(name)
+    except Exception as e:
+        return e
+    finally:
+        metrics.observe_stage('zip_read', time.perf_counter() - start)
+
+
+class PreflightRejected(Exception):
+    """Raised when the pre-flight pass finds more invalid entries than allowed"""
+
+    def __init__(self, invalid: dict, checked: int, total: int):
+        self.invalid = invalid
+        self.checked = checked
+        self.total = total
+        super().__init__(f"{len(invalid)} invalid JSON files (checked {checked} of {total})")
+
+
+def preflight_options(data) -> tuple:
+    """Read (mode, max_invalid) from request data, defaulting to the settings
+
+    ``reject`` fails on the first invalid entry; ``skip`` drops invalid entries
+    but still gives up once more than ``max_invalid`` are found (None = no limit).
+    Raises ``ValueError`` for unknown values.
+    """
+    mode = data.get('preflight') or getattr(settings, 'CONVERTER_ZIP_PREFLIGHT', 'off')
+    if mode not in PREFLIGHT_MODES:
+        raise ValueError(f"preflight must be one of: {', '.join(PREFLIGHT_MODES)}")
+    try:
+        max_invalid = int(data.get('max_invalid') or getattr(settings, 'CONVERTER_PREFLIGHT_MAX_INVALID', 0))
+    except ValueError:
+        raise ValueError('max_invalid must be an integer')
+    if mode == 'reject':
+        return mode, 0
+    return mode, (max_invalid if max_invalid > 0 else None)
+
+
+def preflight_zip(zip_file, json_files, max_invalid: int = None, direction: str = "forward") -> dict:
+    """Parse and validate entries without converting them, returning {name: error} for invalid ones
+
+    Raises ``PreflightRejected`` as soon as more than ``max_invalid`` entries
+    are invalid, without reading the rest of the archive.
+    """
+    invalid = {}
+    entries = ((name, read_zip_entry(zip_file, name)) for name in json_files)
+    batch = iter_convert_batch(
+        entries,
+        workers=getattr(settings, 'CONVERTER_BATCH_WORKERS', None),
+        chunk_size=getattr(settings, 'CONVERTER_BATCH_CHUNK_SIZE', None),
+        convert=validate_entry,
+        direction=direction,
+    )
+    start = time.perf_counter()
+    checked = 0
+    try:
+        for record, _ in batch:
+            checked += 1
+            if record['status'] == 'error':
+                invalid[record['original']] = record['error']
+                if max_invalid is not None and len(invalid) > max_invalid:
+                    raise PreflightRejected(invalid, checked, len(json_files))
+    finally:
+        batch.close()
+        metrics.observe_stage('preflight', time.perf_counter() - start)
+    return invalid
+
+
+class CompressionProfile:
+    """How converted members are compressed: a named method plus an optional level"""
+
+    def __init__(self, name: str = 'deflate', level: int = None):
+        if name not in COMPRESSION_METHODS:
+            raise ValueError(f"compression must be one of: {', '.join(COMPRESSION_METHODS)}")
+        method, levels = COMPRESSION_METHODS[name]
+        if level is not None and (levels is None or level not in levels):
+            if levels is None:
+                raise ValueError(f"compression '{name}' does not take a level")
+            raise ValueError(f"compression_level for '{name}' must be between {levels[0]} and {levels[-1]}")
+        self.name = name
+        self.method = method
+        self.level = level
+
+    @property
+    def label(self) -> str:
+        """Profile name as reported in metrics, e.g. 'deflate' or 'deflate-1'"""
+        return self.name if self.level is None else f"{self.name}-{self.level}"
+
+    def compress(self, data: bytes) -> tuple:
+        """Return (crc, compressed bytes, seconds spent) for one member's data"""
+        start = time.perf_counter()
+        crc = zlib.crc32(data)
+        if self.method == zipfile.ZIP_DEFLATED:
+            level = zlib.Z_DEFAULT_COMPRESSION if self.level is None else self.level
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+        elif self.method == zipfile.ZIP_BZIP2:
+            compressor = bz2.BZ2Compressor(9 if self.level is None else self.level)
+            payload = compressor.compress(data) + compressor.flush()
+        elif self.method == zipfile.ZIP_LZMA:
+            payload = LZMA_HEADER + lzma.compress(data, lzma.FORMAT_RAW, filters=[LZMA_FILTER])
+        else:
+            payload = data
+        return crc, payload, time.perf_counter() - start
+
+
+def compression_options(data) -> CompressionProfile:
+    """Read the output compression profile from request data, defaulting to the settings
+
+    Raises ``ValueError`` for unknown profiles and out-of-range levels.
+    """
+    name = data.get('compression')
+    level = data.get('compression_level')
+    if not name:
+        name = getattr(settings, 'CONVERTER_ZIP_COMPRESSION', 'deflate')
+        level = level or getattr(settings, 'CONVERTER_ZIP_COMPRESSION_LEVEL', None)
+    try:
+        level = int(level) if level not in (None, '') else None
+    except ValueError:
+        raise ValueError('compression_level must be an integer')
+    return CompressionProfile(name, level)
+
+
+def source_comment(info: zipfile.ZipInfo, direction: str = "forward", profile=None) -> bytes:
+    """Manifest record stored as the comment of a converted member"""
+    record = {'v': CONVERTER_VERSION, 'crc': info.CRC, 'size': info.file_size}
+    if direction != "forward":
+        record['d'] = direction
+    if profile is not None and profile.tag:
+        record['p'] = profile.tag
+    return json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+
+def reusable_member(previous, info: zipfile.ZipInfo, direction: str = "forward", profile=None):
+    """Return the member of ``previous`` converted from an identical entry with the same profile, if any"""
+    try:
+        prev_info = previous.getinfo(converted_filename(info.filename, direction))
+    except KeyError:
+        return None
+    return prev_info if prev_info.comment == source_comment(info, direction, profile) else None
+
+
+def _register_member(out_zip, zinfo: zipfile.ZipInfo):
+    # List a member written straight to ``out_zip.fp`` in the central directory on close
+    out_zip.filelist.append(zinfo)
+    out_zip.NameToInfo[zinfo.filename] = zinfo
+    out_zip.start_dir = out_zip.fp.tell()
+    out_zip._didModify = True
+
+
+def write_compressed_member(out_zip, zinfo: zipfile.ZipInfo, payload: bytes, crc: int, file_size: int):
+    """Append a member whose data was already compressed with ``zinfo.compress_type``"""
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(payload)
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        zinfo.flag_bits |= 0x02  # the LZMA stream ends with an end-of-stream marker, as zipfile writes it
+    zinfo.header_offset = out_zip.fp.tell()
+    out_zip.fp.write(zinfo.FileHeader())
+    out_zip.fp.write(payload)
+    _register_member(out_zip, zinfo)
+
+
+def copy_raw_member(source, info: zipfile.ZipInfo, out_zip):
+    """Append a member of ``source`` to ``out_zip`` without decompressing it"""
+    fp = source.fp
+    fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, fp.read(zipfile.sizeFileHeader))
+    fp.seek(header[10] + header[11], 1)  # skip file name and extra field
+
+    zinfo = copy.copy(info)
+    zinfo.flag_bits &= ~0x08  # sizes and CRC are known, no data descriptor
+    zinfo.extra = b''
+    out_fp = out_zip.fp
+    zinfo.header_offset = out_fp.tell()
+    out_fp.write(zinfo.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        block = fp.read(min(remaining, COPY_BLOCK_SIZE))
+        if not block:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        out_fp.write(block)
+        remaining -= len(block)
+    _register_member(out_zip, zinfo)
+
+
+def stream_converted_zip(zip_file, json_files, results=None, previous=None, skip=None, direction="forward",
+                         assets=None, compression=None, profile=None):
+    """Convert ZIP entries one by one, yielding the output archive as it grows
+
+    With a ``previous`` converted archive, entries whose CRC and size match
+    its manifest are copied from it instead of being converted again.
+    Entries named in ``skip`` (e.g. by ``preflight_zip``) are reported as
+    failed with the given error and never converted. ``direction='reverse'``
+    turns NEW-format entries back into the OLD format. With an ``AssetRegistry``
+    as ``assets``, every converted or reused member is registered and the
+    pack-wide manifest is appended as ``asset_manifest.json``.
+
+    Converted members are compressed with the ``compression`` profile (deflate
+    at the default level if None) on a background thread; reused members keep
+    the compression they had in ``previous``. ``profile`` is the
+    ``ConversionProfile`` to convert with (the configured default if None).
+    """
+    skip = skip or {}
+    profile = profile or get_profile()
+    compression = compression or CompressionProfile()
+    buffer = ZipStreamBuffer()
+    compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='zip-compress')
+    try:
+        with zipfile.ZipFile(buffer, 'w', compression.method, compresslevel=compression.level) as out_zip:
+            infos = [zip_file.getinfo(name) for name in json_files]
+            reused = {}
+            skipped = {index: skip[info.filename] for index, info in enumerate(infos) if info.filename in skip}
+            if previous is not None:
+                for index, info in enumerate(infos):
+                    prev_info = reusable_member(previous, info, direction, profile) if index not in skipped else None
+                    if prev_info is not None:
+                        reused[index] = prev_info
+            changed = [index for index in range(len(infos)) if index not in reused and index not in skipped]
+
+            def copy_reused(upto):
+                # Copy unchanged members (and report skipped ones) that precede archive position ``upto``
+                nonlocal next_index
+                while next_index < upto:
+                    prev_info = reused.get(next_index)
+                    if next_index in skipped:
+                        if results is not None:
+                            results.append({
+                                'original': infos[next_index].filename,
+                                'converted': None,
+                                'status': 'error',
+                                'error': skipped[next_index]
+                            })
+                        metrics.observe_file('failed')
+                    elif prev_info is not None:
+                        copy_raw_member(previous, prev_info, out_zip)
+                        if assets is not None:
+                            reused_doc = get_serializer().loads(previous.read(prev_info))
+                            assets.add(prev_info.filename, summarize_assets(reused_doc))
+                        if results is not None:
+                            record = {
+                                'original': infos[next_index].filename,
+                                'converted': prev_info.filename,
+                                'status': 'success',
+                                'reused': True
+                            }
+                            results.append(record)
+                        chunk = buffer.pop()
+                        if chunk:
+                            yield chunk
+                    next_index += 1
+
+            def write_converted(index, record, converted_content, compressed):
+                # Write one converted entry once its compressed data is ready, in archive order
+                nonlocal next_index
+                yield from copy_reused(index)
+                if results is not None:
+                    results.append(record)
+                if record['status'] == 'success':
+                    crc, payload, seconds = compressed.result()
+                    zinfo = zipfile.ZipInfo(record['converted'], date_time=time.localtime(time.time())[:6])
+                    zinfo.compress_type = compression.method
+                    zinfo.external_attr = 0o600 << 16  # ?rw-------
+                    zinfo.comment = source_comment(infos[index], direction, profile)
+                    write_compressed_member(out_zip, zinfo, payload, crc, len(converted_content))
+                    # Cache hits come back without timings
+                    outcome = 'converted' if 'timings' in record else 'cached'
+                    timings = record.setdefault('timings', {})
+                    timings['zip_deflate'] = seconds
+                    metrics.observe_file(outcome, timings, infos[index].file_size, len(converted_content))
+                    metrics.observe_compression(compression.label, seconds, len(converted_content), len(payload))
+                    if assets is not None:
+                        # Cache hits skip the workers, so their assets are read from the output here
+                        summary = record.pop('assets', None)
+                        if summary is None:
+                            summary = summarize_assets(get_serializer().loads(converted_content))
+                        assets.add(record['converted'], summary)
+                else:
+                    metrics.observe_file('failed')
+                next_index = index + 1
+                chunk = buffer.pop()
+                if chunk:
+                    yield chunk
+
+            next_index = 0
+            # Entries are read lazily; the batch engine only pulls as many as its workers need
+            entries = ((infos[i].filename, read_zip_entry(zip_file, infos[i])) for i in changed)
+            batch = iter_convert_batch(
+                entries,
+                workers=getattr(settings, 'CONVERTER_BATCH_WORKERS', None),
+                chunk_size=getattr(settings, 'CONVERTER_BATCH_CHUNK_SIZE', None),
+                cache=get_conversion_cache(),
+                convert=convert_entry_with_assets if assets is not None else convert_entry,
+                direction=direction,
+                profile=profile,
+            )
+            pending = deque()
+            for index, (record, converted_content) in zip(changed, batch):
+                compressed = None
+                if record['status'] == 'success':
+                    compressed = compressor.submit(compression.compress, converted_content)
+                pending.append((index, record, converted_content, compressed))
+                while len(pending) > COMPRESS_AHEAD:
+                    yield from write_converted(*pending.popleft())
+            while pending:
+                yield from write_converted(*pending.popleft())
+            yield from copy_reused(len(infos))
+            if assets is not None:
+                out_zip.writestr(MANIFEST_NAME, manifest_json(assets.manifest()))
+        # Central directory is written on close
+        chunk = buffer.pop()
+        if chunk:
+            yield chunk
+    finally:
+        compressor.shutdown(wait=True, cancel_futures=True)
+        zip_file.close()
+        if previous is not None:
+            previous.close()
@@ -0,0 +1,160 @@
+"""
+Opening uploaded ZIP archives
+
+Archives are checked against size limits using only their central
+directory, before any entry is decompressed: the entry count comes from the
+end-of-central-directory record (before zipfile builds a ZipInfo per entry),
+and the total uncompressed size and per-entry compression ratio from the
+parsed directory. Entry reads never produce more than the declared size, so
+the declared sizes are what bounds memory.
+
+Archives already on disk (uploads Django spooled to a temporary file, job
+inputs) are memory-mapped: entry data is decompressed straight from the
+mapping, without reading the compressed bytes into intermediate buffers.
+"""
+import mmap
+import struct
+import zipfile
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# Entries smaller than this are never refused for their compression ratio
+RATIO_MIN_SIZE = 1024 * 1024
+
+
+class ZipLimitExceeded(ValueError):
+    """Raised when an archive's central directory exceeds the configured limits"""
+
+
+def zip_limits() -> tuple:
+    """(max entries, max total uncompressed bytes, max compression ratio) from the settings; 0 = no limit"""
+    return (
+        getattr(settings, 'CONVERTER_ZIP_MAX_ENTRIES', 0),
+        getattr(settings, 'CONVERTER_ZIP_MAX_UNCOMPRESSED', 0),
+        getattr(settings, 'CONVERTER_ZIP_MAX_RATIO', 0),
+    )
+
+
+def check_entry_count(fp, max_entries: int):
+    """Refuse archives declaring more than ``max_entries`` members, reading only the end record
+
+    Raises ``zipfile.BadZipFile`` when ``fp`` is not a ZIP archive.
+    """
+    position = fp.tell()
+    try:
+        end_record = zipfile._EndRecData(fp)
+    finally:
+        fp.seek(position)
+    if end_record is None:
+        raise zipfile.BadZipFile("File is not a zip file")
+    entries = end_record[zipfile._ECD_ENTRIES_TOTAL]
+    if max_entries and entries > max_entries:
+        raise ZipLimitExceeded(f"ZIP archive has {entries} entries (limit {max_entries})")
+
+
+def check_zip_limits(zip_file, json_files: list):
+    """Refuse archives whose JSON entries would decompress to too much data
+
+    Uses the sizes declared in the central directory only; nothing is read
+    or decompressed.
+    """
+    max_entries, max_bytes, max_ratio = zip_limits()
+    if max_entries and len(zip_file.infolist()) > max_entries:
+        raise ZipLimitExceeded(f"ZIP archive has {len(zip_file.infolist())} entries (limit {max_entries})")
+    total = 0
+    for name in json_files:
+        info = zip_file.getinfo(name)
+        total += info.file_size
+        if max_ratio and info.file_size >= RATIO_MIN_SIZE and info.file_size > max_ratio * max(info.compress_size, 1):
+            ratio = info.file_size / max(info.compress_size, 1)
+            raise ZipLimitExceeded(f"{name} expands {ratio:.0f}x when decompressed (limit {max_ratio}x)")
+    if max_bytes and total > max_bytes:
+        raise ZipLimitExceeded(
+            f"ZIP archive expands to {total / (1024 * 1024):.1f} MB (limit {max_bytes / (1024 * 1024):.1f} MB)"
+        )
+
+
+class MappedZipFile(zipfile.ZipFile):
+    """Read-only ZipFile whose stored and deflated entries are read from a memory map
+
+    The central directory is parsed by zipfile as usual; ``read`` slices the
+    mapping and decompresses from it, capping the output at the declared
+    size and checking it and the CRC. Other methods and encrypted entries
+    fall back to zipfile's own reader.
+    """
+
+    def __init__(self, path, max_entries: int = 0):
+        self._map = None
+        self._file = open(path, 'rb')
+        try:
+            check_entry_count(self._file, max_entries)
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            super().__init__(self._file, 'r')
+        except BaseException:
+            self.fp = None  # nothing left for ZipFile.__del__ to close
+            self._release()
+            raise
+
+    @contextmanager
+    def member_view(self, info: zipfile.ZipInfo):
+        """Zero-copy view of a member's (compressed) data in the mapping"""
+        offset = info.header_offset
+        header = struct.unpack(zipfile.structFileHeader, self._map[offset:offset + zipfile.sizeFileHeader])
+        if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad magic number for file header of {info.filename}")
+        start = offset + zipfile.sizeFileHeader
+        start += header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+        end = start + info.compress_size
+        if end > len(self._map):
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        # Views must be released before the mapping can be closed
+        with memoryview(self._map) as whole, whole[start:end] as view:
+            yield view
+
+    def read(self, name, pwd=None) -> bytes:
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return super().read(name, pwd)
+        with self.member_view(info) as view:
+            if info.compress_type == zipfile.ZIP_STORED:
+                data = bytes(view)
+            else:
+                # max_length: a member can never inflate past its declared size (plus one byte to detect it)
+                data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(view, info.file_size + 1)
+        if len(data) != info.file_size:
+            raise zipfile.BadZipFile(f"Bad size for file {info.filename!r}")
+        if zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+        return data
+
+    def _release(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release()
+
+
+def open_input_zip(source, limits: bool = True):
+    """Open an uploaded archive (an UploadedFile or a path) for reading
+
+    Archives on disk are memory-mapped; in-memory uploads use zipfile
+    directly. With ``limits`` the entry count is checked against
+    CONVERTER_ZIP_MAX_ENTRIES before the central directory is parsed.
+    Raises ``zipfile.BadZipFile`` and ``ZipLimitExceeded``.
+    """
+    max_entries = zip_limits()[0] if limits else 0
+    if isinstance(source, (str, Path)):
+        return MappedZipFile(source, max_entries)
+    if hasattr(source, 'temporary_file_path'):
+        return MappedZipFile(source.temporary_file_path(), max_entries)
+    check_entry_count(source, max_entries)
+    return zipfile.ZipFile(source, 'r')
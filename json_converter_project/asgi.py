@@ -0,0 +1,19 @@
+"""
+ASGI config for json_converter_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Served this way, the conversion endpoints use the async views in
+``converter.async_views`` (unless CONVERTER_ASYNC_VIEWS is set to 0).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'json_converter_project.settings')
+os.environ.setdefault('CONVERTER_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
@@ -43,7 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'converter.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable for ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +71,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'json_converter_project.wsgi.application'
+ASGI_APPLICATION = 'json_converter_project.asgi.application'
 
 
 # Database
@@ -134,4 +135,52 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
\ No newline at end of file
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Batch conversion (ZIP) settings
+CONVERTER_BATCH_WORKERS = int(os.environ.get('CONVERTER_BATCH_WORKERS', 0)) or None  # None = one per CPU core
+CONVERTER_BATCH_CHUNK_SIZE = int(os.environ.get('CONVERTER_BATCH_CHUNK_SIZE', 8))  # files per worker task
+
+# Pre-flight validation of ZIP entries: 'off', 'skip' (drop invalid files) or 'reject' (refuse the archive)
+CONVERTER_ZIP_PREFLIGHT = os.environ.get('CONVERTER_ZIP_PREFLIGHT', 'off')
+CONVERTER_PREFLIGHT_MAX_INVALID = int(os.environ.get('CONVERTER_PREFLIGHT_MAX_INVALID', 0))  # 'skip' gives up past this many (0 = no limit)
+
+# Limits checked from an uploaded ZIP's central directory before anything is decompressed (0 = no limit)
+CONVERTER_ZIP_MAX_ENTRIES = int(os.environ.get('CONVERTER_ZIP_MAX_ENTRIES', 100000))
+CONVERTER_ZIP_MAX_UNCOMPRESSED = int(os.environ.get('CONVERTER_ZIP_MAX_UNCOMPRESSED', 2 * 1024 * 1024 * 1024))  # JSON entries, bytes
+CONVERTER_ZIP_MAX_RATIO = int(os.environ.get('CONVERTER_ZIP_MAX_RATIO', 200))  # per entry of 1MB or more
+
+# Output ZIP compression: 'stored', 'deflate' (level 0-9), 'bzip2' (level 1-9) or 'lzma'
+CONVERTER_ZIP_COMPRESSION = os.environ.get('CONVERTER_ZIP_COMPRESSION', 'deflate')
+CONVERTER_ZIP_COMPRESSION_LEVEL = os.environ.get('CONVERTER_ZIP_COMPRESSION_LEVEL') or None  # None = method default
+
+# Conversion result cache (keyed on input hash + converter version)
+CONVERTER_CACHE_MAX_BYTES = int(os.environ.get('CONVERTER_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 0 disables the cache
+CONVERTER_CACHE_DISK = os.environ.get('CONVERTER_CACHE_DISK', '') == '1'  # also persist under MEDIA_ROOT/conversion_cache
+CONVERTER_CACHE_DISK_MAX_BYTES = int(os.environ.get('CONVERTER_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024))  # 0 = unbounded
+
+# Background ZIP conversion jobs (state and artifacts under MEDIA_ROOT/conversion_jobs)
+CONVERTER_JOB_WORKERS = int(os.environ.get('CONVERTER_JOB_WORKERS', 2))  # concurrent jobs per process
+CONVERTER_JOB_TTL = int(os.environ.get('CONVERTER_JOB_TTL', 3600))  # seconds before finished jobs are deleted
+CONVERTER_JOB_CLEANUP_INTERVAL = int(os.environ.get('CONVERTER_JOB_CLEANUP_INTERVAL', 300))  # seconds between sweeps
+
+# Conversion profiles: named rule sets for the defaults the converter fills in (see converter/profiles.py).
+# CONVERTER_PROFILES_FILE points to a JSON object of the same shape; its profiles override these.
+CONVERTER_PROFILES = {}
+CONVERTER_PROFILES_FILE = os.environ.get('CONVERTER_PROFILES_FILE', '')
+CONVERTER_DEFAULT_PROFILE = os.environ.get('CONVERTER_DEFAULT_PROFILE', 'default')
+
+# Single-file uploads larger than this are converted form by form (bounded memory, no result cache)
+CONVERTER_STREAMING_THRESHOLD = int(os.environ.get('CONVERTER_STREAMING_THRESHOLD', 8 * 1024 * 1024))
+
+# Admission control: concurrent conversions per request class ('interactive': single files and text,
+# 'batch': ZIP archives, NDJSON and reference checks), plus a budget for the estimated bytes in flight
+CONVERTER_INTERACTIVE_CONCURRENCY = int(os.environ.get('CONVERTER_INTERACTIVE_CONCURRENCY', 16))
+CONVERTER_BATCH_CONCURRENCY = int(os.environ.get('CONVERTER_BATCH_CONCURRENCY', 2))
+CONVERTER_ADMISSION_BUDGET = int(os.environ.get('CONVERTER_ADMISSION_BUDGET', 512 * 1024 * 1024))  # 0 = no budget
+CONVERTER_ADMISSION_WAIT = float(os.environ.get('CONVERTER_ADMISSION_WAIT', 2.0))  # seconds a request may wait for a slot
+CONVERTER_ADMISSION_QUEUE = int(os.environ.get('CONVERTER_ADMISSION_QUEUE', 32))  # waiting requests per class (0 = no limit)
+
+# Async views (set by asgi.py): conversions run on a pool of this many threads instead of the event loop
+CONVERTER_ASYNC_VIEWS = os.environ.get('CONVERTER_ASYNC_VIEWS', '') == '1'
+CONVERTER_ASYNC_WORKERS = int(os.environ.get('CONVERTER_ASYNC_WORKERS', 0)) or None  # None = one per CPU core, at least 2